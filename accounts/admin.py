@@ -2,7 +2,7 @@
 from django.contrib import admin
 from django.contrib.admin.sites import AlreadyRegistered
 from django.contrib.auth.admin import UserAdmin
-from .models import CustomUser, Contact
+from .models import CustomUser, Contact, ContactSegment
 
 class CustomUserAdmin(UserAdmin):
     list_display = ('username', 'email', 'user_type', 'is_staff', 'is_superuser')
@@ -29,6 +29,12 @@ class ContactUsAdmin(admin.ModelAdmin):
     list_display = ('name', 'email', 'user', 'submitted_at')
     readonly_fields = ('submitted_at',)
 
+class ContactSegmentAdmin(admin.ModelAdmin):
+    list_display = ('name', 'kind', 'user', 'created_at')
+    list_filter = ('kind',)
+    search_fields = ('name', 'user__username')
+
 _safe_register(Contact, ContactAdmin)
+_safe_register(ContactSegment, ContactSegmentAdmin)
 
 
@@ -1,6 +1,6 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
-from .models import Contact, CustomUser
+from .models import Contact, ContactSegment, CustomUser
 import re
 
 PHONE_RE = re.compile(r'^\+?\d{7,15}$')
@@ -64,3 +64,15 @@ class UserProfileUpdateForm(forms.ModelForm):
         if commit:
             user.save()
         return user
+
+
+class ContactSegmentForm(forms.ModelForm):
+    class Meta:
+        model = ContactSegment
+        fields = ['name', 'kind', 'name_contains', 'phone_prefix']
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not (cleaned_data.get('name_contains') or cleaned_data.get('phone_prefix')):
+            raise forms.ValidationError("Give the segment a name filter, a phone prefix, or both.")
+        return cleaned_data
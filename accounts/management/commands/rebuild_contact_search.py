@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from accounts.search import REBUILD_CHUNK_SIZE, rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the contact trigram search index in chunks (needed after bulk imports)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=REBUILD_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        total = rebuild_index(
+            chunk_size=options['chunk_size'],
+            progress=lambda n: self.stdout.write(f"Indexed {n} contacts..."),
+        )
+        self.stdout.write(self.style.SUCCESS(f"Contact search index rebuilt for {total} contacts."))
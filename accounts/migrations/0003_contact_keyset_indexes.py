@@ -0,0 +1,21 @@
+# Generated by Django 5.1.4 on 2026-10-19 03:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_delete_contactus'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contact',
+            index=models.Index(fields=['user', 'name', 'id'], name='contact_user_name_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contact',
+            index=models.Index(fields=['name', 'id'], name='contact_name_id_idx'),
+        ),
+    ]
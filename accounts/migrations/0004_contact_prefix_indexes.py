@@ -0,0 +1,33 @@
+# Generated by Django 5.1.4 on 2026-10-19 03:56
+
+from django.db import migrations, models
+
+
+def create_name_prefix_index(apps, schema_editor):
+    # Matches the UPPER(name::text) LIKE 'ABC%' that istartswith compiles to on
+    # PostgreSQL. Other backends fall back to the (user, name, id) index.
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS contact_user_name_prefix_idx '
+            'ON accounts_contact (user_id, (UPPER(name::text)) text_pattern_ops)'
+        )
+
+
+def drop_name_prefix_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS contact_user_name_prefix_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_contact_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contact',
+            index=models.Index(fields=['user', 'phone'], name='contact_user_phone_prefix_idx', opclasses=['int8_ops', 'varchar_pattern_ops']),
+        ),
+        migrations.RunPython(create_name_prefix_index, drop_name_prefix_index),
+    ]
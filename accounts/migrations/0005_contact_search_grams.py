@@ -0,0 +1,35 @@
+# Generated by Django 5.1.4 on 2026-10-19 03:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def build_search_index(apps, schema_editor):
+    from accounts.search import rebuild_index
+
+    rebuild_index(apps.get_model('accounts', 'Contact'), apps.get_model('accounts', 'ContactSearchGram'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_contact_prefix_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContactSearchGram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('gram', models.CharField(max_length=3)),
+                ('contact', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_grams', to='accounts.contact')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'gram', 'contact'], name='contact_gram_user_idx'), models.Index(fields=['gram', 'contact'], name='contact_gram_idx')],
+                'constraints': [models.UniqueConstraint(fields=('contact', 'gram'), name='contact_search_gram_unique')],
+            },
+        ),
+        migrations.RunPython(build_search_index, migrations.RunPython.noop),
+    ]
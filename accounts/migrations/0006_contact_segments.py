@@ -0,0 +1,43 @@
+# Generated by Django 5.1.4 on 2026-10-19 03:58
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_contact_search_grams'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContactSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('kind', models.CharField(choices=[('GROUP', 'Contact group'), ('RULE', 'Rule-based filter')], default='RULE', max_length=10)),
+                ('name_contains', models.CharField(blank=True, help_text='Match contacts whose name contains this text.', max_length=100)),
+                ('phone_prefix', models.CharField(blank=True, help_text='Match contacts whose number starts with this, e.g. +92300.', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='segments', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ContactSegmentMember',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('phone_number', models.CharField(max_length=20)),
+                ('contact', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='segment_memberships', to='accounts.contact')),
+                ('segment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='members', to='accounts.contactsegment')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['segment', 'phone_number'], name='segment_member_phone_idx')],
+                'constraints': [models.UniqueConstraint(fields=('segment', 'contact'), name='segment_member_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.1.4 on 2026-10-19 04:00
+
+import re
+
+from django.db import migrations, models
+
+
+def to_e164(number):
+    # Frozen copy of core.phones.to_e164 as of this migration, so later
+    # changes there can't change what this backfill writes.
+    raw = str(number).strip()
+    international = raw.startswith(('+', '00'))
+    number = re.sub(r'\D', '', raw)
+    if raw.startswith('00'):
+        number = number[2:]
+    if not international:
+        if len(number) == 10 and number.startswith('3'):
+            number = '92' + number
+        elif len(number) == 11 and number.startswith('03'):
+            number = '92' + number[1:]
+    if number.startswith('92'):
+        return f"+{number}" if len(number) == 12 else None
+    if international and 8 <= len(number) <= 15 and not number.startswith('0'):
+        return f"+{number}"
+    return None
+
+
+def backfill_normalized_phone(apps, schema_editor):
+    Contact = apps.get_model('accounts', 'Contact')
+    last_id = 0
+    while True:
+        chunk = list(Contact.objects.filter(id__gt=last_id).order_by('id').only('id', 'phone')[:2000])
+        if not chunk:
+            break
+        for contact in chunk:
+            contact.normalized_phone = to_e164(contact.phone) or ''
+        Contact.objects.bulk_update(chunk, ['normalized_phone'])
+        last_id = chunk[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_contact_segments'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contact',
+            name='normalized_phone',
+            field=models.CharField(blank=True, default='', editable=False, max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='contact',
+            index=models.Index(fields=['user', 'normalized_phone'], name='contact_user_norm_phone_idx'),
+        ),
+        migrations.RunPython(backfill_normalized_phone, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.1.4 on 2026-10-19 04:31
+
+from django.db import migrations, models
+from django.db.models import BigIntegerField, Max, Min
+from django.db.models.functions import Cast, Substr
+
+
+def backfill_e164(model, phone_field, chunk_size=5000):
+    # Frozen copy of core.phones.backfill_e164: one id range per UPDATE.
+    missing = model._default_manager.filter(
+        phone_e164__isnull=True, **{f'{phone_field}__regex': r'^\+[0-9]{8,15}$'}
+    )
+    bounds = model._default_manager.aggregate(low=Min('id'), high=Max('id'))
+    if bounds['low'] is None:
+        return
+    for start in range(bounds['low'], bounds['high'] + 1, chunk_size):
+        missing.filter(id__gte=start, id__lt=start + chunk_size).update(
+            phone_e164=Cast(Substr(phone_field, 2), BigIntegerField())
+        )
+
+
+def backfill_phone_e164(apps, schema_editor):
+    backfill_e164(apps.get_model('accounts', 'Contact'), 'normalized_phone')
+    backfill_e164(apps.get_model('accounts', 'ContactSegmentMember'), 'phone_number')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_contact_normalized_phone'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contact',
+            name='phone_e164',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='contactsegmentmember',
+            name='phone_e164',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_phone_e164, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='contact',
+            index=models.Index(fields=['user', 'phone_e164'], name='contact_user_phone_e164_idx'),
+        ),
+    ]
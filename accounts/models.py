@@ -1,8 +1,12 @@
+import re
+
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.conf import settings
 from django.contrib.auth import get_user_model
 
+from core.phones import e164_int, to_e164
+
 
 # --- 1. User & Profile (Core) ---
 class CustomUser(AbstractUser):
@@ -28,13 +32,123 @@ class CustomUser(AbstractUser):
 
 
 # --- 3. Contact Management (Core) ---
+class ContactQuerySet(models.QuerySet):
+    def matching(self, term):
+        """Prefix match on name (case-insensitive) or on the phone digits."""
+        term = (term or '').strip()
+        if not term:
+            return self
+        condition = models.Q(name__istartswith=term)
+        digits = re.sub(r'\D', '', term)
+        if digits:
+            condition |= models.Q(phone__startswith=digits) | models.Q(phone__startswith=f'+{digits}')
+        return self.filter(condition)
+
+
 class Contact(models.Model):
     user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE, related_name='contacts')
     name = models.CharField(max_length=100)
     phone = models.CharField(max_length=20)
     profile_picture = models.ImageField(upload_to='contact_pics/', blank=True, null=True) 
+    # +92XXXXXXXXXX form of ``phone`` (blank if it can't be messaged), kept in
+    # sync on save so campaigns can copy contacts' numbers without Python.
+    normalized_phone = models.CharField(max_length=20, blank=True, default='', editable=False)
+    # The same number as an integer (E.164 digits), for joins with recipients and suppressions.
+    phone_e164 = models.BigIntegerField(null=True, blank=True, editable=False)
+
+    objects = ContactQuerySet.as_manager()
+
+    class Meta:
+        # Back the keyset pagination in contacts_list_view: (user, name, id) for
+        # end users and (name, id) for the admin view across every account.
+        indexes = [
+            models.Index(fields=['user', 'name', 'id'], name='contact_user_name_id_idx'),
+            models.Index(fields=['name', 'id'], name='contact_name_id_idx'),
+            # Phone prefix lookups for the campaign contact picker. The matching
+            # UPPER(name) prefix index is PostgreSQL-only, see migration 0004.
+            models.Index(
+                fields=['user', 'phone'], name='contact_user_phone_prefix_idx',
+                opclasses=['int8_ops', 'varchar_pattern_ops'],
+            ),
+            models.Index(fields=['user', 'normalized_phone'], name='contact_user_norm_phone_idx'),
+            models.Index(fields=['user', 'phone_e164'], name='contact_user_phone_e164_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.phone})"
 
+    def save(self, *args, **kwargs):
+        self.normalized_phone = to_e164(self.phone) or ''
+        self.phone_e164 = e164_int(self.normalized_phone)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'phone' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'normalized_phone', 'phone_e164'}
+        super().save(*args, **kwargs)
+
+
+class ContactSearchGram(models.Model):
+    """
+    Trigram index over contact name and phone, maintained by accounts.signals.
 
+    ``user`` is copied from the contact so per-user searches never join Contact.
+    """
+    contact = models.ForeignKey(Contact, on_delete=models.CASCADE, related_name='search_grams')
+    user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE, related_name='+')
+    gram = models.CharField(max_length=3)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['contact', 'gram'], name='contact_search_gram_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'gram', 'contact'], name='contact_gram_user_idx'),
+            models.Index(fields=['gram', 'contact'], name='contact_gram_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.gram!r} -> {self.contact_id}"
+
+
+# --- 4. Audience Segments ---
+class ContactSegment(models.Model):
+    """
+    A saved audience. GROUP segments are a fixed set of contacts chosen when the
+    segment is created; RULE segments track every contact matching their
+    filters as contacts are added or edited (see accounts.segments).
+    """
+    class Kind(models.TextChoices):
+        GROUP = 'GROUP', 'Contact group'
+        RULE = 'RULE', 'Rule-based filter'
+
+    user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE, related_name='segments')
+    name = models.CharField(max_length=100)
+    kind = models.CharField(max_length=10, choices=Kind.choices, default=Kind.RULE)
+    name_contains = models.CharField(max_length=100, blank=True, help_text="Match contacts whose name contains this text.")
+    phone_prefix = models.CharField(max_length=20, blank=True, help_text="Match contacts whose number starts with this, e.g. +92300.")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return f"{self.name} ({self.get_kind_display()})"
+
+
+class ContactSegmentMember(models.Model):
+    """Materialized segment membership with the contact's normalized number."""
+    segment = models.ForeignKey(ContactSegment, on_delete=models.CASCADE, related_name='members')
+    contact = models.ForeignKey(Contact, on_delete=models.CASCADE, related_name='segment_memberships')
+    phone_number = models.CharField(max_length=20)
+    phone_e164 = models.BigIntegerField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['segment', 'contact'], name='segment_member_unique'),
+        ]
+        indexes = [
+            # Campaign targeting reads (segment, phone_number) straight off this index.
+            models.Index(fields=['segment', 'phone_number'], name='segment_member_phone_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.contact_id} in {self.segment_id}"
@@ -0,0 +1,173 @@
+# accounts/search.py
+"""
+Contact search over a trigram table (ContactSearchGram).
+
+Plain tables and GROUP BY only, so it behaves the same on SQLite and
+PostgreSQL. A query is broken into trigrams; contacts sharing enough of them
+are candidates, which are then ranked as prefix > substring > fuzzy matches.
+"""
+import math
+import re
+
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Contact, ContactSearchGram
+
+SEARCH_RESULT_LIMIT = 200
+FUZZY_THRESHOLD = 0.5   # share of query trigrams a fuzzy match must contain
+CANDIDATE_LIMIT = 2000
+REBUILD_CHUNK_SIZE = 2000
+# Searching every account scans the posting list of each query gram, so the
+# admin view needs a longer query and skips the word-start grams ("  a"),
+# which nearly every contact has.
+ADMIN_MIN_QUERY_LENGTH = 3
+
+
+def _words(text):
+    return re.findall(r'\w+', (text or '').casefold())
+
+
+def _digits(text):
+    return re.sub(r'\D', '', text or '')
+
+
+def _word_grams(word, pad=True):
+    # pg_trgm style padding: "  ab " gives the word-prefix grams "  a" and " ab".
+    padded = f'  {word} ' if pad else word
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def contact_grams(name, phone):
+    """All trigrams stored for a contact with this name and phone."""
+    grams = set()
+    for word in _words(name):
+        grams |= _word_grams(word)
+    digits = _digits(phone)
+    if digits:
+        grams |= _word_grams(digits)
+    return grams
+
+
+def _query_grams(term, fuzzy=False):
+    """
+    Trigrams a matching contact must have. Substring queries leave the padding
+    off so "lin" matches "Kalina"; fuzzy ones keep it for word-boundary hints.
+    Words shorter than three characters can only match as a word prefix, and
+    phone digits always do. Fuzzy grams come from the name words only.
+    """
+    grams = set()
+    for token in _words(term):
+        if token.isdigit():
+            continue
+        if len(token) < 3:
+            grams |= {g for g in _word_grams(token) if not g.endswith(' ')}
+        else:
+            grams |= _word_grams(token, pad=fuzzy)
+    digits = _digits(term)
+    if digits and not fuzzy:
+        grams |= {g for g in _word_grams(digits) if not g.endswith(' ')}
+    return grams
+
+
+def index_contact(contact):
+    """Bring the trigram rows for ``contact`` in line with its current name/phone."""
+    wanted = contact_grams(contact.name, contact.phone)
+    existing = set(
+        ContactSearchGram.objects.filter(contact=contact).values_list('gram', flat=True)
+    )
+    stale = existing - wanted
+    if stale:
+        ContactSearchGram.objects.filter(contact=contact, gram__in=stale).delete()
+    ContactSearchGram.objects.bulk_create(
+        [ContactSearchGram(contact=contact, user_id=contact.user_id, gram=g) for g in wanted - existing],
+        ignore_conflicts=True,
+    )
+
+
+def rebuild_index(contact_model=Contact, gram_model=ContactSearchGram,
+                  chunk_size=REBUILD_CHUNK_SIZE, progress=None):
+    """
+    Rewrite the trigram rows of every contact, ``chunk_size`` contacts per
+    transaction. Takes the models so migrations can pass historical ones.
+    Returns the number of contacts indexed.
+    """
+    last_id = 0
+    total = 0
+    while True:
+        chunk = list(
+            contact_model.objects.filter(id__gt=last_id)
+            .order_by('id')
+            .values_list('id', 'user_id', 'name', 'phone')[:chunk_size]
+        )
+        if not chunk:
+            return total
+
+        ids = [row[0] for row in chunk]
+        with transaction.atomic():
+            gram_model.objects.filter(contact_id__in=ids).delete()
+            gram_model.objects.bulk_create([
+                gram_model(contact_id=contact_id, user_id=user_id, gram=gram)
+                for contact_id, user_id, name, phone in chunk
+                for gram in contact_grams(name, phone)
+            ])
+
+        last_id = ids[-1]
+        total += len(chunk)
+        if progress:
+            progress(total)
+
+
+def _candidates(grams, user, min_hits):
+    rows = ContactSearchGram.objects.filter(gram__in=grams)
+    if user is not None:
+        rows = rows.filter(user=user)
+    return dict(
+        rows.values('contact_id')
+        .annotate(hits=Count('gram'))
+        .filter(hits__gte=min_hits)
+        .order_by('-hits')
+        .values_list('contact_id', 'hits')[:CANDIDATE_LIMIT]
+    )
+
+
+def search_contacts(term, user=None, limit=SEARCH_RESULT_LIMIT):
+    """
+    Contacts matching ``term`` by name or phone, best matches first.
+
+    ``user=None`` searches every account (admin view). Returns a list of
+    Contact objects with the owner already loaded.
+    """
+    term = (term or '').strip()
+    grams = _query_grams(term)
+    fuzzy_grams = _query_grams(term, fuzzy=True)
+    if user is None:
+        if len(term) < ADMIN_MIN_QUERY_LENGTH:
+            return []
+        grams = {g for g in grams if not g.startswith('  ')}
+        fuzzy_grams = {g for g in fuzzy_grams if not g.startswith('  ')}
+    if not grams:
+        return []
+
+    hits = _candidates(grams, user, min_hits=len(grams))
+    if len(hits) < limit and len(fuzzy_grams) >= 3:
+        fuzzy_hits = _candidates(fuzzy_grams, user, math.ceil(len(fuzzy_grams) * FUZZY_THRESHOLD))
+        for contact_id, n in fuzzy_hits.items():
+            hits.setdefault(contact_id, n - len(fuzzy_grams))  # ranks below exact gram matches
+
+    contacts = Contact.objects.filter(id__in=list(hits)).select_related('user')
+    needle = term.casefold()
+    digits = _digits(term)
+
+    def rank(contact):
+        name = contact.name.casefold()
+        phone = _digits(contact.phone)
+        if f' {needle}' in f' {name}' or (digits and phone.startswith(digits)):
+            kind = 0
+        elif needle in name:
+            kind = 1
+        else:
+            kind = 2
+        return (kind, -hits[contact.id], name, contact.id)
+
+    return sorted(contacts, key=rank)[:limit]
@@ -0,0 +1,96 @@
+# accounts/segments.py
+"""
+Materialized segment membership.
+
+Membership rows are written once when a segment is built and then patched one
+contact at a time from the Contact post_save signal, so targeting a segment
+never has to re-evaluate its filters over the whole contact table.
+"""
+from django.db import transaction
+
+from core.phones import e164_int
+from .models import Contact, ContactSegment, ContactSegmentMember
+
+BUILD_CHUNK_SIZE = 2000
+
+
+def to_e164_prefix(prefix):
+    """'0300' -> '+92300' so prefixes compare against normalized numbers."""
+    digits = ''.join(ch for ch in prefix if ch.isdigit())
+    if digits.startswith('0'):
+        digits = '92' + digits[1:]
+    return f'+{digits}'
+
+
+def contact_matches(segment, name, phone_number):
+    """Whether a contact with this name and normalized number fits ``segment``'s filters."""
+    if not phone_number:
+        return False
+    if segment.name_contains and segment.name_contains.casefold() not in name.casefold():
+        return False
+    if segment.phone_prefix and not phone_number.startswith(to_e164_prefix(segment.phone_prefix)):
+        return False
+    return True
+
+
+def _candidate_contacts(segment):
+    contacts = Contact.objects.filter(user=segment.user).exclude(normalized_phone='')
+    if segment.name_contains:
+        contacts = contacts.filter(name__icontains=segment.name_contains)
+    if segment.phone_prefix:
+        contacts = contacts.filter(normalized_phone__startswith=to_e164_prefix(segment.phone_prefix))
+    return contacts
+
+
+@transaction.atomic
+def build_segment(segment):
+    """(Re)materialize every member of ``segment`` from its filters, in chunks."""
+    ContactSegmentMember.objects.filter(segment=segment).delete()
+    last_id = 0
+    while True:
+        chunk = list(
+            _candidate_contacts(segment).filter(id__gt=last_id)
+            .order_by('id').values_list('id', 'name', 'normalized_phone')[:BUILD_CHUNK_SIZE]
+        )
+        if not chunk:
+            break
+        members = []
+        for contact_id, name, phone_number in chunk:
+            if contact_matches(segment, name, phone_number):
+                members.append(ContactSegmentMember(
+                    segment=segment, contact_id=contact_id, phone_number=phone_number, phone_e164=e164_int(phone_number)
+                ))
+        ContactSegmentMember.objects.bulk_create(members)
+        last_id = chunk[-1][0]
+
+
+def refresh_contact(contact):
+    """Apply one contact's change to the segments of its owner."""
+    phone_number = contact.normalized_phone
+
+    rule_segments = ContactSegment.objects.filter(user_id=contact.user_id, kind=ContactSegment.Kind.RULE)
+    current = set(
+        ContactSegmentMember.objects.filter(contact=contact).values_list('segment_id', flat=True)
+    )
+    matching = {s.id for s in rule_segments if contact_matches(s, contact.name, phone_number)}
+    rule_ids = {s.id for s in rule_segments}
+
+    leaving = (current & rule_ids) - matching
+    if not phone_number:
+        # A group keeps its contacts, but one without a valid number can't be messaged.
+        leaving = current
+    if leaving:
+        ContactSegmentMember.objects.filter(contact=contact, segment_id__in=leaving).delete()
+
+    ContactSegmentMember.objects.bulk_create(
+        [
+            ContactSegmentMember(segment_id=sid, contact=contact, phone_number=phone_number, phone_e164=contact.phone_e164)
+            for sid in matching - current
+        ],
+        ignore_conflicts=True,
+    )
+    # Remaining memberships (groups included) follow the contact's new number.
+    if phone_number:
+        ContactSegmentMember.objects.filter(contact=contact).exclude(phone_number=phone_number).update(
+            phone_number=phone_number, phone_e164=contact.phone_e164
+        )
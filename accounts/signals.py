@@ -0,0 +1,21 @@
+# accounts/signals.py
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import Contact
+from .search import index_contact
+from .segments import refresh_contact
+
+
+@receiver(post_save, sender=Contact)
+def update_contact_search_index(sender, instance, raw=False, **kwargs):
+    # Deleting a contact cascades to its grams, so only saves need handling.
+    if not raw:
+        index_contact(instance)
+
+
+@receiver(post_save, sender=Contact)
+def update_contact_segments(sender, instance, raw=False, **kwargs):
+    # Membership rows are removed by cascade when the contact is deleted.
+    if not raw:
+        refresh_contact(instance)
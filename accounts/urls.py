@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views_ui
+from . import views, views_ui
 
 app_name = 'accounts'
 
@@ -17,5 +17,8 @@ urlpatterns = [
     path('contacts/add/', views_ui.contacts_add_view, name='contacts_add'),
     path('contacts/edit/<int:pk>/', views_ui.contacts_edit_view, name='contacts_edit'),
     path('contacts/delete/<int:pk>/', views_ui.contacts_delete_view, name='contacts_delete'),
+    path('contacts/export/', views.ContactCSVExportView.as_view(), name='contacts_export'),
+    path('segments/', views_ui.segments_list_view, name='segments_list'),
+    path('segments/delete/<int:pk>/', views_ui.segments_delete_view, name='segments_delete'),
   
 ] 
\ No newline at end of file
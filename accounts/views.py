@@ -14,8 +14,7 @@ from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
 from .models import Contact
 from rest_framework import serializers
-from django.http import HttpResponse
-import csv
+from core.streaming import stream_csv_response, EXPORT_CHUNK_SIZE
 
 class RegisterView(generics.CreateAPIView):
     queryset = CustomUser.objects.all()
@@ -109,11 +108,10 @@ class ContactCSVExportView(APIView):
     permission_classes = [IsEndUser]
 
     def get(self, request):
-        contacts = Contact.objects.filter(user=request.user)
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="contacts.csv"'
-        writer = csv.writer(response)
-        writer.writerow(['Name', 'Phone'])
-        for contact in contacts:
-            writer.writerow([contact.name, contact.phone])
-        return response            
\ No newline at end of file
+        rows = (
+            Contact.objects.filter(user=request.user)
+            .order_by('name', 'id')
+            .values_list('name', 'phone')
+            .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        )
+        return stream_csv_response(request, 'contacts.csv', ['Name', 'Phone'], rows)            
\ No newline at end of file
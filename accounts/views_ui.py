@@ -7,18 +7,22 @@ from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth import get_user_model
 from datetime import timedelta
 from django.utils import timezone
-from django.db.models import Sum, Count, Q 
+from django.db.models import Sum, Count, F, Q 
 import csv
 import io
 
-from .forms import CustomUserCreationForm, UserProfileUpdateForm, ContactForm
-from .models import Contact
+from core.pagination import keyset_paginate, approximate_count
+from .forms import CustomUserCreationForm, UserProfileUpdateForm, ContactForm, ContactSegmentForm
+from .models import Contact, ContactSegment
+from .segments import build_segment
+from .search import search_contacts
 
 
 try:
-    from messaging.models import Campaign, CampaignRecipient, MessageTemplate # Updated MessageTemplate import
+    from messaging.models import Campaign, CampaignRecipient, MessageTemplate, RecipientChunk # Updated MessageTemplate import
     CAMPAIGN_MODEL = Campaign
     RECIPIENT_MODEL = CampaignRecipient
+    CHUNK_MODEL = RecipientChunk
     MESSAGING_MODELS_AVAILABLE = True
 except ImportError:
     
@@ -34,15 +38,18 @@ except ImportError:
     class SafeModel:
         objects = SafeQuerySet()
         DoesNotExist = Exception 
-        Status = type('Status', (object,), {'SENT': 'SENT', 'PENDING': 'PENDING', 'IN_PROGRESS': 'IN_PROGRESS', 'COMPLETED': 'COMPLETED'})
+        Status = type('Status', (object,), {'SENT': 'SENT', 'DELIVERED': 'DELIVERED', 'READ': 'READ', 'PENDING': 'PENDING', 'IN_PROGRESS': 'IN_PROGRESS', 'COMPLETED': 'COMPLETED'})
 
     CAMPAIGN_MODEL = SafeModel
     RECIPIENT_MODEL = SafeModel
+    CHUNK_MODEL = SafeModel
     MESSAGING_MODELS_AVAILABLE = False
 
 
 User = get_user_model()
 
+CONTACTS_PER_PAGE = 50
+
 
 # --- Authentication Views ---
 def register_view(request):
@@ -127,11 +134,16 @@ def user_dashboard(request):
             created_at__gte=start_date
         )
         
-        # Count SENT messages from these campaigns
+        # Count SENT messages from these campaigns (delivered and read ones were sent too)
+        sent_statuses = (RECIPIENT_MODEL.Status.SENT, RECIPIENT_MODEL.Status.DELIVERED, RECIPIENT_MODEL.Status.READ)
         sent_messages = RECIPIENT_MODEL.objects.filter(
             campaign__in=campaigns_in_period,
-            status=RECIPIENT_MODEL.Status.SENT
+            status__in=sent_statuses
         ).count()
+        # Packed campaigns keep per-chunk counters instead of rows
+        sent_messages += CHUNK_MODEL.objects.filter(
+            campaign__in=campaigns_in_period
+        ).aggregate(n=Sum('sent_count')).get('n') or 0
         
         # Count PENDING recipients (messages scheduled but not yet sent)
         scheduled_messages = RECIPIENT_MODEL.objects.filter(
@@ -139,12 +151,19 @@ def user_dashboard(request):
             status=RECIPIENT_MODEL.Status.PENDING,
             campaign__status=CAMPAIGN_MODEL.Status.PENDING 
         ).count()
+        scheduled_messages += CHUNK_MODEL.objects.filter(
+            campaign__in=campaigns_in_period,
+            campaign__status=CAMPAIGN_MODEL.Status.PENDING
+        ).aggregate(n=Sum(F('size') - F('done_count'))).get('n') or 0
         
         
         total_sent_ever = RECIPIENT_MODEL.objects.filter(
             campaign__created_by=request.user,
-            status=RECIPIENT_MODEL.Status.SENT
+            status__in=sent_statuses
         ).count()
+        total_sent_ever += CHUNK_MODEL.objects.filter(
+            campaign__created_by=request.user
+        ).aggregate(n=Sum('sent_count')).get('n') or 0
 
         monthly_quota = request.user.message_quota
         remaining_quota = max(0, monthly_quota - total_sent_ever)
@@ -194,17 +213,41 @@ def contacts_list_view(request):
     user = request.user
     
     if user.is_superuser or (hasattr(user, 'user_type') and user.user_type == 'admin'):
-        # Admin: 
-        contacts = Contact.objects.all().order_by('user__username', 'name')
+        # Admin: every account's contacts, owner fetched in the same query
+        contacts = Contact.objects.select_related('user')
         is_admin = True
     else:
         # End User: 
-        contacts = Contact.objects.filter(user=user).order_by('name')
+        contacts = Contact.objects.filter(user=user)
         is_admin = False
+
+    query = request.GET.get('q', '').strip()
+    if query:
+        # Ranked trigram search (prefix, substring, then fuzzy); top matches only.
+        results = search_contacts(query, user=None if is_admin else user)
+        return render(request, 'accounts/contacts_list.html', {
+            'contacts': results,
+            'is_admin': is_admin,
+            'total_count': len(results),
+            'total_is_exact': True,
+            'query': query,
+        })
+
+    # Keyset pagination on (name, id) keeps every page as cheap as the first one.
+    page = keyset_paginate(
+        contacts,
+        ordering=('name', 'id'),
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+        per_page=CONTACTS_PER_PAGE,
+    )
+    total_count, total_is_exact = approximate_count(contacts)
         
     context = {
-        'contacts': contacts,
-        'is_admin': is_admin
+        'contacts': page,
+        'is_admin': is_admin,
+        'total_count': total_count,
+        'total_is_exact': total_is_exact,
     }
     return render(request, 'accounts/contacts_list.html', context)
 
@@ -281,4 +324,35 @@ def contacts_delete_view(request, pk):
         return redirect('accounts:contacts_list')
 
     return render(request, 'accounts/contacts_confirm_delete.html', {'contact': contact})
-  
+
+
+# --- Segments (saved audiences for campaigns) ---
+
+@login_required
+def segments_list_view(request):
+    """List the user's segments and create new ones."""
+    if request.method == 'POST':
+        form = ContactSegmentForm(request.POST)
+        if form.is_valid():
+            segment = form.save(commit=False)
+            segment.user = request.user
+            segment.save()
+            build_segment(segment)
+            messages.success(request, f'Segment "{segment.name}" created with {segment.members.count()} contacts.')
+            return redirect('accounts:segments_list')
+        for error in form.non_field_errors():
+            messages.error(request, error)
+    else:
+        form = ContactSegmentForm()
+
+    segments = ContactSegment.objects.filter(user=request.user).annotate(member_count=Count('members'))
+    return render(request, 'accounts/segments_list.html', {'segments': segments, 'form': form})
+
+
+@login_required
+def segments_delete_view(request, pk):
+    segment = get_object_or_404(ContactSegment, pk=pk, user=request.user)
+    if request.method == 'POST':
+        segment.delete()
+        messages.success(request, f'Segment "{segment.name}" deleted.')
+    return redirect('accounts:segments_list')
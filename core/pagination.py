@@ -0,0 +1,145 @@
+# core/pagination.py
+"""Keyset (cursor) pagination shared by the list views.
+
+Unlike Django's ``Paginator`` this never runs ``OFFSET`` or a full ``COUNT(*)``,
+so the cost of rendering a page does not grow with the size of the table.
+"""
+import base64
+import json
+
+from django.db import connections
+from django.db.models import Q
+
+
+class KeysetPage:
+    """One page of results plus the cursors needed to move around it."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+
+def _parse_ordering(ordering):
+    return [(f[1:], True) if f.startswith('-') else (f, False) for f in ordering]
+
+
+def encode_cursor(obj, ordering):
+    values = [getattr(obj, field) for field, _ in _parse_ordering(ordering)]
+    raw = json.dumps(values, default=str, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, model, ordering):
+    """Returns the key values stored in ``cursor``, or None if it is malformed."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        fields = _parse_ordering(ordering)
+        if not isinstance(values, list) or len(values) != len(fields):
+            return None
+        return [
+            model._meta.get_field(field).to_python(value)
+            for (field, _), value in zip(fields, values)
+        ]
+    except Exception:
+        return None
+
+
+def _keyset_filter(fields, values, backwards=False):
+    """(a, b) > (x, y)  ==>  a > x OR (a = x AND b > y), honouring per-field direction."""
+    condition = Q()
+    for i, (field, desc) in enumerate(fields):
+        lookup = 'lt' if desc != backwards else 'gt'
+        term = Q(**{f'{field}__{lookup}': values[i]})
+        for j in range(i):
+            term &= Q(**{fields[j][0]: values[j]})
+        condition |= term
+    return condition
+
+
+def keyset_paginate(queryset, ordering, after=None, before=None, per_page=25):
+    """
+    Returns a KeysetPage of ``queryset`` ordered by ``ordering``.
+
+    ``ordering`` must end in a unique field (normally ``id``) so every row has a
+    distinct position, and should match a composite index for the filter used.
+    """
+    fields = _parse_ordering(ordering)
+    model = queryset.model
+    backwards = False
+    cursor_values = None
+
+    if before:
+        cursor_values = decode_cursor(before, model, ordering)
+        backwards = cursor_values is not None
+    if cursor_values is None and after:
+        cursor_values = decode_cursor(after, model, ordering)
+
+    if backwards:
+        reverse = [f[1:] if f.startswith('-') else f'-{f}' for f in ordering]
+        qs = queryset.filter(_keyset_filter(fields, cursor_values, backwards=True)).order_by(*reverse)
+    elif cursor_values is not None:
+        qs = queryset.filter(_keyset_filter(fields, cursor_values)).order_by(*ordering)
+    else:
+        qs = queryset.order_by(*ordering)
+
+    rows = list(qs[:per_page + 1])
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    if backwards:
+        rows.reverse()
+        has_next, has_previous = True, has_more
+    else:
+        has_next, has_previous = has_more, cursor_values is not None
+
+    return KeysetPage(
+        rows,
+        next_cursor=encode_cursor(rows[-1], ordering) if rows and has_next else None,
+        previous_cursor=encode_cursor(rows[0], ordering) if rows and has_previous else None,
+    )
+
+
+def approximate_count(queryset, exact_up_to=10000):
+    """
+    Cheap row count for display purposes. Returns ``(count, is_exact)``.
+
+    Small results are counted exactly with a bounded ``COUNT`` that stops after
+    ``exact_up_to`` rows. Anything larger falls back to the planner's estimate on
+    PostgreSQL, or is reported as ``exact_up_to`` elsewhere.
+    """
+    bounded = queryset.order_by()[:exact_up_to + 1].count()
+    if bounded <= exact_up_to:
+        return bounded, True
+
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        sql, params = queryset.order_by().query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        estimate = int(plan[0]['Plan']['Plan Rows'])
+        return max(estimate, exact_up_to), False
+
+    return exact_up_to, False
@@ -0,0 +1,149 @@
+# core/phones.py
+"""Phone number normalization shared by contacts, segments and campaigns."""
+import re
+
+from django.conf import settings
+from django.db.models import BigIntegerField, Max, Min
+from django.db.models.functions import Cast, Substr
+
+BACKFILL_CHUNK_SIZE = 5000  # ids per UPDATE in backfill_e164
+
+# Calling code -> IANA timezone used for send windows. Countries that span
+# several zones map to the zone most of their population lives in.
+CALLING_CODE_TIMEZONES = {
+    '1': 'America/New_York',
+    '7': 'Europe/Moscow',
+    '20': 'Africa/Cairo',
+    '27': 'Africa/Johannesburg',
+    '30': 'Europe/Athens',
+    '31': 'Europe/Amsterdam',
+    '32': 'Europe/Brussels',
+    '33': 'Europe/Paris',
+    '34': 'Europe/Madrid',
+    '39': 'Europe/Rome',
+    '40': 'Europe/Bucharest',
+    '41': 'Europe/Zurich',
+    '43': 'Europe/Vienna',
+    '44': 'Europe/London',
+    '45': 'Europe/Copenhagen',
+    '46': 'Europe/Stockholm',
+    '47': 'Europe/Oslo',
+    '48': 'Europe/Warsaw',
+    '49': 'Europe/Berlin',
+    '51': 'America/Lima',
+    '52': 'America/Mexico_City',
+    '54': 'America/Argentina/Buenos_Aires',
+    '55': 'America/Sao_Paulo',
+    '56': 'America/Santiago',
+    '57': 'America/Bogota',
+    '60': 'Asia/Kuala_Lumpur',
+    '61': 'Australia/Sydney',
+    '62': 'Asia/Jakarta',
+    '63': 'Asia/Manila',
+    '64': 'Pacific/Auckland',
+    '65': 'Asia/Singapore',
+    '66': 'Asia/Bangkok',
+    '81': 'Asia/Tokyo',
+    '82': 'Asia/Seoul',
+    '84': 'Asia/Ho_Chi_Minh',
+    '86': 'Asia/Shanghai',
+    '90': 'Europe/Istanbul',
+    '91': 'Asia/Kolkata',
+    '92': 'Asia/Karachi',
+    '93': 'Asia/Kabul',
+    '94': 'Asia/Colombo',
+    '95': 'Asia/Yangon',
+    '98': 'Asia/Tehran',
+    '212': 'Africa/Casablanca',
+    '213': 'Africa/Algiers',
+    '216': 'Africa/Tunis',
+    '233': 'Africa/Accra',
+    '234': 'Africa/Lagos',
+    '254': 'Africa/Nairobi',
+    '255': 'Africa/Dar_es_Salaam',
+    '256': 'Africa/Kampala',
+    '351': 'Europe/Lisbon',
+    '353': 'Europe/Dublin',
+    '358': 'Europe/Helsinki',
+    '380': 'Europe/Kyiv',
+    '852': 'Asia/Hong_Kong',
+    '880': 'Asia/Dhaka',
+    '960': 'Indian/Maldives',
+    '961': 'Asia/Beirut',
+    '962': 'Asia/Amman',
+    '963': 'Asia/Damascus',
+    '964': 'Asia/Baghdad',
+    '965': 'Asia/Kuwait',
+    '966': 'Asia/Riyadh',
+    '967': 'Asia/Aden',
+    '968': 'Asia/Muscat',
+    '970': 'Asia/Gaza',
+    '971': 'Asia/Dubai',
+    '972': 'Asia/Jerusalem',
+    '973': 'Asia/Bahrain',
+    '974': 'Asia/Qatar',
+    '977': 'Asia/Kathmandu',
+    '994': 'Asia/Baku',
+    '996': 'Asia/Bishkek',
+    '998': 'Asia/Tashkent',
+}
+
+
+def to_e164(number):
+    """
+    Normalize a number to E.164; returns None if invalid. Pakistani numbers
+    may be written locally (03XX..., 3XX...) and become +92XXXXXXXXXX;
+    other countries need their international prefix ("+" or "00").
+    """
+    raw = str(number).strip()
+    international = raw.startswith(('+', '00'))
+    number = re.sub(r'\D', '', raw)
+    if raw.startswith('00'):
+        number = number[2:]
+    if not international:
+        if len(number) == 10 and number.startswith('3'):
+            number = '92' + number
+        elif len(number) == 11 and number.startswith('03'):
+            number = '92' + number[1:]
+    if number.startswith('92'):
+        return f"+{number}" if len(number) == 12 else None
+    if international and 8 <= len(number) <= 15 and not number.startswith('0'):
+        return f"+{number}"
+    return None
+
+
+def e164_int(phone_number):
+    """'+923001234567' -> 923001234567, the indexed integer form; None for anything else."""
+    if phone_number and phone_number[0] == '+' and phone_number[1:].isdigit():
+        return int(phone_number[1:])
+    return None
+
+
+def backfill_e164(model, phone_field, chunk_size=BACKFILL_CHUNK_SIZE):
+    """
+    Fill ``model.phone_e164`` from the normalized ``phone_field`` where it is
+    still empty, one id range per UPDATE so no statement locks the whole
+    table. Works on historical models too. Returns how many rows were set.
+    """
+    missing = model._default_manager.filter(
+        phone_e164__isnull=True, **{f'{phone_field}__regex': r'^\+[0-9]{8,15}$'}
+    )
+    bounds = model._default_manager.aggregate(low=Min('id'), high=Max('id'))
+    if bounds['low'] is None:
+        return 0
+    updated = 0
+    for start in range(bounds['low'], bounds['high'] + 1, chunk_size):
+        updated += missing.filter(id__gte=start, id__lt=start + chunk_size).update(
+            phone_e164=Cast(Substr(phone_field, 2), BigIntegerField())
+        )
+    return updated
+
+
+def timezone_for(phone_number):
+    """IANA timezone of a normalized number, from its calling code; TIME_ZONE if unknown."""
+    digits = phone_number.lstrip('+')
+    for length in (3, 2, 1):
+        tz = CALLING_CODE_TIMEZONES.get(digits[:length])
+        if tz:
+            return tz
+    return settings.TIME_ZONE
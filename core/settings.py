@@ -8,6 +8,14 @@ import os
 from datetime import timedelta
 from dotenv import load_dotenv
 WHATSAPP_NODE_URL = os.environ.get("WHATSAPP_NODE_URL", "https://qr-code-sy0s.onrender.com")
+# Seconds a gateway session status is served from cache (the connect page polls every 5s).
+WHATSAPP_STATUS_TTL = int(os.environ.get("WHATSAPP_STATUS_TTL", 4))
+WHATSAPP_GATEWAY_URL = os.environ.get("WHATSAPP_GATEWAY_URL", f"{WHATSAPP_NODE_URL}/send-message")
+# Session health monitor: check interval and how long a result stays trusted.
+WHATSAPP_HEALTH_INTERVAL = int(os.environ.get("WHATSAPP_HEALTH_INTERVAL", 30))
+WHATSAPP_HEALTH_TTL = WHATSAPP_HEALTH_INTERVAL * 3
+# Shared secret the gateway sends (X-Webhook-Secret) with delivery receipts.
+WHATSAPP_WEBHOOK_SECRET = os.environ.get("WHATSAPP_WEBHOOK_SECRET", "")
 
 
 
@@ -80,16 +88,55 @@ TEMPLATES = [
 import dj_database_url
 
 
+# Served over ASGI: persistent connections don't fit async request handling,
+# so PostgreSQL uses psycopg's connection pool instead.
 DATABASES = {
     'default': dj_database_url.config(
         default=os.getenv("DATABASE_URL"),
-        conn_max_age=600,
+        conn_max_age=0,
     )
 }
+if DATABASES['default'].get('ENGINE') == 'django.db.backends.postgresql':
+    DATABASES['default'].setdefault('OPTIONS', {})['pool'] = True
 
 # Optional: Add a check to fail explicitly if the DB URL is missing
 if not DATABASES['default']:
     print("WARNING: DATABASE_URL environment variable is not set. This will fail on Render.")
+# --- Cache ---
+# Redis in production so every web/worker process shares one cache; local memory otherwise.
+REDIS_URL = os.getenv("REDIS_URL")
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# --- AI Drafting (Gemini) ---
+GEMINI_API_KEY = os.environ.get("API_KEY")
+# Point at a local stand-in for tests/development, e.g. http://127.0.0.1:8081/v1beta
+GEMINI_API_URL = os.environ.get("GEMINI_API_URL", "https://generativelanguage.googleapis.com/v1beta")
+AI_DRAFT_CACHE_SIZE = int(os.environ.get("AI_DRAFT_CACHE_SIZE", 512))
+AI_DRAFT_CACHE_TTL = int(os.environ.get("AI_DRAFT_CACHE_TTL", 600))  # seconds
+AI_DRAFT_CONCURRENCY = int(os.environ.get("AI_DRAFT_CONCURRENCY", 4))  # parallel upstream calls per batch
+
+# --- Campaign dispatch ---
+# Campaigns are sent in fair-share slices by at most this many Celery tasks at once.
+CAMPAIGN_DISPATCH_SLOTS = int(os.environ.get("CAMPAIGN_DISPATCH_SLOTS", 4))
+# At most this many messages from one user to one number per window, across
+# campaigns; numbers over it are skipped as CAPPED. 0 (the default) turns the
+# cap off. Needs REDIS_URL: the counters must live in a shared cache.
+FREQUENCY_CAP_MESSAGES = int(os.environ.get("FREQUENCY_CAP_MESSAGES", 0))
+FREQUENCY_CAP_WINDOW = int(os.environ.get("FREQUENCY_CAP_WINDOW", 24 * 60 * 60))  # seconds
+
 # --- REST Framework ---
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
@@ -135,3 +182,24 @@ USE_TZ = True
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Fallback for login-required redirects
 LOGIN_URL = '/login/'
+
+# --- Celery ---
+# Drafts and other slow work run on workers; results are handed back through CACHES.
+CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", REDIS_URL or "redis://localhost:6379/0")
+CELERY_TIMEZONE = TIME_ZONE
+CELERY_TASK_ALWAYS_EAGER = os.getenv("CELERY_TASK_ALWAYS_EAGER", "False") == "True"
+CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
+CELERY_BEAT_SCHEDULE = {
+    'monitor-whatsapp-sessions': {
+        'task': 'messaging.tasks.monitor_session_health',
+        'schedule': WHATSAPP_HEALTH_INTERVAL,
+    },
+    'wake-campaign-dispatch': {
+        'task': 'messaging.tasks.wake_dispatch_slots',
+        'schedule': 60,
+    },
+    'flush-delivery-receipts': {
+        'task': 'messaging.tasks.flush_delivery_receipts',
+        'schedule': 5,
+    },
+}
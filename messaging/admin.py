@@ -1,5 +1,10 @@
 from django.contrib import admin
-from .models import MessageTemplate, Campaign, CampaignRecipient
+from django.template.response import TemplateResponse
+from django.urls import path
+
+from core.phones import e164_int, to_e164
+from . import history
+from .models import MessageTemplate, Campaign, CampaignRecipient, CampaignRecurrence, SuppressedNumber
 
 @admin.register(MessageTemplate)
 class MessageTemplateAdmin(admin.ModelAdmin):
@@ -32,6 +37,16 @@ class CampaignAdmin(admin.ModelAdmin):
     search_fields = ('name',)
     readonly_fields = ('created_at', 'completed_at')
 
+@admin.register(CampaignRecurrence)
+class CampaignRecurrenceAdmin(admin.ModelAdmin):
+    """
+    Recurring campaigns. Their beat entries are listed under Periodic Tasks.
+    """
+    list_display = ('name', 'cron', 'created_by', 'recipient_source', 'is_active', 'created_at')
+    list_filter = ('is_active', 'created_by')
+    search_fields = ('name',)
+    readonly_fields = ('created_at', 'periodic_task')
+
 @admin.register(CampaignRecipient)
 class CampaignRecipientAdmin(admin.ModelAdmin):
     """
@@ -40,4 +55,70 @@ class CampaignRecipientAdmin(admin.ModelAdmin):
     list_display = ('phone_number', 'campaign', 'status', 'sent_at')
     list_filter = ('status', 'campaign__name')
     search_fields = ('phone_number',)
-    readonly_fields = ('sent_at',)
\ No newline at end of file
+    readonly_fields = ('sent_at',)
+    change_list_template = 'admin/messaging/campaignrecipient/change_list.html'
+
+    def get_search_results(self, request, queryset, search_term):
+        # A full number is an indexed integer match instead of a LIKE scan.
+        number = e164_int(to_e164(search_term) or '') if search_term else None
+        if number is not None:
+            return queryset.filter(phone_e164=number), False
+        return super().get_search_results(request, queryset, search_term)
+
+    def get_urls(self):
+        return [
+            path('phone-history/', self.admin_site.admin_view(self.phone_history_view), name='messaging_phone_history'),
+        ] + super().get_urls()
+
+    def phone_history_view(self, request):
+        """Everything sent to one number, across campaigns and users."""
+        phone = request.GET.get('phone', '').strip()
+        page, error = None, None
+        if phone:
+            try:
+                page = history.history_page(phone, after=request.GET.get('after'))
+            except ValueError as e:
+                error = str(e)
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Phone history',
+            'phone': phone,
+            'page': page,
+            'error': error,
+        }
+        return TemplateResponse(request, 'admin/messaging/phone_history.html', context)
+
+@admin.register(SuppressedNumber)
+class SuppressedNumberAdmin(admin.ModelAdmin):
+    """
+    Opt-out list. Entries without a user apply to every account.
+    """
+    list_display = ('phone_number', 'user', 'reason', 'created_at')
+    list_filter = ('user',)
+    search_fields = ('phone_number',)
+    readonly_fields = ('created_at',)
+
+    def get_queryset(self, request):
+        if request.user.is_superuser:
+            return super().get_queryset(request)
+        return super().get_queryset(request).filter(user=request.user)
+
+    # Staff who aren't superusers only manage their own account's entries.
+    # The field stays on the form, locked to them, so the uniqueness checks
+    # on (user, phone_number) still run.
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name == 'user' and not request.user.is_superuser:
+            kwargs.update(
+                queryset=db_field.related_model.objects.filter(pk=request.user.pk),
+                initial=request.user.pk, required=True, empty_label=None,
+            )
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+    def get_list_filter(self, request):
+        return self.list_filter if request.user.is_superuser else ()
+
+    def save_model(self, request, obj, form, change):
+        if not request.user.is_superuser:
+            obj.user = request.user
+        super().save_model(request, obj, form, change)
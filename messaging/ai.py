@@ -0,0 +1,254 @@
+# messaging/ai.py
+"""
+Gemini message drafting.
+
+Drafts are generated by the ``generate_ai_draft`` Celery task so a slow or
+failing upstream never holds a web worker; the web side (async views, hence
+the coroutines) only looks up results and starts jobs. Results are cached by a hash of the normalized prompt, both
+in a small in-process LRU (with TTL) and in the shared Django cache, and an
+identical prompt that is already being drafted joins the existing job instead
+of starting another upstream call.
+
+Batches (``start_batch``) ask for several variants per prompt in one upstream
+call and save every draft as a MessageTemplate for A/B testing.
+"""
+import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+GEMINI_MODEL = "gemini-2.5-flash-preview-09-2025"
+SYSTEM_INSTRUCTION = "You are a marketing assistant. Draft short, catchy WhatsApp/SMS messages using emojis."
+MAX_RETRIES = 5
+INITIAL_DELAY = 1  # seconds, doubled on every retry
+REQUEST_TIMEOUT = 30  # seconds per upstream call
+MAX_VARIANTS = 8  # Gemini's candidateCount limit
+MAX_BATCH_PROMPTS = 10
+# Seconds a draft job is remembered: every attempt timing out plus the
+# backoff between them, with some slack for the task to reach a worker. A
+# batch attempt makes its calls AI_DRAFT_CONCURRENCY at a time.
+RETRY_BACKOFF = INITIAL_DELAY * (2 ** MAX_RETRIES - 1)
+JOB_TIMEOUT = (MAX_RETRIES + 1) * REQUEST_TIMEOUT + RETRY_BACKOFF + 60
+BATCH_JOB_TIMEOUT = (
+    (MAX_RETRIES + 1) * REQUEST_TIMEOUT * -(-MAX_BATCH_PROMPTS // max(1, settings.AI_DRAFT_CONCURRENCY))
+    + RETRY_BACKOFF + 60
+)
+
+JOB_PENDING = 'PENDING'
+JOB_FAILED = 'FAILED'
+
+
+class DraftError(Exception):
+    """
+    Drafting failed; ``status`` is the HTTP status to report to the client and
+    ``retryable`` tells the task whether another attempt may succeed.
+    """
+
+    def __init__(self, message, status=500, retryable=False):
+        super().__init__(message)
+        self.status = status
+        self.retryable = retryable
+
+
+def normalize_prompt(prompt):
+    return ' '.join(prompt.split()).casefold()
+
+
+def prompt_key(prompt):
+    return hashlib.sha256(normalize_prompt(prompt).encode()).hexdigest()
+
+
+def gemini_url():
+    # GEMINI_API_URL can point at a local stand-in for tests and development.
+    return f"{settings.GEMINI_API_URL.rstrip('/')}/models/{GEMINI_MODEL}:generateContent?key={settings.GEMINI_API_KEY}"
+
+
+def request_drafts(prompt, candidates=1):
+    """A single Gemini call returning ``candidates`` drafts. Raises DraftError."""
+    payload = {
+        "contents": [{"parts": [{"text": prompt}]}],
+        "systemInstruction": {"parts": [{"text": SYSTEM_INSTRUCTION}]},
+    }
+    if candidates > 1:
+        payload["generationConfig"] = {"candidateCount": candidates}
+
+    try:
+        resp = requests.post(gemini_url(), json=payload, headers={'Content-Type': 'application/json'}, timeout=REQUEST_TIMEOUT)
+        resp.raise_for_status()
+        body = resp.json()
+    except ValueError:
+        raise DraftError('AI service returned a non-JSON response.', status=503, retryable=True)
+    except requests.exceptions.HTTPError as err:
+        code = err.response.status_code
+        raise DraftError(f"HTTP {code}: {err}", status=code if code < 500 else 503, retryable=code >= 500)
+    except requests.exceptions.RequestException as err:
+        raise DraftError(str(err), status=503, retryable=True)
+
+    if not isinstance(body, dict):
+        raise DraftError('Unexpected AI response.', status=500)
+    try:
+        drafts = [
+            (c.get('content', {}).get('parts') or [{}])[0].get('text')
+            for c in body.get('candidates') or []
+        ]
+    except (AttributeError, IndexError, TypeError):
+        raise DraftError('Unexpected AI response.', status=500)
+    drafts = [d for d in drafts if isinstance(d, str) and d]
+    if not drafts:
+        raise DraftError('Empty AI response.', status=500)
+    return drafts
+
+
+def draft_batch(prompts, variants=1):
+    """
+    ``variants`` drafts for each prompt: one upstream call per prompt, run in
+    parallel on at most AI_DRAFT_CONCURRENCY threads. Returns a list of draft
+    lists, in prompt order.
+    """
+    workers = max(1, min(settings.AI_DRAFT_CONCURRENCY, len(prompts)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(lambda p: request_drafts(p, candidates=variants), prompts))
+
+
+class DraftCache:
+    """Thread-safe in-process LRU with a TTL, in front of the shared cache."""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+
+DRAFT_CACHE = DraftCache(settings.AI_DRAFT_CACHE_SIZE, settings.AI_DRAFT_CACHE_TTL)
+
+STAT_NAMES = ('hits', 'misses', 'coalesced')
+
+
+def _result_key(key):
+    return f'ai-draft:result:{key}'
+
+
+def _job_key(key):
+    return f'ai-draft:job:{key}'
+
+
+async def _count(stat):
+    try:
+        await cache.aincr(f'ai-draft:stats:{stat}')
+    except ValueError:
+        await cache.aadd(f'ai-draft:stats:{stat}', 0, timeout=None)
+        await cache.aincr(f'ai-draft:stats:{stat}')
+
+
+async def cached_draft(key):
+    draft = DRAFT_CACHE.get(key)
+    if draft is None:
+        draft = await cache.aget(_result_key(key))
+        if draft is not None:
+            DRAFT_CACHE.set(key, draft)
+    return draft
+
+
+def store_draft(key, draft):
+    cache.set(_result_key(key), draft, settings.AI_DRAFT_CACHE_TTL)
+    cache.delete(_job_key(key))
+    DRAFT_CACHE.set(key, draft)
+
+
+def fail_job(key, message, status, timeout=JOB_TIMEOUT):
+    cache.set(_job_key(key), {'status': JOB_FAILED, 'message': message, 'code': status}, timeout)
+
+
+async def start_draft(prompt):
+    """
+    Returns ``(key, draft)``. ``draft`` is None when the caller has to poll
+    ``job_state(key)``: a job was enqueued, or an identical one was running.
+    """
+    from .tasks import generate_ai_draft
+
+    key = prompt_key(prompt)
+    draft = await cached_draft(key)
+    if draft is not None:
+        await _count('hits')
+        return key, draft
+
+    job = await cache.aget(_job_key(key))
+    if job and job['status'] == JOB_FAILED:
+        await cache.adelete(_job_key(key))  # let the user try again
+
+    if await cache.aadd(_job_key(key), {'status': JOB_PENDING}, JOB_TIMEOUT):
+        await _count('misses')
+        await sync_to_async(generate_ai_draft.delay)(key, prompt)
+    else:
+        await _count('coalesced')
+    return key, None
+
+
+async def start_batch(user, prompts, variants, title):
+    """Enqueue a batch drafting job and return its id for ``job_state``."""
+    from .tasks import generate_ai_draft_batch
+
+    job_id = uuid.uuid4().hex
+    await cache.aset(_job_key(job_id), {'status': JOB_PENDING}, BATCH_JOB_TIMEOUT)
+    await sync_to_async(generate_ai_draft_batch.delay)(job_id, user.pk, prompts, variants, title)
+    return job_id
+
+
+def finish_batch(job_id, templates):
+    cache.set(_job_key(job_id), {
+        'status': 'SUCCESS',
+        'templates': [{'id': t.pk, 'title': t.title, 'content': t.content} for t in templates],
+    }, BATCH_JOB_TIMEOUT)
+
+
+async def job_state(key):
+    """
+    ``{'status': 'SUCCESS', 'draft': ...}`` (or ``'templates'`` for a batch),
+    the pending/failed job, or None.
+    """
+    draft = await cached_draft(key)
+    if draft is not None:
+        return {'status': 'SUCCESS', 'draft': draft}
+    return await cache.aget(_job_key(key))
+
+
+def stats():
+    counts = cache.get_many([f'ai-draft:stats:{s}' for s in STAT_NAMES])
+    result = {s: counts.get(f'ai-draft:stats:{s}', 0) for s in STAT_NAMES}
+    lookups = sum(result.values())
+    result['hit_ratio'] = round((result['hits'] + result['coalesced']) / lookups, 4) if lookups else 0.0
+    result['local_entries'] = len(DRAFT_CACHE)
+    result['local_evictions'] = DRAFT_CACHE.evictions
+    return result
@@ -0,0 +1,86 @@
+# messaging/catalog.py
+"""
+Cached message template catalog.
+
+Templates made by superusers are shared with everyone and cached once; each
+user's own templates are cached per user. Keys carry a version number that the
+MessageTemplate save/delete signals bump, so stale entries are never read and
+simply expire.
+"""
+import json
+import time
+
+from django.core.cache import cache
+
+from .models import MessageTemplate
+
+CATALOG_TIMEOUT = 60 * 60  # seconds
+
+SHARED_SCOPE = 'shared'
+
+# Same escaping as Django's json_script filter, so the blob is safe inside <script>.
+_JSON_SCRIPT_ESCAPES = {ord('>'): '\\u003E', ord('<'): '\\u003C', ord('&'): '\\u0026'}
+
+
+def _scope_for_user(user_id):
+    return f'user:{user_id}'
+
+
+def _version_key(scope):
+    return f'templates:version:{scope}'
+
+
+def _get_version(scope):
+    # Seed with the clock rather than 1 so an evicted counter never restarts at
+    # a version whose data might still be cached.
+    cache.add(_version_key(scope), time.time_ns(), timeout=None)
+    return cache.get(_version_key(scope))
+
+
+def bump_version(scope):
+    try:
+        cache.incr(_version_key(scope))
+    except ValueError:
+        cache.set(_version_key(scope), time.time_ns(), timeout=None)
+
+
+def invalidate_for_owner(owner):
+    """Drop cached catalogs that include templates created by ``owner``."""
+    bump_version(_scope_for_user(owner.pk))
+    if owner.is_superuser:
+        bump_version(SHARED_SCOPE)
+
+
+def _cached_templates(scope, queryset):
+    key = f'templates:{scope}:v{_get_version(scope)}'
+    templates = cache.get(key)
+    if templates is None:
+        templates = list(queryset.values('id', 'title', 'content'))
+        cache.set(key, templates, CATALOG_TIMEOUT)
+    return templates
+
+
+def get_template_catalog(user):
+    """Templates visible to ``user`` (their own plus superusers'), sorted by title."""
+    shared = _cached_templates(
+        SHARED_SCOPE, MessageTemplate.objects.filter(created_by__is_superuser=True)
+    )
+    own = _cached_templates(
+        _scope_for_user(user.pk), MessageTemplate.objects.filter(created_by=user)
+    )
+    merged = {t['id']: t for t in shared}
+    merged.update((t['id'], t) for t in own)
+    return sorted(merged.values(), key=lambda t: t['title'])
+
+
+def get_templates_json(user):
+    """``{id: content}`` for the campaign form, serialized once per catalog version."""
+    versions = (_get_version(SHARED_SCOPE), _get_version(_scope_for_user(user.pk)))
+    key = f'templates:json:{user.pk}:v{versions[0]}:{versions[1]}'
+    blob = cache.get(key)
+    if blob is None:
+        blob = json.dumps(
+            {t['id']: t['content'] for t in get_template_catalog(user)}
+        ).translate(_JSON_SCRIPT_ESCAPES)
+        cache.set(key, blob, CATALOG_TIMEOUT)
+    return blob
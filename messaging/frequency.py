@@ -0,0 +1,95 @@
+# messaging/frequency.py
+"""
+Cross-campaign frequency caps.
+
+One user may send a number at most FREQUENCY_CAP_MESSAGES messages per
+FREQUENCY_CAP_WINDOW seconds, whatever campaigns they come from. Each
+(user, number) pair has a single cache entry: a few ``(bucket, count)``
+pairs, the window being split into WINDOW_BUCKETS buckets, which makes it a
+sliding window at bucket resolution. The dispatcher reads a whole batch's
+counters with one get_many before sending and writes the sent numbers back
+with one set_many; there are no per-message lookups.
+
+The counters must be shared by every worker, so the cap stays off on a
+process-local cache backend (a system check warns about it). It is best
+effort: two slots sending the same user's campaigns at the same moment can
+each let one message through to the same number before either writes its
+counters back.
+"""
+import time
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import cache
+
+WINDOW_BUCKETS = 24
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def shared_cache():
+    """Whether the default cache is seen by every worker process."""
+    return settings.CACHES['default']['BACKEND'] not in LOCAL_CACHE_BACKENDS
+
+
+def enabled():
+    return settings.FREQUENCY_CAP_MESSAGES > 0 and shared_cache()
+
+
+@checks.register()
+def check_shared_cache(app_configs, **kwargs):
+    if settings.FREQUENCY_CAP_MESSAGES > 0 and not shared_cache():
+        return [checks.Warning(
+            "FREQUENCY_CAP_MESSAGES is set but the default cache is local to each process, "
+            "so frequency caps are not enforced.",
+            hint="Set REDIS_URL so the counters live in a shared cache.",
+            id='messaging.W001',
+        )]
+    return []
+
+
+def _key(user_id, phone):
+    return f'fcap:{user_id}:{phone}'
+
+
+def _bucket_seconds():
+    return max(1, settings.FREQUENCY_CAP_WINDOW // WINDOW_BUCKETS)
+
+
+def _now_bucket():
+    return int(time.time()) // _bucket_seconds()
+
+
+def load(user_id, phones):
+    """``{phone: [(bucket, count), ...]}`` for the buckets still inside the window."""
+    if not enabled() or not phones:
+        return {}
+    oldest = _now_bucket() - WINDOW_BUCKETS + 1
+    stored = cache.get_many([_key(user_id, p) for p in phones])
+    counters = {}
+    for phone in phones:
+        pairs = [(b, n) for b, n in stored.get(_key(user_id, phone), ()) if b >= oldest]
+        if pairs:
+            counters[phone] = pairs
+    return counters
+
+
+def capped(counters):
+    """Numbers in ``counters`` that already had their share of messages in the window."""
+    limit = settings.FREQUENCY_CAP_MESSAGES
+    return {phone for phone, pairs in counters.items() if sum(n for _, n in pairs) >= limit}
+
+
+def add(user_id, counters, phones):
+    """Count one message to each of ``phones``, on top of the ``counters`` loaded for the batch."""
+    if not enabled() or not phones:
+        return
+    bucket = _now_bucket()
+    updates = {}
+    for phone in phones:
+        pairs = dict(counters.get(phone, ()))
+        pairs[bucket] = pairs.get(bucket, 0) + 1
+        updates[_key(user_id, phone)] = tuple(sorted(pairs.items()))
+    cache.set_many(updates, timeout=settings.FREQUENCY_CAP_WINDOW + _bucket_seconds())
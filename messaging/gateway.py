@@ -0,0 +1,258 @@
+# messaging/gateway.py
+"""
+Calls to the Node.js WhatsApp gateway.
+
+Session status is cached per user for WHATSAPP_STATUS_TTL seconds, so however
+many tabs poll the connect page, the gateway sees at most one status request
+per user per TTL. Concurrent misses are coalesced: threads of one process
+share a lock, and processes race on ``cache.add`` so only the winner calls
+the gateway while the others wait for its result.
+
+Session health (connected or not) is kept in the cache as well. The
+``monitor_session_health`` beat task refreshes it for every user with live
+campaigns, and the campaign dispatcher reads it to pause instead of sending
+into a dead session.
+
+The web views use the ``a*`` coroutines over httpx, so a slow gateway only
+parks a coroutine, not a worker; Celery tasks use the blocking functions.
+"""
+import asyncio
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import requests
+from django.conf import settings
+from django.core.cache import cache
+
+FETCH_LOCK_TIMEOUT = 10  # seconds; matches the gateway GET timeout
+FETCH_WAIT_STEP = 0.1
+HEALTH_CHECK_CONCURRENCY = 16
+SEND_TIMEOUT = 15
+
+# Striped locks: bounded memory, and users rarely share a stripe.
+_LOCKS = [threading.Lock() for _ in range(64)]
+
+# Event loop -> (AsyncClient, {user_id: in-flight status fetch}). An httpx
+# client can't be shared between loops, so each loop gets its own.
+_LOOP_STATE = weakref.WeakKeyDictionary()
+
+
+def node_request(method, endpoint, user_id, data=None):
+    """One gateway call. Returns ``(http_status, payload)``, never raises."""
+    node_url = f"{settings.WHATSAPP_NODE_URL}/{endpoint}"
+    headers = {'Content-Type': 'application/json'}
+    payload = data or {}
+
+    try:
+        if method.lower() == 'post':
+            payload['userId'] = user_id
+            response = requests.post(node_url, json=payload, headers=headers, timeout=30)
+        else:
+            response = requests.get(node_url, params={'userId': user_id}, timeout=FETCH_LOCK_TIMEOUT)
+
+        response.raise_for_status()
+        return 200, response.json()
+
+    except requests.exceptions.RequestException as e:
+        return 503, {'status': 'ERROR', 'message': f'WhatsApp service failed or timed out: {e}'}
+
+
+def _status_key(user_id):
+    return f'whatsapp:status:{user_id}'
+
+
+def _fetch_key(user_id):
+    return f'whatsapp:status:fetching:{user_id}'
+
+
+def _health_key(user_id):
+    return f'whatsapp:health:{user_id}'
+
+
+def is_connected(result):
+    http_status, payload = result
+    return http_status == 200 and payload.get('status') == 'CONNECTED'
+
+
+def record_statuses(results):
+    """Cache a ``{user_id: (http_status, payload)}`` batch as status and health."""
+    # Errors are cached too, so an unreachable gateway isn't hammered by every poll.
+    cache.set_many({_status_key(u): r for u, r in results.items()}, settings.WHATSAPP_STATUS_TTL)
+    cache.set_many({_health_key(u): is_connected(r) for u, r in results.items()}, settings.WHATSAPP_HEALTH_TTL)
+
+
+def _fetch_and_store(user_id):
+    result = node_request('get', 'status', user_id)
+    record_statuses({user_id: result})
+    return result
+
+
+def get_session_status(user_id):
+    """``(http_status, payload)`` for the user's session, from cache when fresh."""
+    result = cache.get(_status_key(user_id))
+    if result is not None:
+        return result
+
+    with _LOCKS[user_id % len(_LOCKS)]:
+        result = cache.get(_status_key(user_id))
+        if result is not None:
+            return result
+
+        if cache.add(_fetch_key(user_id), 1, FETCH_LOCK_TIMEOUT):
+            try:
+                return _fetch_and_store(user_id)
+            finally:
+                cache.delete(_fetch_key(user_id))
+
+        # Another process is asking the gateway; wait for its answer.
+        deadline = time.monotonic() + FETCH_LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(FETCH_WAIT_STEP)
+            result = cache.get(_status_key(user_id))
+            if result is not None:
+                return result
+        return _fetch_and_store(user_id)
+
+
+def invalidate_session_status(user_id):
+    cache.delete_many([_status_key(user_id), _health_key(user_id)])
+
+
+def session_health(user_id):
+    """True/False from the last check, or None if the session hasn't been checked recently."""
+    return cache.get(_health_key(user_id))
+
+
+def check_sessions(user_ids):
+    """
+    Ask the gateway for every user's status in parallel and record the results.
+    Returns ``{user_id: connected}``.
+    """
+    user_ids = list(user_ids)
+    if not user_ids:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(HEALTH_CHECK_CONCURRENCY, len(user_ids))) as pool:
+        results = dict(zip(user_ids, pool.map(lambda u: node_request('get', 'status', u), user_ids)))
+    record_statuses(results)
+    return {u: is_connected(r) for u, r in results.items()}
+
+
+def is_session_healthy(user_id):
+    """Cached health, falling back to one (coalesced) status check."""
+    healthy = session_health(user_id)
+    if healthy is None:
+        healthy = is_connected(get_session_status(user_id))
+    return healthy
+
+
+def send_message(user_id, phone, message, idempotency_key=None):
+    """
+    Send one WhatsApp message. Returns ``(ok, error, transport_error)``;
+    ``transport_error`` means the gateway itself could not be reached or
+    failed, as opposed to rejecting this one message. The gateway should
+    drop a second send with the same ``idempotency_key``.
+    """
+    payload = {"userId": user_id, "phone": phone, "message": message}
+    headers = {}
+    if idempotency_key:
+        payload["idempotencyKey"] = idempotency_key
+        headers["Idempotency-Key"] = idempotency_key
+    try:
+        response = requests.post(settings.WHATSAPP_GATEWAY_URL, json=payload, headers=headers, timeout=SEND_TIMEOUT)
+        response.raise_for_status()
+        return True, None, False
+    except requests.exceptions.HTTPError as e:
+        return False, str(e), e.response.status_code >= 500
+    except requests.exceptions.RequestException as e:
+        return False, str(e), True
+
+
+# ---------- async (web views) ----------
+
+def _loop_state():
+    loop = asyncio.get_running_loop()
+    state = _LOOP_STATE.get(loop)
+    if state is None:
+        state = _LOOP_STATE[loop] = (httpx.AsyncClient(), {})
+    return state
+
+
+async def anode_request(method, endpoint, user_id, data=None):
+    """Async ``node_request``."""
+    client, _ = _loop_state()
+    node_url = f"{settings.WHATSAPP_NODE_URL}/{endpoint}"
+    payload = data or {}
+
+    try:
+        if method.lower() == 'post':
+            payload['userId'] = user_id
+            response = await client.post(node_url, json=payload, timeout=30)
+        else:
+            response = await client.get(node_url, params={'userId': user_id}, timeout=FETCH_LOCK_TIMEOUT)
+
+        response.raise_for_status()
+        return 200, response.json()
+
+    # ValueError: a non-JSON body, which requests would have reported as a RequestException.
+    except (httpx.HTTPError, ValueError) as e:
+        return 503, {'status': 'ERROR', 'message': f'WhatsApp service failed or timed out: {e}'}
+
+
+async def _arecord_statuses(results):
+    await cache.aset_many({_status_key(u): r for u, r in results.items()}, settings.WHATSAPP_STATUS_TTL)
+    await cache.aset_many({_health_key(u): is_connected(r) for u, r in results.items()}, settings.WHATSAPP_HEALTH_TTL)
+
+
+async def _afetch_status(user_id):
+    if await cache.aadd(_fetch_key(user_id), 1, FETCH_LOCK_TIMEOUT):
+        try:
+            result = await anode_request('get', 'status', user_id)
+            await _arecord_statuses({user_id: result})
+            return result
+        finally:
+            await cache.adelete(_fetch_key(user_id))
+
+    # Another process is asking the gateway; wait for its answer.
+    deadline = time.monotonic() + FETCH_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        await asyncio.sleep(FETCH_WAIT_STEP)
+        result = await cache.aget(_status_key(user_id))
+        if result is not None:
+            return result
+    result = await anode_request('get', 'status', user_id)
+    await _arecord_statuses({user_id: result})
+    return result
+
+
+async def aget_session_status(user_id):
+    """Async ``get_session_status``: polls on one loop share a single in-flight fetch."""
+    result = await cache.aget(_status_key(user_id))
+    if result is not None:
+        return result
+
+    _, inflight = _loop_state()
+    task = inflight.get(user_id)
+    if task is None:
+        task = inflight[user_id] = asyncio.ensure_future(_afetch_status(user_id))
+        task.add_done_callback(lambda _: inflight.pop(user_id, None))
+    # shield: one poller disconnecting must not cancel the fetch for the rest.
+    return await asyncio.shield(task)
+
+
+async def ainvalidate_session_status(user_id):
+    await cache.adelete_many([_status_key(user_id), _health_key(user_id)])
+
+
+async def astart_session(user_id):
+    result = await anode_request('post', 'start', user_id)
+    await ainvalidate_session_status(user_id)
+    return result
+
+
+async def adisconnect_session(user_id):
+    result = await anode_request('post', 'disconnect', user_id)
+    await ainvalidate_session_status(user_id)
+    return result
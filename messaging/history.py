@@ -0,0 +1,50 @@
+# messaging/history.py
+"""
+Cross-campaign history of one phone number, for support.
+
+Lookups go through the recipient index on (phone_e164, id): the number is
+normalized, converted to its integer form, and the index yields that
+number's rows newest first (ids follow creation order), so a page costs the
+same on a few rows as on hundreds of millions. Packed campaigns keep no
+per-number rows and are not part of the history.
+"""
+from core.phones import e164_int, to_e164
+from core.pagination import keyset_paginate
+from .models import CampaignRecipient
+
+HISTORY_PAGE_SIZE = 50
+HISTORY_ORDERING = ('-id',)
+
+
+def phone_history(phone_number):
+    """Every recipient row of ``phone_number`` across campaigns, newest first. Raises ValueError."""
+    number = e164_int(to_e164(phone_number or '') or '')
+    if number is None:
+        raise ValueError("Enter a valid phone number.")
+    return (
+        CampaignRecipient.objects.filter(phone_e164=number)
+        .select_related('campaign', 'campaign__created_by')
+        .order_by(*HISTORY_ORDERING)
+    )
+
+
+def history_page(phone_number, after=None, per_page=HISTORY_PAGE_SIZE):
+    """One keyset page of ``phone_history``."""
+    return keyset_paginate(phone_history(phone_number), ordering=HISTORY_ORDERING, after=after, per_page=per_page)
+
+
+def as_dict(recipient):
+    campaign = recipient.campaign
+    return {
+        'campaign_id': campaign.id,
+        'campaign': campaign.name,
+        'user': campaign.created_by.username,
+        'campaign_status': campaign.status,
+        'created_at': campaign.created_at,
+        'phone': recipient.phone_number,
+        'status': recipient.status,
+        'sent_at': recipient.sent_at,
+        'delivered_at': recipient.delivered_at,
+        'read_at': recipient.read_at,
+        'error': recipient.error_message,
+    }
@@ -0,0 +1,172 @@
+# messaging/ingest.py
+"""
+Background recipient ingestion for new campaigns.
+
+campaign_create_view only stores the form's recipient choice (and the raw CSV
+upload, if any) on a DRAFT campaign. ``ingest_recipients`` runs on a worker,
+turns that into CampaignRecipient rows chunk by chunk, and publishes progress
+to the cache for the progress endpoint.
+"""
+import csv
+import io
+
+from django.core.cache import cache
+
+from accounts.models import ContactSegment
+from core.phones import e164_int, timezone_for, to_e164
+from . import packed
+from .models import Campaign, CampaignRecipient, RecipientChunk
+from .recipients import insert_recipients_select, contacts_source, segment_source, campaign_source
+from .suppression import exclude_suppressed, suppressed_numbers
+
+INGEST_CHUNK_SIZE = 1000
+PROGRESS_TIMEOUT = 60 * 60  # seconds
+
+
+def _progress_key(campaign_id):
+    return f'campaign:ingest:{campaign_id}'
+
+
+def publish_progress(campaign_id, **progress):
+    cache.set(_progress_key(campaign_id), progress, PROGRESS_TIMEOUT)
+
+
+def get_progress(campaign_id):
+    return cache.get(_progress_key(campaign_id)) or {}
+
+
+def _manual_numbers(campaign):
+    return campaign.recipient_params.get('manual_numbers', '').splitlines()
+
+
+def _csv_numbers(campaign):
+    """Phone values of the uploaded CSV, streamed row by row."""
+    with campaign.recipient_upload.open('rb') as f:
+        reader = csv.DictReader(io.TextIOWrapper(f, encoding='utf-8', newline=''))
+        phone_col = next((c for c in reader.fieldnames or [] if 'phone' in c.lower()), None)
+        if not phone_col:
+            raise ValueError("CSV must contain a 'phone' column.")
+        for row in reader:
+            yield row.get(phone_col)
+
+
+def _previous_campaign(campaign):
+    previous = Campaign.objects.filter(
+        id=campaign.recipient_params['campaign_id'], created_by=campaign.created_by
+    ).first()
+    if not previous:
+        raise ValueError("The selected campaign no longer exists.")
+    return previous
+
+
+def _source_queryset(campaign):
+    """Database-side sources, copied with INSERT ... SELECT."""
+    params = campaign.recipient_params
+    user = campaign.created_by
+    source = campaign.recipient_source
+
+    if source == 'contacts':
+        if params.get('select_all'):
+            return contacts_source(user, query=params.get('query'))
+        return contacts_source(user, contact_ids=params['contact_ids'])
+
+    if source == 'segment':
+        segment = ContactSegment.objects.filter(id=params['segment_id'], user=user).first()
+        if not segment:
+            raise ValueError("The selected segment no longer exists.")
+        return segment_source(segment)
+
+    if source == 'campaign':
+        previous = _previous_campaign(campaign)
+        status = CampaignRecipient.Status.FAILED if params.get('failed_only') else None
+        return campaign_source(previous, status=status)
+
+    raise ValueError("Invalid recipient source.")
+
+
+def initial_status(campaign):
+    """Recipients of a campaign with a send window wait for their bucket to open."""
+    if campaign.has_send_window:
+        return CampaignRecipient.Status.WAITING
+    return CampaignRecipient.Status.PENDING
+
+
+def _insert_chunk(campaign, phones, writer=None):
+    """Insert one chunk of new numbers, minus opted-out ones. Returns how many were inserted."""
+    blocked = suppressed_numbers(campaign.created_by_id, phones)
+    if writer is not None:
+        kept = [p for p in phones if p not in blocked]
+        writer.add(kept)
+        return len(kept)
+    status = initial_status(campaign)
+    CampaignRecipient.objects.bulk_create([
+        CampaignRecipient(
+            campaign=campaign, phone_number=p, phone_e164=e164_int(p), tz_bucket=timezone_for(p), status=status
+        )
+        for p in phones if p not in blocked
+    ])
+    return len(phones) - len(blocked)
+
+
+def _insert_numbers(campaign, numbers):
+    """Normalize, dedupe and insert raw numbers one chunk at a time."""
+    writer = packed.ChunkWriter(campaign) if campaign.is_packed else None
+    seen = set()
+    chunk = []
+    rows_read = 0
+    inserted = 0
+    for raw in numbers:
+        rows_read += 1
+        phone = to_e164((raw or '').strip())
+        number = e164_int(phone)
+        if number and number not in seen:
+            seen.add(number)  # ints: a third of the memory of the strings on big uploads
+            chunk.append(phone)
+        if rows_read % INGEST_CHUNK_SIZE == 0:
+            inserted += _insert_chunk(campaign, chunk, writer)
+            chunk = []
+            publish_progress(campaign.id, state='INGESTING', rows_read=rows_read, recipients=inserted)
+    inserted += _insert_chunk(campaign, chunk, writer)
+    if writer is not None:
+        writer.close()
+    return rows_read, inserted
+
+
+def ingest_recipients(campaign):
+    """
+    Create ``campaign``'s recipients from its stored source and return how
+    many there are. Raises ValueError for unusable input. Safe to re-run.
+    """
+    CampaignRecipient.objects.filter(campaign=campaign).delete()
+    RecipientChunk.objects.filter(campaign=campaign).delete()
+    publish_progress(campaign.id, state='INGESTING', rows_read=0, recipients=0)
+
+    source = campaign.recipient_source
+    if source == 'manual':
+        rows_read, count = _insert_numbers(campaign, _manual_numbers(campaign))
+    elif source == 'csv':
+        try:
+            rows_read, count = _insert_numbers(campaign, _csv_numbers(campaign))
+        except csv.Error as e:
+            raise ValueError(f"Could not read CSV: {e}")
+    elif source == 'campaign' and _previous_campaign(campaign).is_packed:
+        # A packed audience has no rows to select from; stream its numbers instead.
+        numbers = packed.iter_phones(_previous_campaign(campaign), campaign.recipient_params.get('failed_only'))
+        rows_read, count = _insert_numbers(campaign, numbers)
+    else:
+        source_rows = exclude_suppressed(_source_queryset(campaign), campaign.created_by_id)
+        if campaign.is_packed:
+            count = packed.write_from_queryset(campaign, source_rows)
+        else:
+            count = insert_recipients_select(campaign, source_rows, status=initial_status(campaign))
+        rows_read = count
+
+    publish_progress(campaign.id, state='DONE', rows_read=rows_read, recipients=count)
+    return count
+
+
+def discard_upload(campaign):
+    """Delete the raw CSV once ingestion is over; it holds contacts' numbers."""
+    if campaign.recipient_upload:
+        campaign.recipient_upload.delete(save=False)
+        Campaign.objects.filter(pk=campaign.pk).update(recipient_upload='')
@@ -0,0 +1,105 @@
+# messaging/ledger.py
+"""
+Exactly-once sends.
+
+Every (campaign, phone) pair has an idempotency key. Before a chunk is sent,
+``claim`` takes its keys with one insert and one conditional update, stamping
+the entries it wins with a fresh token, so of two workers racing for the same
+key only one sends it. The key also goes to the gateway so it can drop a
+repeat of a send whose outcome we never recorded. ``record`` stores the
+outcomes with one update per state.
+"""
+import hashlib
+import uuid
+from datetime import timedelta
+
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import SendLedgerEntry
+from .scheduler import SLOT_LEASE
+
+# A SENDING entry older than this belongs to a worker that lost its dispatch
+# lease (the lease is refreshed after every chunk), so it may be taken over.
+CLAIM_TIMEOUT = SLOT_LEASE
+
+
+def send_key(campaign_id, phone_number):
+    return hashlib.sha256(f'{campaign_id}:{phone_number}'.encode()).hexdigest()
+
+
+def claim(campaign_id, recipients):
+    """
+    Claim a send for each recipient about to be sent. Returns
+    ``(to_send, already_sent, duplicates)``: ``{recipient_id: key}`` for those
+    this call won, the ids of recipients whose number this campaign already
+    reached, and ``{recipient_id: key}`` for later rows with the same number
+    as one in ``to_send``, whose fate follows that send. Recipients in none
+    of them are being sent by another worker and must be left alone.
+    """
+    first = {}
+    repeats = {}
+    for recipient in recipients:
+        key = send_key(campaign_id, recipient.phone_number)
+        if key in first:
+            repeats[recipient.id] = key
+        else:
+            first[key] = recipient.id
+    if not first:
+        return {}, set(), {}
+
+    token = uuid.uuid4().hex
+    now = timezone.now()
+    SendLedgerEntry.objects.bulk_create(
+        [SendLedgerEntry(key=k, recipient_id=r, claim=token, updated_at=now) for k, r in first.items()],
+        ignore_conflicts=True,
+    )
+    # Retry failed sends and take over released or abandoned ones; the
+    # condition is re-checked per row, so a concurrent claim can't also win.
+    SendLedgerEntry.objects.filter(key__in=first).filter(
+        Q(state=SendLedgerEntry.State.FAILED)
+        | Q(state=SendLedgerEntry.State.SENDING, claim='')
+        | Q(state=SendLedgerEntry.State.SENDING, updated_at__lt=now - timedelta(seconds=CLAIM_TIMEOUT))
+    ).update(claim=token, state=SendLedgerEntry.State.SENDING, attempts=F('attempts') + 1, updated_at=now)
+
+    entries = {
+        key: (state, owner)
+        for key, state, owner in SendLedgerEntry.objects.filter(key__in=first).values_list('key', 'state', 'claim')
+    }
+    to_send = {}
+    already_sent = set()
+    for key, recipient_id in first.items():
+        state, owner = entries[key]
+        if owner == token:
+            to_send[recipient_id] = key
+        elif state == SendLedgerEntry.State.SENT:
+            already_sent.add(recipient_id)
+
+    won = set(to_send.values())
+    duplicates = {}
+    for recipient_id, key in repeats.items():
+        if key in won:
+            duplicates[recipient_id] = key
+        elif entries[key][0] == SendLedgerEntry.State.SENT:
+            already_sent.add(recipient_id)
+    return to_send, already_sent, duplicates
+
+
+def release(keys):
+    """
+    Give up claims whose outcome was never recorded. The entries stay SENDING
+    (the send may have gone out; the gateway drops a repeat of its key) but
+    the next dispatch can take them over straight away.
+    """
+    if keys:
+        SendLedgerEntry.objects.filter(key__in=keys, state=SendLedgerEntry.State.SENDING).update(claim='')
+
+
+def record(outcomes):
+    """Store ``{key: SendLedgerEntry.State}`` outcomes, one update per state."""
+    by_state = {}
+    for key, state in outcomes.items():
+        by_state.setdefault(state, []).append(key)
+    now = timezone.now()
+    for state, keys in by_state.items():
+        SendLedgerEntry.objects.filter(key__in=keys).update(state=state, updated_at=now)
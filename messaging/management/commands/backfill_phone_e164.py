@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.models import Contact, ContactSegmentMember
+from core.phones import BACKFILL_CHUNK_SIZE, backfill_e164
+from messaging.models import CampaignRecipient, SuppressedNumber
+
+# (model, normalized phone field) pairs carrying a phone_e164 column.
+TABLES = (
+    (Contact, 'normalized_phone'),
+    (ContactSegmentMember, 'phone_number'),
+    (SuppressedNumber, 'phone_number'),
+    (CampaignRecipient, 'phone_number'),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the integer phone_e164 column of rows written before it existed, one id "
+        "range per UPDATE. Safe to re-run and to run while the app is serving."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=BACKFILL_CHUNK_SIZE, help="Ids per UPDATE.")
+
+    def handle(self, *args, **options):
+        for model, phone_field in TABLES:
+            started = time.monotonic()
+            updated = backfill_e164(model, phone_field, options['chunk_size'])
+            elapsed = time.monotonic() - started
+            self.stdout.write(f"{model.__name__}: {updated} rows in {elapsed:.2f}s")
+        self.stdout.write(self.style.SUCCESS("Backfill complete."))
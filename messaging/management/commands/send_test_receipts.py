@@ -0,0 +1,45 @@
+import random
+import time
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from messaging.models import SendLedgerEntry
+
+
+class Command(BaseCommand):
+    help = (
+        "Act as the gateway and post delivered/read receipts for a campaign's sent "
+        "messages to the receipts webhook (for local testing)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('campaign_id', type=int)
+        parser.add_argument('--url', default='http://127.0.0.1:8000/app/api/whatsapp/receipts/')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--read-ratio', type=float, default=0.5, help="Share of messages also reported as read.")
+
+    def handle(self, *args, **options):
+        if not settings.WHATSAPP_WEBHOOK_SECRET:
+            raise CommandError("WHATSAPP_WEBHOOK_SECRET is not set.")
+
+        keys = SendLedgerEntry.objects.filter(
+            recipient__campaign_id=options['campaign_id'], state=SendLedgerEntry.State.SENT
+        ).values_list('key', flat=True)
+        receipts = []
+        for key in keys.iterator():
+            receipts.append({'idempotencyKey': key, 'status': 'delivered', 'timestamp': time.time()})
+            if random.random() < options['read_ratio']:
+                receipts.append({'idempotencyKey': key, 'status': 'read', 'timestamp': time.time()})
+
+        headers = {'X-Webhook-Secret': settings.WHATSAPP_WEBHOOK_SECRET}
+        size = options['batch_size']
+        started = time.monotonic()
+        for i in range(0, len(receipts), size):
+            response = requests.post(options['url'], json={'receipts': receipts[i:i + size]}, headers=headers, timeout=30)
+            response.raise_for_status()
+        elapsed = time.monotonic() - started
+
+        rate = len(receipts) / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(f"Posted {len(receipts)} receipts in {elapsed:.2f}s ({rate:.0f}/s)."))
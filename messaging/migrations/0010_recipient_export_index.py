@@ -0,0 +1,17 @@
+# Generated by Django 5.1.4 on 2026-10-19 03:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0009_remove_campaign_document_attachment_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='campaignrecipient',
+            index=models.Index(fields=['campaign', 'id'], name='recipient_campaign_id_idx'),
+        ),
+    ]
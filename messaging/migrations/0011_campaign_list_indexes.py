@@ -0,0 +1,23 @@
+# Generated by Django 5.1.4 on 2026-10-19 03:54
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0010_recipient_export_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='campaign',
+            index=models.Index(fields=['created_by', 'created_at', 'id'], name='campaign_owner_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='campaignrecipient',
+            index=models.Index(fields=['campaign', 'status'], name='recipient_campaign_status_idx'),
+        ),
+    ]
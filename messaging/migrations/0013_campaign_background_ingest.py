@@ -0,0 +1,38 @@
+# Generated by Django 5.1.4 on 2026-10-19 04:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0012_campaign_paused_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='campaign',
+            name='ingest_error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='campaign',
+            name='recipient_params',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='campaign',
+            name='recipient_source',
+            field=models.CharField(blank=True, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='campaign',
+            name='recipient_upload',
+            field=models.FileField(blank=True, upload_to='recipient_uploads/'),
+        ),
+        migrations.AlterField(
+            model_name='campaign',
+            name='status',
+            field=models.CharField(choices=[('DRAFT', 'Preparing'), ('PENDING', 'Pending'), ('IN_PROGRESS', 'In Progress'), ('PAUSED', 'Paused'), ('COMPLETED', 'Completed'), ('FAILED', 'Failed')], default='PENDING', max_length=20),
+        ),
+    ]
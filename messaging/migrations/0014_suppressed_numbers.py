@@ -0,0 +1,35 @@
+# Generated by Django 5.1.4 on 2026-10-19 04:11
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0013_campaign_background_ingest'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='campaignrecipient',
+            name='status',
+            field=models.CharField(choices=[('PENDING', 'Pending'), ('SENT', 'Sent'), ('FAILED', 'Failed'), ('SUPPRESSED', 'Suppressed')], default='PENDING', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='SuppressedNumber',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('phone_number', models.CharField(max_length=20)),
+                ('reason', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='suppressed_numbers', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['phone_number', 'user'], name='suppressed_phone_user_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'phone_number'), name='suppressed_user_phone_unique'), models.UniqueConstraint(condition=models.Q(('user__isnull', True)), fields=('phone_number',), name='suppressed_global_phone_unique')],
+            },
+        ),
+    ]
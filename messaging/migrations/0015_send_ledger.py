@@ -0,0 +1,26 @@
+# Generated by Django 5.1.4 on 2026-10-19 04:14
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0014_suppressed_numbers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SendLedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('state', models.CharField(choices=[('SENDING', 'Sending'), ('SENT', 'Sent'), ('FAILED', 'Failed')], default='SENDING', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=1)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('recipient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to='messaging.campaignrecipient')),
+            ],
+        ),
+    ]
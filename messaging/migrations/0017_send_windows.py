@@ -0,0 +1,42 @@
+# Generated by Django 5.1.4 on 2026-10-19 04:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0016_delivery_receipts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='campaign',
+            name='window_end',
+            field=models.TimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='campaign',
+            name='window_start',
+            field=models.TimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='campaignrecipient',
+            name='tz_bucket',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='campaign',
+            name='status',
+            field=models.CharField(choices=[('DRAFT', 'Preparing'), ('PENDING', 'Pending'), ('IN_PROGRESS', 'In Progress'), ('WAITING', 'Waiting for send window'), ('PAUSED', 'Paused'), ('COMPLETED', 'Completed'), ('FAILED', 'Failed')], default='PENDING', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='campaignrecipient',
+            name='status',
+            field=models.CharField(choices=[('PENDING', 'Pending'), ('WAITING', 'Outside send window'), ('SENT', 'Sent'), ('DELIVERED', 'Delivered'), ('READ', 'Read'), ('FAILED', 'Failed'), ('SUPPRESSED', 'Suppressed')], default='PENDING', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='campaignrecipient',
+            index=models.Index(fields=['campaign', 'tz_bucket', 'status'], name='recipient_campaign_tz_idx'),
+        ),
+    ]
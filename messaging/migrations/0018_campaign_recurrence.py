@@ -0,0 +1,43 @@
+# Generated by Django 5.1.4 on 2026-10-19 04:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_celery_beat', '0019_alter_periodictasks_options'),
+        ('messaging', '0017_send_windows'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CampaignRecurrence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('message_content', models.TextField()),
+                ('recipient_source', models.CharField(choices=[('campaign', 'Recipients of a campaign'), ('segment', 'Segment')], max_length=20)),
+                ('recipient_params', models.JSONField(blank=True, default=dict)),
+                ('cron', models.CharField(help_text='minute hour day-of-month month day-of-week', max_length=100)),
+                ('window_start', models.TimeField(blank=True, null=True)),
+                ('window_end', models.TimeField(blank=True, null=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='campaign_recurrences', to=settings.AUTH_USER_MODEL)),
+                ('periodic_task', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='django_celery_beat.periodictask')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='campaign',
+            name='recurrence',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='runs', to='messaging.campaignrecurrence'),
+        ),
+        migrations.AddIndex(
+            model_name='campaign',
+            index=models.Index(fields=['recurrence', 'created_at', 'id'], name='campaign_recurrence_runs_idx'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.1.4 on 2026-10-19 04:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0018_campaign_recurrence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='campaign',
+            name='storage_mode',
+            field=models.CharField(choices=[('rows', 'One row per recipient'), ('packed', 'Packed chunks')], default='rows', max_length=10),
+        ),
+        migrations.CreateModel(
+            name='RecipientChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seq', models.PositiveIntegerField()),
+                ('tz_bucket', models.CharField(blank=True, max_length=64)),
+                ('held', models.BooleanField(default=False)),
+                ('size', models.PositiveIntegerField()),
+                ('phones', models.BinaryField()),
+                ('done_bits', models.BinaryField()),
+                ('sent_bits', models.BinaryField()),
+                ('done_count', models.PositiveIntegerField(default=0)),
+                ('sent_count', models.PositiveIntegerField(default=0)),
+                ('failed_count', models.PositiveIntegerField(default=0)),
+                ('campaign', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='messaging.campaign')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RecipientFailure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField()),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('WAITING', 'Outside send window'), ('SENT', 'Sent'), ('DELIVERED', 'Delivered'), ('READ', 'Read'), ('FAILED', 'Failed'), ('SUPPRESSED', 'Suppressed')], max_length=20)),
+                ('error_message', models.TextField(blank=True)),
+                ('chunk', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='failures', to='messaging.recipientchunk')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='recipientchunk',
+            index=models.Index(fields=['campaign', 'tz_bucket', 'held'], name='chunk_campaign_tz_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='recipientchunk',
+            constraint=models.UniqueConstraint(fields=('campaign', 'seq'), name='unique_chunk_seq'),
+        ),
+        migrations.AddConstraint(
+            model_name='recipientfailure',
+            constraint=models.UniqueConstraint(fields=('chunk', 'position'), name='unique_failure_position'),
+        ),
+    ]
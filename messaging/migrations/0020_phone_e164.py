@@ -0,0 +1,60 @@
+# Generated by Django 5.1.4 on 2026-10-19 04:31
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import BigIntegerField, Max, Min
+from django.db.models.functions import Cast, Substr
+
+
+def backfill_e164(model, phone_field, chunk_size=5000):
+    # Frozen copy of core.phones.backfill_e164: one id range per UPDATE.
+    missing = model._default_manager.filter(
+        phone_e164__isnull=True, **{f'{phone_field}__regex': r'^\+[0-9]{8,15}$'}
+    )
+    bounds = model._default_manager.aggregate(low=Min('id'), high=Max('id'))
+    if bounds['low'] is None:
+        return
+    for start in range(bounds['low'], bounds['high'] + 1, chunk_size):
+        missing.filter(id__gte=start, id__lt=start + chunk_size).update(
+            phone_e164=Cast(Substr(phone_field, 2), BigIntegerField())
+        )
+
+
+def backfill_suppressed_e164(apps, schema_editor):
+    # Recipients are filled by 0025_backfill_recipient_phone_e164, outside
+    # this migration's transaction.
+    backfill_e164(apps.get_model('messaging', 'SuppressedNumber'), 'phone_number')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0019_packed_recipients'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='suppressednumber',
+            name='suppressed_phone_user_idx',
+        ),
+        migrations.AddField(
+            model_name='campaignrecipient',
+            name='phone_e164',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='suppressednumber',
+            name='phone_e164',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_suppressed_e164, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='campaignrecipient',
+            index=models.Index(fields=['campaign', 'phone_e164'], name='recipient_campaign_e164_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='suppressednumber',
+            index=models.Index(fields=['phone_e164', 'user'], name='suppressed_e164_user_idx'),
+        ),
+    ]
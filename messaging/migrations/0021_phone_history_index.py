@@ -0,0 +1,17 @@
+# Generated by Django 5.1.4 on 2026-10-19 04:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0020_phone_e164'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='campaignrecipient',
+            index=models.Index(fields=['phone_e164', 'id'], name='recipient_phone_history_idx'),
+        ),
+    ]
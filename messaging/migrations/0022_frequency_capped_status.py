@@ -0,0 +1,23 @@
+# Generated by Django 5.1.4 on 2026-10-19 04:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0021_phone_history_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='campaignrecipient',
+            name='status',
+            field=models.CharField(choices=[('PENDING', 'Pending'), ('WAITING', 'Outside send window'), ('SENT', 'Sent'), ('DELIVERED', 'Delivered'), ('READ', 'Read'), ('FAILED', 'Failed'), ('SUPPRESSED', 'Suppressed'), ('CAPPED', 'Frequency capped')], default='PENDING', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='recipientfailure',
+            name='status',
+            field=models.CharField(choices=[('PENDING', 'Pending'), ('WAITING', 'Outside send window'), ('SENT', 'Sent'), ('DELIVERED', 'Delivered'), ('READ', 'Read'), ('FAILED', 'Failed'), ('SUPPRESSED', 'Suppressed'), ('CAPPED', 'Frequency capped')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-19 04:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0022_frequency_capped_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sendledgerentry',
+            name='claim',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-19 04:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0023_send_ledger_claim'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='campaign',
+            name='dispatch_error',
+            field=models.TextField(blank=True),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.4 on 2026-10-19 05:01
+
+from django.db import migrations
+from django.db.models import BigIntegerField, Max, Min
+from django.db.models.functions import Cast, Substr
+
+CHUNK_SIZE = 5000  # recipient ids per UPDATE
+
+
+def backfill_recipient_e164(apps, schema_editor):
+    # Frozen copy of core.phones.backfill_e164. Not atomic, so every id range
+    # commits on its own and no statement locks the whole recipient table.
+    CampaignRecipient = apps.get_model('messaging', 'CampaignRecipient')
+    missing = CampaignRecipient.objects.filter(phone_e164__isnull=True, phone_number__regex=r'^\+[0-9]{8,15}$')
+    bounds = CampaignRecipient.objects.aggregate(low=Min('id'), high=Max('id'))
+    if bounds['low'] is None:
+        return
+    for start in range(bounds['low'], bounds['high'] + 1, CHUNK_SIZE):
+        missing.filter(id__gte=start, id__lt=start + CHUNK_SIZE).update(
+            phone_e164=Cast(Substr('phone_number', 2), BigIntegerField())
+        )
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('messaging', '0024_campaign_dispatch_error'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_recipient_e164, migrations.RunPython.noop),
+    ]
@@ -2,6 +2,8 @@ from django.db import models
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 
+from core.phones import e164_int, to_e164
+
 User = get_user_model()
 
 class MessageTemplate(models.Model):
@@ -15,11 +17,18 @@ class MessageTemplate(models.Model):
 
 class Campaign(models.Model):
     class Status(models.TextChoices):
+        DRAFT = 'DRAFT', 'Preparing'
         PENDING = 'PENDING', 'Pending'
         IN_PROGRESS = 'IN_PROGRESS', 'In Progress'
+        WAITING = 'WAITING', 'Waiting for send window'
+        PAUSED = 'PAUSED', 'Paused'
         COMPLETED = 'COMPLETED', 'Completed'
         FAILED = 'FAILED', 'Failed'
 
+    class StorageMode(models.TextChoices):
+        ROWS = 'rows', 'One row per recipient'
+        PACKED = 'packed', 'Packed chunks'
+
     name = models.CharField(max_length=255)
     message_content = models.TextField()
     status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDING)
@@ -28,10 +37,70 @@ class Campaign(models.Model):
     scheduled_at = models.DateTimeField(null=True, blank=True)
     started_at = models.DateTimeField(null=True, blank=True)
     completed_at = models.DateTimeField(null=True, blank=True)
+    # Optional daily window, in each recipient's local time, for sending.
+    window_start = models.TimeField(null=True, blank=True)
+    window_end = models.TimeField(null=True, blank=True)
+    # What the create form asked for; recipients are ingested from it in the background.
+    recipient_source = models.CharField(max_length=20, blank=True)
+    recipient_params = models.JSONField(default=dict, blank=True)
+    recipient_upload = models.FileField(upload_to='recipient_uploads/', blank=True)
+    ingest_error = models.TextField(blank=True)
+    # Set when sending stopped on an unexpected error; the campaign is FAILED until retried by hand.
+    dispatch_error = models.TextField(blank=True)
+    # PACKED keeps recipients in RecipientChunk blobs instead of CampaignRecipient rows.
+    storage_mode = models.CharField(max_length=10, choices=StorageMode.choices, default=StorageMode.ROWS)
+    # Set on the runs of a recurring campaign.
+    recurrence = models.ForeignKey(
+        'CampaignRecurrence', on_delete=models.SET_NULL, null=True, blank=True, related_name='runs'
+    )
+
+    class Meta:
+        indexes = [
+            # Backs the keyset-paginated campaign list (newest first per user).
+            models.Index(fields=['created_by', 'created_at', 'id'], name='campaign_owner_created_idx'),
+            # Run history of a recurrence, newest first.
+            models.Index(fields=['recurrence', 'created_at', 'id'], name='campaign_recurrence_runs_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    @property
+    def has_send_window(self):
+        return self.window_start is not None and self.window_end is not None
+
+    @property
+    def is_packed(self):
+        return self.storage_mode == self.StorageMode.PACKED
+
+class CampaignRecurrence(models.Model):
+    """
+    A campaign that repeats on a cron schedule. Each run is a new Campaign
+    whose recipients are copied with one INSERT ... SELECT from the stored
+    snapshot (an earlier campaign's recipients) or a segment, so a run only
+    adds its own send state.
+    """
+    class Source(models.TextChoices):
+        CAMPAIGN = 'campaign', 'Recipients of a campaign'
+        SEGMENT = 'segment', 'Segment'
+
+    name = models.CharField(max_length=255)
+    message_content = models.TextField()
+    created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='campaign_recurrences')
+    recipient_source = models.CharField(max_length=20, choices=Source.choices)
+    recipient_params = models.JSONField(default=dict, blank=True)
+    cron = models.CharField(max_length=100, help_text="minute hour day-of-month month day-of-week")
+    window_start = models.TimeField(null=True, blank=True)
+    window_end = models.TimeField(null=True, blank=True)
+    periodic_task = models.OneToOneField(
+        'django_celery_beat.PeriodicTask', on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.name} ({self.cron})'
+
 class Attachment(models.Model):
     campaign = models.ForeignKey(Campaign, on_delete=models.CASCADE, related_name='attachments')
     file = models.FileField(upload_to='attachments/')
@@ -43,14 +112,156 @@ class Attachment(models.Model):
 class CampaignRecipient(models.Model):
     class Status(models.TextChoices):
         PENDING = 'PENDING', 'Pending'
+        WAITING = 'WAITING', 'Outside send window'
         SENT = 'SENT', 'Sent'
+        DELIVERED = 'DELIVERED', 'Delivered'
+        READ = 'READ', 'Read'
         FAILED = 'FAILED', 'Failed'
+        SUPPRESSED = 'SUPPRESSED', 'Suppressed'
+        CAPPED = 'CAPPED', 'Frequency capped'
 
     campaign = models.ForeignKey(Campaign, on_delete=models.CASCADE, related_name='recipients')
     phone_number = models.CharField(max_length=20)
+    phone_e164 = models.BigIntegerField(null=True, blank=True)  # phone_number's digits, for joins
+    tz_bucket = models.CharField(max_length=64, blank=True)  # IANA timezone, from the calling code
     status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDING)
     sent_at = models.DateTimeField(null=True, blank=True)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+    read_at = models.DateTimeField(null=True, blank=True)
     error_message = models.TextField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # Lets result exports walk a campaign's rows in id order without a sort.
+            models.Index(fields=['campaign', 'id'], name='recipient_campaign_id_idx'),
+            # Per-status counts for a page of campaigns come straight off this index.
+            models.Index(fields=['campaign', 'status'], name='recipient_campaign_status_idx'),
+            # Send windows release and hold a campaign's recipients one timezone at a time.
+            models.Index(fields=['campaign', 'tz_bucket', 'status'], name='recipient_campaign_tz_idx'),
+            # Joins a campaign's recipients to contacts and suppressions on the integer number.
+            models.Index(fields=['campaign', 'phone_e164'], name='recipient_campaign_e164_idx'),
+            # A number's history across all campaigns, newest first (messaging.history).
+            models.Index(fields=['phone_e164', 'id'], name='recipient_phone_history_idx'),
+        ]
+
     def __str__(self):
         return f'{self.phone_number} - {self.campaign.name}'
+
+
+class RecipientChunk(models.Model):
+    """
+    Up to a few thousand recipients of a packed campaign, all in one timezone
+    bucket: numbers as a little-endian int64 array (E.164 digits) and one bit
+    per number in ``done_bits`` (attempted or skipped) and ``sent_bits``.
+    The counts let dashboards sum chunks instead of decoding them. Failed and
+    suppressed numbers get a RecipientFailure row; nothing else does.
+    """
+    campaign = models.ForeignKey(Campaign, on_delete=models.CASCADE, related_name='chunks')
+    seq = models.PositiveIntegerField()
+    tz_bucket = models.CharField(max_length=64, blank=True)
+    held = models.BooleanField(default=False)  # outside its send window
+    size = models.PositiveIntegerField()
+    phones = models.BinaryField()
+    done_bits = models.BinaryField()
+    sent_bits = models.BinaryField()
+    done_count = models.PositiveIntegerField(default=0)
+    sent_count = models.PositiveIntegerField(default=0)
+    failed_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['campaign', 'seq'], name='unique_chunk_seq'),
+        ]
+        indexes = [
+            models.Index(fields=['campaign', 'tz_bucket', 'held'], name='chunk_campaign_tz_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.campaign.name} #{self.seq} ({self.size})'
+
+
+class RecipientFailure(models.Model):
+    """A failed, suppressed or capped number of a packed campaign, by position in its chunk."""
+    chunk = models.ForeignKey(RecipientChunk, on_delete=models.CASCADE, related_name='failures')
+    position = models.PositiveIntegerField()
+    status = models.CharField(max_length=20, choices=CampaignRecipient.Status.choices)
+    error_message = models.TextField(blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['chunk', 'position'], name='unique_failure_position'),
+        ]
+
+
+class SendLedgerEntry(models.Model):
+    """
+    One row per (campaign, phone) send, written before the gateway is called,
+    so a redelivered or resumed dispatch never messages anyone twice.
+    """
+    class State(models.TextChoices):
+        SENDING = 'SENDING', 'Sending'
+        SENT = 'SENT', 'Sent'
+        FAILED = 'FAILED', 'Failed'
+
+    key = models.CharField(max_length=64, unique=True)  # sha256 of "campaign_id:phone"
+    recipient = models.ForeignKey(CampaignRecipient, on_delete=models.CASCADE, related_name='ledger_entries')
+    state = models.CharField(max_length=20, choices=State.choices, default=State.SENDING)
+    attempts = models.PositiveIntegerField(default=1)
+    updated_at = models.DateTimeField(default=timezone.now)
+    # Token of the dispatch that holds this entry while SENDING; blank once released.
+    claim = models.CharField(max_length=32, blank=True, default='')
+
+    def __str__(self):
+        return f'{self.key[:12]}… {self.state} ({self.attempts})'
+
+
+
+class DeliveryReceipt(models.Model):
+    """
+    Append-only buffer of gateway delivery/read receipts. The webhook only
+    inserts here; flush_delivery_receipts applies them to recipients in bulk
+    and deletes them.
+    """
+    key = models.CharField(max_length=64)  # SendLedgerEntry.key the gateway was given
+    status = models.CharField(max_length=20, choices=[
+        (CampaignRecipient.Status.DELIVERED, 'Delivered'),
+        (CampaignRecipient.Status.READ, 'Read'),
+    ])
+    occurred_at = models.DateTimeField()
+    received_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.key[:12]}… {self.status}'
+
+
+class SuppressedNumber(models.Model):
+    """An opted-out number: for one user, or for everyone when ``user`` is empty."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='suppressed_numbers')
+    phone_number = models.CharField(max_length=20)
+    phone_e164 = models.BigIntegerField(null=True, blank=True, editable=False)
+    reason = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'phone_number'], name='suppressed_user_phone_unique'),
+            models.UniqueConstraint(
+                fields=['phone_number'], condition=models.Q(user__isnull=True), name='suppressed_global_phone_unique'
+            ),
+        ]
+        indexes = [
+            # Exact confirmation of Bloom filter hits and the NOT EXISTS used at ingest.
+            models.Index(fields=['phone_e164', 'user'], name='suppressed_e164_user_idx'),
+        ]
+
+    def clean(self):
+        # Normalize before form validation checks the unique constraints.
+        self.phone_number = to_e164(self.phone_number) or self.phone_number
+
+    def save(self, *args, **kwargs):
+        self.phone_number = to_e164(self.phone_number) or self.phone_number
+        self.phone_e164 = e164_int(self.phone_number)
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f'{self.phone_number} ({self.user or "global"})'
@@ -0,0 +1,193 @@
+# messaging/packed.py
+"""
+Packed recipient storage for very large campaigns.
+
+A packed campaign keeps its audience in RecipientChunk rows of up to
+CHUNK_SIZE numbers each instead of one CampaignRecipient row per number:
+about 8 bytes per number plus two bits of state, against a full row and its
+index entries. Only failed and suppressed numbers get a (small)
+RecipientFailure row.
+
+The dispatcher, exports and list counts read chunks directly. Packed
+campaigns keep no per-number send ledger: a crash between a send and its
+bitmap write re-sends at most one dispatch chunk, with the same idempotency
+key, so the gateway can drop the duplicates. Delivery receipts are not
+tracked for packed campaigns.
+"""
+import sys
+from array import array
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F, Sum
+
+from core.phones import timezone_for
+from .models import CampaignRecipient, RecipientChunk, RecipientFailure
+
+CHUNK_SIZE = 4096
+WRITE_BATCH = 16  # chunks per bulk_create
+READ_CHUNK_SIZE = 10000  # numbers per fetch when packing a queryset
+
+
+def pack_phones(phones):
+    """'+923001234567' strings -> little-endian int64 blob."""
+    packed = array('q', (int(p[1:]) for p in phones))
+    if sys.byteorder != 'little':
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def unpack_phones(blob):
+    packed = array('q')
+    packed.frombytes(bytes(blob))
+    if sys.byteorder != 'little':
+        packed.byteswap()
+    return [f'+{n}' for n in packed]
+
+
+def empty_bits(size):
+    return bytes((size + 7) // 8)
+
+
+def has_bit(bits, i):
+    return bits[i >> 3] & (1 << (i & 7))
+
+
+def set_bit(bits, i):
+    bits[i >> 3] |= 1 << (i & 7)
+
+
+class ChunkWriter:
+    """Collects numbers per timezone bucket and writes full chunks as it goes."""
+
+    def __init__(self, campaign):
+        self.campaign = campaign
+        self.held = campaign.has_send_window
+        self.seq = 0
+        self.count = 0
+        self._buckets = defaultdict(list)
+        self._ready = []
+
+    def add(self, phones):
+        for phone in phones:
+            tz_bucket = timezone_for(phone)
+            bucket = self._buckets[tz_bucket]
+            bucket.append(phone)
+            if len(bucket) == CHUNK_SIZE:
+                self._emit(tz_bucket, bucket)
+                self._buckets[tz_bucket] = []
+        if len(self._ready) >= WRITE_BATCH:
+            self._write()
+
+    def _emit(self, tz_bucket, phones):
+        self._ready.append(RecipientChunk(
+            campaign=self.campaign, seq=self.seq, tz_bucket=tz_bucket, held=self.held, size=len(phones),
+            phones=pack_phones(phones), done_bits=empty_bits(len(phones)), sent_bits=empty_bits(len(phones)),
+        ))
+        self.seq += 1
+        self.count += len(phones)
+
+    def _write(self):
+        RecipientChunk.objects.bulk_create(self._ready)
+        self._ready = []
+
+    def close(self):
+        """Write the partly filled chunks; returns how many numbers were stored."""
+        for tz_bucket, phones in self._buckets.items():
+            if phones:
+                self._emit(tz_bucket, phones)
+        self._buckets.clear()
+        self._write()
+        return self.count
+
+
+def write_from_queryset(campaign, queryset, phone_field='phone_number'):
+    """Pack the distinct numbers of ``queryset.<phone_field>`` into chunks; returns how many."""
+    writer = ChunkWriter(campaign)
+    phones = queryset.order_by().values_list(phone_field, flat=True).distinct().iterator(chunk_size=READ_CHUNK_SIZE)
+    batch = []
+    for phone in phones:
+        batch.append(phone)
+        if len(batch) == READ_CHUNK_SIZE:
+            writer.add(batch)
+            batch = []
+    writer.add(batch)
+    return writer.close()
+
+
+def remaining(queryset):
+    """Chunks that still have numbers to send."""
+    return queryset.filter(done_count__lt=F('size'))
+
+
+def next_chunk(campaign_id):
+    return remaining(RecipientChunk.objects.filter(campaign_id=campaign_id, held=False)).order_by('seq').first()
+
+
+def record(chunk, done_bits, sent_bits, failures):
+    """Save a chunk's bitmaps after a dispatch step, plus its new failure rows."""
+    with transaction.atomic():
+        RecipientChunk.objects.filter(pk=chunk.pk).update(
+            done_bits=bytes(done_bits), sent_bits=bytes(sent_bits),
+            done_count=chunk.done_count, sent_count=chunk.sent_count, failed_count=chunk.failed_count,
+        )
+        RecipientFailure.objects.bulk_create(failures, ignore_conflicts=True)
+
+
+def counts(campaign_ids):
+    """``{campaign_id: {status: n}}`` from the chunk counters, shaped like the per-row counts."""
+    rows = (
+        RecipientChunk.objects.filter(campaign_id__in=campaign_ids)
+        .values('campaign_id', 'held')
+        .annotate(size=Sum('size'), done=Sum('done_count'), sent=Sum('sent_count'), failed=Sum('failed_count'))
+        .order_by()
+    )
+    result = {}
+    for row in rows:
+        by_status = result.setdefault(row['campaign_id'], defaultdict(int))
+        unsent = CampaignRecipient.Status.WAITING if row['held'] else CampaignRecipient.Status.PENDING
+        by_status[unsent] += row['size'] - row['done']
+        by_status[CampaignRecipient.Status.SENT] += row['sent']
+        by_status[CampaignRecipient.Status.FAILED] += row['failed']
+        # Skipped numbers; the counters don't tell suppressed and frequency-capped ones apart.
+        by_status[CampaignRecipient.Status.SUPPRESSED] += row['done'] - row['sent'] - row['failed']
+    return {campaign_id: dict(by_status) for campaign_id, by_status in result.items()}
+
+
+def _chunks_with_failures(campaign):
+    """Chunks in order, each with ``{position: failure}``, fetched one chunk at a time."""
+    for chunk_id in RecipientChunk.objects.filter(campaign=campaign).order_by('seq').values_list('id', flat=True):
+        chunk = RecipientChunk.objects.get(pk=chunk_id)
+        failures = {}
+        if chunk.done_count > chunk.sent_count:
+            failures = {f.position: f for f in chunk.failures.all()}
+        yield chunk, failures
+
+
+def iter_export_rows(campaign):
+    """Export rows (phone, status, sent_at, delivered_at, read_at, error) straight from the chunks."""
+    for chunk, failures in _chunks_with_failures(campaign):
+        done, sent = chunk.done_bits, chunk.sent_bits
+        unsent = CampaignRecipient.Status.WAITING if chunk.held else CampaignRecipient.Status.PENDING
+        for i, phone in enumerate(unpack_phones(chunk.phones)):
+            if has_bit(sent, i):
+                yield phone, CampaignRecipient.Status.SENT, None, None, None, None
+            elif has_bit(done, i):
+                failure = failures.get(i)
+                status = failure.status if failure else CampaignRecipient.Status.FAILED
+                yield phone, status, None, None, None, failure.error_message if failure else None
+            else:
+                yield phone, unsent, None, None, None, None
+
+
+def iter_phones(campaign, failed_only=False):
+    """A packed campaign's numbers, e.g. to reuse its audience; optionally only the failed ones."""
+    for chunk, failures in _chunks_with_failures(campaign):
+        phones = unpack_phones(chunk.phones)
+        if failed_only:
+            yield from (
+                phones[position] for position, f in sorted(failures.items())
+                if f.status == CampaignRecipient.Status.FAILED
+            )
+        else:
+            yield from phones
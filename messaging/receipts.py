@@ -0,0 +1,144 @@
+# messaging/receipts.py
+"""
+Delivery/read receipts from the gateway.
+
+The webhook does as little as possible: it validates the payload and appends
+rows to the DeliveryReceipt buffer with one bulk insert, touching no
+recipient rows. ``flush`` runs from a beat task under a single lock. It takes
+the buffer in batches, resolves idempotency keys to recipients with one
+lookup, and applies each recipient's newest state with one bulk_update in id
+order. A single writer that locks rows in a fixed order cannot contend with
+itself.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import CampaignRecipient, DeliveryReceipt, SendLedgerEntry
+
+FLUSH_BATCH_SIZE = 5000
+FLUSH_LOCK_TIMEOUT = 5 * 60  # seconds
+MAX_RECEIPTS_PER_REQUEST = 10000
+# A receipt can beat the dispatcher's own SENT write; such receipts stay
+# buffered and are retried for this long.
+EARLY_RECEIPT_WINDOW = timedelta(hours=1)
+
+# Receipts only ever move a recipient forward along this order.
+RANK = {
+    CampaignRecipient.Status.SENT: 1,
+    CampaignRecipient.Status.DELIVERED: 2,
+    CampaignRecipient.Status.READ: 3,
+}
+
+
+def _parse_time(value):
+    """The receipt's time, or now if it is missing or out of range."""
+    try:
+        if isinstance(value, (int, float)):
+            return datetime.fromtimestamp(value, tz=dt_timezone.utc)
+        if isinstance(value, str):
+            parsed = parse_datetime(value)
+            if parsed is not None:
+                return parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed, dt_timezone.utc)
+    except (OverflowError, OSError, ValueError):
+        pass
+    return timezone.now()
+
+
+def parse_receipts(payload):
+    """
+    DeliveryReceipt objects from a webhook body: one receipt, a list of them,
+    or ``{"receipts": [...]}``. Each receipt has ``idempotencyKey``,
+    ``status`` ("delivered"/"read") and an optional ``timestamp`` (epoch
+    seconds or ISO 8601). Raises ValueError for a malformed body.
+    """
+    if isinstance(payload, dict):
+        items = payload.get('receipts', [payload])
+    else:
+        items = payload
+    if not isinstance(items, list) or len(items) > MAX_RECEIPTS_PER_REQUEST:
+        raise ValueError(f'Expected a list of at most {MAX_RECEIPTS_PER_REQUEST} receipts.')
+
+    receipts = []
+    for item in items:
+        if not isinstance(item, dict):
+            raise ValueError('Each receipt must be an object.')
+        key = item.get('idempotencyKey')
+        status = str(item.get('status', '')).upper()
+        if not key or status not in (CampaignRecipient.Status.DELIVERED, CampaignRecipient.Status.READ):
+            continue  # other events (sent, typing, ...) are not tracked
+        receipts.append(DeliveryReceipt(key=str(key)[:64], status=status, occurred_at=_parse_time(item.get('timestamp'))))
+    return receipts
+
+
+def _apply(batch):
+    """Apply a batch; returns ``(recipients updated, ids of receipts to keep)``."""
+    recipient_ids = dict(
+        SendLedgerEntry.objects.filter(key__in={r.key for r in batch}).values_list('key', 'recipient_id')
+    )
+    # Newest state and first time seen per recipient.
+    latest = {}
+    for receipt in batch:
+        recipient_id = recipient_ids.get(receipt.key)
+        if recipient_id is None:
+            continue
+        entry = latest.setdefault(recipient_id, {})
+        if RANK[receipt.status] > RANK.get(entry.get('status'), 0):
+            entry['status'] = receipt.status
+        field = 'read_at' if receipt.status == CampaignRecipient.Status.READ else 'delivered_at'
+        if entry.get(field) is None or receipt.occurred_at < entry[field]:
+            entry[field] = receipt.occurred_at
+
+    changed = []
+    early = set()
+    recipients = CampaignRecipient.objects.filter(id__in=latest).order_by('id').select_for_update()
+    for recipient in recipients:
+        update = latest[recipient.id]
+        if recipient.status == CampaignRecipient.Status.PENDING:
+            early.add(recipient.id)
+            continue
+        if recipient.status not in RANK:
+            continue  # failed/suppressed: a stray receipt can't revive it
+        if RANK[update['status']] > RANK[recipient.status]:
+            recipient.status = update['status']
+        # A read message was delivered too, even if that receipt was lost.
+        delivered_at = update.get('delivered_at') or update.get('read_at')
+        if recipient.delivered_at is None and delivered_at:
+            recipient.delivered_at = delivered_at
+        if recipient.read_at is None and update.get('read_at'):
+            recipient.read_at = update['read_at']
+        changed.append(recipient)
+    CampaignRecipient.objects.bulk_update(changed, ['status', 'delivered_at', 'read_at'])
+
+    cutoff = timezone.now() - EARLY_RECEIPT_WINDOW
+    keep = {
+        r.id for r in batch
+        if recipient_ids.get(r.key) in early and r.received_at > cutoff
+    }
+    return len(changed), keep
+
+
+def flush():
+    """Apply and drain the receipt buffer. Returns ``(receipts, recipients updated)``."""
+    if not cache.add('receipts:flushing', 1, FLUSH_LOCK_TIMEOUT):
+        return 0, 0
+    try:
+        receipts = updated = 0
+        last_id = 0
+        while True:
+            with transaction.atomic():
+                batch = list(DeliveryReceipt.objects.filter(id__gt=last_id).order_by('id')[:FLUSH_BATCH_SIZE])
+                if not batch:
+                    break
+                n, keep = _apply(batch)
+                DeliveryReceipt.objects.filter(id__in=[r.id for r in batch if r.id not in keep]).delete()
+            updated += n
+            receipts += len(batch) - len(keep)
+            last_id = batch[-1].id
+            cache.touch('receipts:flushing', FLUSH_LOCK_TIMEOUT)
+        return receipts, updated
+    finally:
+        cache.delete('receipts:flushing')
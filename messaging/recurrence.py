@@ -0,0 +1,85 @@
+# messaging/recurrence.py
+"""
+Recurring campaigns.
+
+Every CampaignRecurrence owns one django_celery_beat PeriodicTask on a
+CrontabSchedule, so the beat DatabaseScheduler fires ``run_campaign_recurrence``
+on time and the schedule can be inspected in the admin. A run is a DRAFT
+Campaign carrying the recurrence's source; the usual background ingestion
+copies its recipients set-based and queues the send.
+"""
+import json
+
+from celery.schedules import crontab
+from django.conf import settings
+from django.db import transaction
+from django_celery_beat.models import CrontabSchedule, PeriodicTask
+
+from .models import Campaign, CampaignRecurrence
+
+CRON_FIELDS = ('minute', 'hour', 'day_of_month', 'month_of_year', 'day_of_week')
+TASK_NAME = 'messaging.tasks.run_campaign_recurrence'
+# A run that hasn't finished yet makes the next one skip rather than pile up.
+UNFINISHED_STATUSES = (
+    Campaign.Status.DRAFT, Campaign.Status.PENDING, Campaign.Status.IN_PROGRESS,
+    Campaign.Status.WAITING, Campaign.Status.PAUSED,
+)
+
+
+def parse_cron(expression):
+    """Crontab fields of a five-field cron expression. Raises ValueError."""
+    parts = (expression or '').split()
+    if len(parts) != len(CRON_FIELDS):
+        raise ValueError("Cron expression needs five fields: minute hour day-of-month month day-of-week.")
+    fields = dict(zip(CRON_FIELDS, parts))
+    try:
+        crontab(**fields)
+    except ValueError as e:
+        raise ValueError(f"Invalid cron expression: {e}")
+    return fields
+
+
+def schedule(recurrence):
+    """Create or update the recurrence's beat entry to match it."""
+    crontab_schedule, _ = CrontabSchedule.objects.get_or_create(
+        timezone=settings.TIME_ZONE, **parse_cron(recurrence.cron)
+    )
+    task, _ = PeriodicTask.objects.update_or_create(
+        name=f'campaign-recurrence-{recurrence.pk}',
+        defaults={
+            'task': TASK_NAME,
+            'crontab': crontab_schedule,
+            'args': json.dumps([recurrence.pk]),
+            'enabled': recurrence.is_active,
+        },
+    )
+    if recurrence.periodic_task_id != task.pk:
+        recurrence.periodic_task = task
+        recurrence.save(update_fields=['periodic_task'])
+
+
+def unschedule(recurrence):
+    PeriodicTask.objects.filter(name=f'campaign-recurrence-{recurrence.pk}').delete()
+
+
+def start_run(recurrence):
+    """
+    Create the next run as a DRAFT campaign and return it, or None if the
+    previous run is still going. Its recipients are ingested by the caller.
+    """
+    with transaction.atomic():
+        # Serializes concurrent beat deliveries of the same tick.
+        CampaignRecurrence.objects.select_for_update().filter(pk=recurrence.pk).first()
+        if recurrence.runs.filter(status__in=UNFINISHED_STATUSES).exists():
+            return None
+        return Campaign.objects.create(
+            name=recurrence.name,
+            message_content=recurrence.message_content,
+            created_by_id=recurrence.created_by_id,
+            status=Campaign.Status.DRAFT,
+            window_start=recurrence.window_start,
+            window_end=recurrence.window_end,
+            recipient_source=recurrence.recipient_source,
+            recipient_params=recurrence.recipient_params,
+            recurrence=recurrence,
+        )
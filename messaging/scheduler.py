@@ -0,0 +1,159 @@
+# messaging/scheduler.py
+"""
+Fair-share campaign dispatch.
+
+Campaigns are no longer sent start to finish by one task each. A fixed
+number of dispatch slots (CAMPAIGN_DISPATCH_SLOTS Celery tasks at most) take
+turns, and every turn sends one bounded slice of one campaign. Turns are
+handed out by deficit round-robin over users: each time a user comes up in
+the rotation they are credited ``QUANTUM * weight`` messages, and a slice
+spends that credit. Within a user their campaigns take turns as well. A
+user's weight grows with their message quota, so bigger plans get a bigger
+share, but a million-message blast only ever holds one slot per turn and a
+small tenant's campaign starts within one rotation.
+
+The rotation and credits live in the shared cache under a short lock, so any
+worker can run any slot. With a process-local cache every worker process
+would keep its own slots and locks, so a system check warns about it unless
+tasks run eagerly in the web process. Each campaign keeps its dispatch lock while a slot
+sends it, which is also how the rotation skips campaigns that are busy.
+"""
+import time
+from collections import defaultdict, namedtuple
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import cache
+
+from .frequency import shared_cache
+from .models import Campaign
+
+QUANTUM = 50  # messages per turn for a weight-1 user
+BASE_QUOTA = 1000  # CustomUser.message_quota default; weight 1
+MAX_WEIGHT = 8
+SLOT_LEASE = 15 * 60  # seconds; refreshed after every chunk
+SLOT_TASK_SECONDS = 5 * 60  # a slot task hands over to a fresh one after this long
+STATE_KEY = 'dispatch:drr'
+STATE_LOCK_KEY = 'dispatch:drr:lock'
+STATE_LOCK_TIMEOUT = 5  # seconds
+STATE_WAIT_STEP = 0.01
+
+Turn = namedtuple('Turn', 'campaign_id user_id budget lock')
+
+
+def weight(message_quota):
+    """A user's share: their quota in multiples of the default one, from 1 to MAX_WEIGHT."""
+    return max(1, min(MAX_WEIGHT, (message_quota or 0) // BASE_QUOTA))
+
+
+def campaign_lock(campaign_id):
+    return f'campaign:dispatch:{campaign_id}'
+
+
+def slot_key(slot):
+    return f'dispatch:slot:{slot}'
+
+
+@checks.register()
+def check_shared_cache(app_configs, **kwargs):
+    if not shared_cache() and not settings.CELERY_TASK_ALWAYS_EAGER:
+        return [checks.Warning(
+            "Campaign dispatch slots and locks are kept in a cache local to each process, "
+            "so separate workers can send the same campaign at once.",
+            hint="Set REDIS_URL so the dispatch scheduler uses a shared cache.",
+            id='messaging.W002',
+        )]
+    return []
+
+
+@contextmanager
+def _state():
+    """The rotation state, read and written back under the scheduler lock."""
+    deadline = time.monotonic() + STATE_LOCK_TIMEOUT
+    locked = cache.add(STATE_LOCK_KEY, 1, STATE_LOCK_TIMEOUT)
+    while not locked and time.monotonic() < deadline:
+        time.sleep(STATE_WAIT_STEP)
+        locked = cache.add(STATE_LOCK_KEY, 1, STATE_LOCK_TIMEOUT)
+    # Past the deadline go ahead without the lock: the state is only
+    # advisory, and the lock isn't ours to delete.
+    try:
+        state = cache.get(STATE_KEY) or {'order': [], 'deficit': {}, 'last': {}}
+        yield state
+        cache.set(STATE_KEY, state, timeout=None)
+    finally:
+        if locked:
+            cache.delete(STATE_LOCK_KEY)
+
+
+def _claim_campaign(campaign_ids, last_id):
+    """Lock the user's next campaign after ``last_id`` that no slot is sending."""
+    start = next((i for i, c in enumerate(campaign_ids) if c > (last_id or 0)), 0)
+    for campaign_id in campaign_ids[start:] + campaign_ids[:start]:
+        if cache.add(campaign_lock(campaign_id), 1, SLOT_LEASE):
+            return campaign_id
+    return None
+
+
+def next_turn():
+    """
+    The next slice to send, as a Turn whose campaign lock is already held,
+    or None when every running campaign is idle or being sent.
+    """
+    active = defaultdict(list)
+    quotas = {}
+    rows = (
+        Campaign.objects.filter(status=Campaign.Status.IN_PROGRESS).order_by('id')
+        .values_list('id', 'created_by_id', 'created_by__message_quota')
+    )
+    for campaign_id, user_id, quota in rows:
+        active[user_id].append(campaign_id)
+        quotas[user_id] = quota
+    if not active:
+        return None
+
+    with _state() as state:
+        order = [u for u in state['order'] if u in active]
+        order += [u for u in active if u not in order]
+        # Users without running campaigns lose their credit, as in plain DRR.
+        state['deficit'] = {u: d for u, d in state['deficit'].items() if u in active}
+        state['last'] = {u: c for u, c in state['last'].items() if u in active}
+        turn = None
+        for _ in range(len(order)):
+            user_id = order.pop(0)
+            order.append(user_id)
+            campaign_id = _claim_campaign(active[user_id], state['last'].get(user_id))
+            if campaign_id is None:
+                continue  # everything of theirs is being sent right now
+            credit = state['deficit'].get(user_id, 0) + QUANTUM * weight(quotas[user_id])
+            state['deficit'][user_id] = credit
+            state['last'][user_id] = campaign_id
+            turn = Turn(campaign_id, user_id, credit, campaign_lock(campaign_id))
+            break
+        state['order'] = order
+    return turn
+
+
+def finish_turn(turn, sent):
+    """Charge the user for what the slice sent and let other slots have the campaign."""
+    with _state() as state:
+        if turn.user_id in state['deficit']:
+            state['deficit'][turn.user_id] = max(0, state['deficit'][turn.user_id] - sent)
+    cache.delete(turn.lock)
+
+
+def acquire_slot(slot):
+    return cache.add(slot_key(slot), 1, SLOT_LEASE)
+
+
+def release_slot(slot):
+    cache.delete(slot_key(slot))
+
+
+def wake():
+    """Start every idle dispatch slot; slots that find nothing to send exit at once."""
+    from .tasks import dispatch_slot
+
+    for slot in range(settings.CAMPAIGN_DISPATCH_SLOTS):
+        if acquire_slot(slot):
+            dispatch_slot.delay(slot)
@@ -0,0 +1,41 @@
+# messaging/signals.py
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from .catalog import SHARED_SCOPE, bump_version, invalidate_for_owner
+from .models import MessageTemplate, SuppressedNumber
+from . import suppression
+
+
+@receiver(post_save, sender=MessageTemplate)
+@receiver(post_delete, sender=MessageTemplate)
+def invalidate_template_catalog(sender, instance, **kwargs):
+    invalidate_for_owner(instance.created_by)
+
+
+@receiver(pre_save, sender=get_user_model())
+def remember_superuser_flag(sender, instance, update_fields=None, **kwargs):
+    if not instance.pk or (update_fields is not None and 'is_superuser' not in update_fields):
+        instance._was_superuser = None  # e.g. last_login updates: nothing to compare
+        return
+    instance._was_superuser = sender.objects.filter(pk=instance.pk).values_list('is_superuser', flat=True).first()
+
+
+@receiver(post_save, sender=get_user_model())
+def invalidate_shared_catalog(sender, instance, **kwargs):
+    """A promoted or demoted user's templates join or leave the shared catalog."""
+    was_superuser = getattr(instance, '_was_superuser', None)
+    if was_superuser is not None and was_superuser != instance.is_superuser:
+        bump_version(SHARED_SCOPE)
+
+
+@receiver(post_save, sender=SuppressedNumber)
+def note_suppression_added(sender, instance, created, **kwargs):
+    if created:
+        suppression.suppression_added(instance.pk)
+
+
+@receiver(post_delete, sender=SuppressedNumber)
+def note_suppression_removed(sender, instance, **kwargs):
+    suppression.suppression_removed()
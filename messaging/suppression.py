@@ -0,0 +1,160 @@
+# messaging/suppression.py
+"""
+Opt-out (suppression) checks.
+
+Each process keeps a Bloom filter over SuppressedNumber. New rows are folded
+in incrementally from an id watermark whenever the shared cache reports a
+newer id; deletions bump a generation number there, which makes every process
+rebuild its filter. A filter miss means "definitely not suppressed", so the
+database is only asked about the few numbers that hit, with one indexed query
+per batch.
+"""
+import hashlib
+import math
+import threading
+import time
+
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef, Q
+
+from core.phones import e164_int
+from .models import SuppressedNumber
+
+REFRESH_INTERVAL = 30  # seconds; backstop for rows added without signals (bulk_create)
+ERROR_RATE = 0.001
+MIN_CAPACITY = 1 << 16
+# New rows are re-read from a little below the watermark, so a row whose
+# transaction committed after a higher id was already seen isn't missed.
+WATERMARK_OVERLAP = 1000
+LOAD_CHUNK_SIZE = 10000
+GENERATION_KEY = 'suppression:generation'
+LATEST_KEY = 'suppression:latest_id'
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter using double hashing over one blake2b digest."""
+
+    def __init__(self, capacity, error_rate=ERROR_RATE):
+        self.capacity = capacity
+        self.size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    @staticmethod
+    def _hashes(key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        return int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+
+    def add(self, key):
+        h1, h2 = self._hashes(key)
+        for i in range(self.hashes):
+            pos = (h1 + i * h2) % self.size
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        # Stops at the first clear bit, so most misses cost one or two probes.
+        h1, h2 = self._hashes(key)
+        bits, size = self.bits, self.size
+        for i in range(self.hashes):
+            pos = (h1 + i * h2) % size
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+
+class SuppressionIndex:
+    """The per-process filter plus the state needed to keep it current."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._filter = None
+        self._generation = None
+        self._watermark = 0
+        self._recent_ids = set()  # ids already added within the overlap below the watermark
+        self._checked_at = 0.0
+
+    def _load_new_rows(self):
+        rows = (
+            SuppressedNumber.objects.filter(id__gt=max(0, self._watermark - WATERMARK_OVERLAP))
+            .order_by('id').values_list('id', 'phone_number')
+            .iterator(chunk_size=LOAD_CHUNK_SIZE)
+        )
+        for row_id, phone_number in rows:
+            # The overlap is re-read on every refresh; only rows not seen yet count towards capacity.
+            if row_id in self._recent_ids:
+                continue
+            self._filter.add(phone_number)
+            self._recent_ids.add(row_id)
+            self._watermark = max(self._watermark, row_id)
+        floor = self._watermark - WATERMARK_OVERLAP
+        self._recent_ids = {row_id for row_id in self._recent_ids if row_id > floor}
+
+    def _rebuild(self):
+        capacity = max(MIN_CAPACITY, SuppressedNumber.objects.count() * 2)
+        self._filter = BloomFilter(capacity)
+        self._watermark = 0
+        self._recent_ids = set()
+        self._load_new_rows()
+
+    def refresh(self):
+        state = cache.get_many([GENERATION_KEY, LATEST_KEY])
+        with self._lock:
+            generation = state.get(GENERATION_KEY)
+            if self._filter is None or generation != self._generation or self._filter.count > self._filter.capacity:
+                self._rebuild()
+                self._generation = generation
+            elif state.get(LATEST_KEY, 0) > self._watermark or time.monotonic() - self._checked_at > REFRESH_INTERVAL:
+                self._load_new_rows()
+            else:
+                return
+            self._checked_at = time.monotonic()
+
+    def candidates(self, phone_numbers):
+        """
+        Numbers that may be suppressed; never misses a real one. The filter
+        holds numbers of every owner, the exact check applies the owner.
+        """
+        self.refresh()
+        bloom = self._filter
+        return [p for p in phone_numbers if p in bloom]
+
+
+SUPPRESSION_INDEX = SuppressionIndex()
+
+
+def suppression_added(row_id):
+    """Tell every process a suppression with this id exists (post_save)."""
+    latest = cache.get(LATEST_KEY, 0)
+    if row_id > latest:
+        cache.set(LATEST_KEY, row_id, timeout=None)
+
+
+def suppression_removed():
+    """Make every process rebuild its filter so removed numbers stop costing lookups."""
+    cache.set(GENERATION_KEY, time.time_ns(), timeout=None)
+
+
+def _applies_to(user_id):
+    return Q(user__isnull=True) | Q(user_id=user_id)
+
+
+def suppressed_numbers(user_id, phone_numbers):
+    """The exact subset of ``phone_numbers`` suppressed for this user, global entries included."""
+    candidates = {e164_int(p): p for p in SUPPRESSION_INDEX.candidates(phone_numbers)}
+    candidates.pop(None, None)
+    if not candidates:
+        return set()
+    hits = (
+        SuppressedNumber.objects.filter(_applies_to(user_id), phone_e164__in=candidates)
+        .values_list('phone_e164', flat=True)
+    )
+    return {candidates[n] for n in hits}
+
+
+def exclude_suppressed(queryset, user_id, e164_field='phone_e164'):
+    """``queryset`` without rows whose integer ``e164_field`` is suppressed, for INSERT ... SELECT."""
+    return queryset.exclude(Exists(
+        SuppressedNumber.objects.filter(_applies_to(user_id), phone_e164=OuterRef(e164_field))
+    ))
@@ -1,37 +1,492 @@
-import requests
-from django.conf import settings
+import time
+
+from celery import shared_task
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Q
+from django.db.models.functions import Coalesce, Now
 from django.utils import timezone
-from .models import Campaign, CampaignRecipient
+from .models import Campaign, CampaignRecipient, CampaignRecurrence, MessageTemplate, RecipientChunk, RecipientFailure, SendLedgerEntry
+from .catalog import invalidate_for_owner
+from . import ai, frequency, gateway, ingest, ledger, packed, receipts, recurrence, scheduler, suppression, windows
+
+DISPATCH_CHUNK_SIZE = 50
+SLICE_MORE = 'more'
+SLICE_DRAINED = 'drained'
+SLICE_SESSION_LOST = 'session_lost'
+LIVE_STATUSES = (Campaign.Status.PENDING, Campaign.Status.IN_PROGRESS, Campaign.Status.WAITING, Campaign.Status.PAUSED)
+
+
+def _pause(campaign_id):
+    Campaign.objects.filter(
+        pk=campaign_id, status__in=(Campaign.Status.PENDING, Campaign.Status.IN_PROGRESS)
+    ).update(status=Campaign.Status.PAUSED)
+
+
+def _fail_dispatch(campaign_id, error):
+    # FAILED rather than PAUSED, so monitor_session_health doesn't resume it
+    # into the same error; the campaign list offers a retry.
+    Campaign.objects.filter(
+        pk=campaign_id, status__in=(Campaign.Status.PENDING, Campaign.Status.IN_PROGRESS)
+    ).update(status=Campaign.Status.FAILED, dispatch_error=error)
+
+
+def queue_dispatch(campaign_id, scheduled_at=None):
+    """Move a prepared DRAFT campaign on and enqueue its send once that is committed."""
+    with transaction.atomic():
+        campaign = Campaign.objects.get(pk=campaign_id)
+        if campaign.has_send_window:
+            # Each timezone bucket is released by its own timer (messaging/windows.py).
+            updated = Campaign.objects.filter(pk=campaign_id, status=Campaign.Status.DRAFT).update(
+                status=Campaign.Status.WAITING
+            )
+            if updated:
+                transaction.on_commit(lambda: windows.arm(campaign, scheduled_at))
+        elif scheduled_at and scheduled_at > timezone.now():
+            updated = Campaign.objects.filter(pk=campaign_id, status=Campaign.Status.DRAFT).update(
+                status=Campaign.Status.PENDING
+            )
+            if updated:
+                transaction.on_commit(lambda: send_campaign_messages.apply_async(args=[campaign_id], eta=scheduled_at))
+        else:
+            updated = Campaign.objects.filter(pk=campaign_id, status=Campaign.Status.DRAFT).update(
+                status=Campaign.Status.IN_PROGRESS, started_at=timezone.now()
+            )
+            if updated:
+                transaction.on_commit(lambda: send_campaign_messages.delay(campaign_id))
+
+
+@shared_task(ignore_result=True)
+def ingest_campaign_recipients(campaign_id):
+    """Builds a DRAFT campaign's recipients from its stored upload or selection, then queues dispatch."""
+    campaign = Campaign.objects.select_related('created_by').get(id=campaign_id)
+    if campaign.status != Campaign.Status.DRAFT:
+        return None
+
+    try:
+        count = ingest.ingest_recipients(campaign)
+        if not count:
+            raise ValueError("No valid recipients found. Use 92XXXXXXXXXX, or +<country code><number> outside Pakistan.")
+    except ValueError as e:
+        _fail_ingest(campaign, str(e))
+        return None
+    except Exception as e:
+        # Don't leave the campaign in DRAFT with its progress bar polling forever.
+        print(f"❌ Recipient ingestion crashed for campaign {campaign_id}: {e!r}")
+        _fail_ingest(campaign, "Recipients could not be loaded. Please try again or re-upload the file.")
+        raise
+    finally:
+        ingest.discard_upload(campaign)
+
+    queue_dispatch(campaign_id, campaign.scheduled_at)
+    return {"recipients": count}
+
+
+def _fail_ingest(campaign, error):
+    Campaign.objects.filter(pk=campaign.pk).update(status=Campaign.Status.FAILED, ingest_error=error)
+    ingest.publish_progress(campaign.pk, state='FAILED', error=error)
+    print(f"❌ Campaign '{campaign.name}' could not be prepared: {error}")
 
+
+@shared_task(ignore_result=True)
+def run_campaign_recurrence(recurrence_id):
+    """Beat task (one PeriodicTask per recurrence): starts the next run of a recurring campaign."""
+    recurring = CampaignRecurrence.objects.filter(pk=recurrence_id, is_active=True).first()
+    if recurring is None:
+        return None
+    run = recurrence.start_run(recurring)
+    if run is None:
+        print(f"⏭️ Recurring campaign '{recurring.name}' skipped — the previous run is still going")
+        return None
+    return ingest_campaign_recipients(run.id)
+
+
+@shared_task(ignore_result=True)
 def send_campaign_messages(campaign_id):
-    """Sends all messages in a campaign directly via Node.js WhatsApp API."""
+    """
+    Starts sending a campaign via the Node.js WhatsApp API.
+
+    The campaign is marked IN_PROGRESS and handed to the fair-share scheduler
+    (messaging/scheduler.py); dispatch slots then send it a slice at a time,
+    interleaved with every other user's campaigns. The session's health is
+    checked before starting and after every chunk; if it is down the campaign
+    is PAUSED with the rest of its recipients still pending, and
+    monitor_session_health resumes it once the session is back.
+    """
     campaign = Campaign.objects.get(id=campaign_id)
-    recipients = CampaignRecipient.objects.filter(campaign=campaign)
-    
-    success_count = 0
-    fail_count = 0
-
-    for recipient in recipients:
-        payload = {
-            "userId": campaign.created_by.id,
-            "phone": recipient.phone_number,
-            "message": campaign.message_content
-        }
-        try:
-            response = requests.post(
-                f"{settings.WHATSAPP_GATEWAY_URL}",
-                json=payload,
-                timeout=15
-            )
-            response.raise_for_status()
-            success_count += 1
-        except requests.RequestException as e:
-            print(f"❌ Failed to send message to {recipient.phone_number}: {e}")
-            fail_count += 1
-
-    campaign.status = Campaign.Status.COMPLETED
-    campaign.completed_at = timezone.now()
-    campaign.save()
-
-    print(f"✅ Campaign '{campaign.name}' completed — Sent: {success_count}, Failed: {fail_count}")
-    return {"sent": success_count, "failed": fail_count}
+    if campaign.status not in (Campaign.Status.PENDING, Campaign.Status.IN_PROGRESS):
+        return None  # still being prepared, paused or finished
+
+    if not gateway.is_session_healthy(campaign.created_by_id):
+        _pause(campaign_id)
+        print(f"⏸️ Campaign '{campaign.name}' paused — WhatsApp session is not connected")
+        return {"paused": True}
+
+    Campaign.objects.filter(pk=campaign_id).update(
+        status=Campaign.Status.IN_PROGRESS, started_at=Coalesce('started_at', Now())
+    )
+    scheduler.wake()
+    return {"queued": True}
+
+
+@shared_task(ignore_result=True)
+def dispatch_slot(slot):
+    """
+    One dispatch slot: sends fair-share slices until no campaign is waiting.
+    The caller has already taken the slot's lease.
+    """
+    deadline = time.monotonic() + scheduler.SLOT_TASK_SECONDS
+    try:
+        while time.monotonic() < deadline:
+            turn = scheduler.next_turn()
+            if turn is None:
+                scheduler.release_slot(slot)
+                # A wake() that found this slot busy just before the release is
+                # lost, so look once more before going away.
+                if not scheduler.acquire_slot(slot):
+                    return None
+                turn = scheduler.next_turn()
+                if turn is None:
+                    scheduler.release_slot(slot)
+                    return None
+
+            sent = 0
+            try:
+                sent = _send_slice(turn, scheduler.slot_key(slot))
+            except Exception as e:
+                # One broken campaign must not take the slot down with it, nor
+                # come back in the rotation until someone retries it.
+                print(f"❌ Campaign {turn.campaign_id} stopped — its slice failed: {e!r}")
+                _fail_dispatch(turn.campaign_id, "Sending stopped after an unexpected error.")
+            finally:
+                scheduler.finish_turn(turn, sent)
+
+        # Hand over to a fresh task (keeping the lease) rather than run forever.
+        dispatch_slot.delay(slot)
+    except BaseException:
+        # Otherwise wake() can't restart the slot until its lease runs out.
+        scheduler.release_slot(slot)
+        raise
+    return None
+
+
+def _send_slice(turn, slot_lease):
+    """Send up to ``turn.budget`` of the campaign's pending recipients; returns how many were sent."""
+    campaign_id = turn.campaign_id
+    campaign = Campaign.objects.filter(id=campaign_id).first()
+    if campaign is None or campaign.status != Campaign.Status.IN_PROGRESS:
+        return 0  # deleted or stopped since the turn was handed out
+
+    if not gateway.is_session_healthy(campaign.created_by_id):
+        _pause(campaign_id)
+        print(f"⏸️ Campaign '{campaign.name}' paused — WhatsApp session is not connected")
+        return 0
+
+    send = _send_packed if campaign.is_packed else _send_rows
+    sent, outcome = send(campaign, turn, slot_lease)
+    if outcome == SLICE_DRAINED:
+        if not windows.park_if_waiting(campaign_id):
+            _complete(campaign)
+    elif outcome == SLICE_SESSION_LOST:
+        _pause(campaign_id)
+        print(f"⏸️ Campaign '{campaign.name}' paused — WhatsApp session is not connected")
+    return sent
+
+
+def _deliver(campaign, phone, key):
+    """
+    Send one message. Returns ``(ok, error)``, or None when the session
+    itself went away and the recipient must stay unsent.
+    """
+    user_id = campaign.created_by_id
+    ok, error, transport_error = gateway.send_message(user_id, phone, campaign.message_content, idempotency_key=key)
+    if transport_error:
+        # Don't blame the recipient if the session itself went away; the
+        # resumed run retries with the same key and the gateway can drop a
+        # duplicate.
+        gateway.invalidate_session_status(user_id)
+        if not gateway.is_session_healthy(user_id):
+            return None
+    if not ok:
+        print(f"❌ Failed to send message to {phone}: {error}")
+    return ok, error
+
+
+def _touch(turn, slot_lease):
+    cache.touch(turn.lock, scheduler.SLOT_LEASE)
+    cache.touch(slot_lease, scheduler.SLOT_LEASE)
+
+
+def _send_rows(campaign, turn, slot_lease):
+    """Slice over CampaignRecipient rows. Returns ``(sent, outcome)``."""
+    campaign_id = campaign.id
+    user_id = campaign.created_by_id
+    sent = 0
+    last_id = 0
+    while sent < turn.budget:
+        chunk = list(
+            CampaignRecipient.objects.filter(
+                campaign_id=campaign_id, status=CampaignRecipient.Status.PENDING, id__gt=last_id
+            ).order_by('id')[:min(DISPATCH_CHUNK_SIZE, turn.budget - sent)]
+        )
+        if not chunk:
+            return sent, SLICE_DRAINED
+
+        done = []
+        outcomes = {}
+        session_lost = False
+        # Numbers may have opted out since the campaign was built.
+        blocked = suppression.suppressed_numbers(user_id, [r.phone_number for r in chunk])
+        counters = frequency.load(user_id, [r.phone_number for r in chunk if r.phone_number not in blocked])
+        over_cap = frequency.capped(counters)
+        to_send, already_sent, duplicates = ledger.claim(
+            campaign_id, [r for r in chunk if r.phone_number not in blocked and r.phone_number not in over_cap]
+        )
+        delivered = []
+        attempted = {}  # key -> the recipient it was sent for
+        for recipient in chunk:
+            if recipient.phone_number in blocked:
+                recipient.status = CampaignRecipient.Status.SUPPRESSED
+                done.append(recipient)
+                continue
+            if recipient.phone_number in over_cap:
+                recipient.status = CampaignRecipient.Status.CAPPED
+                done.append(recipient)
+                continue
+            if recipient.id in already_sent:
+                # Reached by an earlier (redelivered or interrupted) run.
+                recipient.status = CampaignRecipient.Status.SENT
+                done.append(recipient)
+                continue
+            if recipient.id in duplicates:
+                # Same number as an earlier row of this chunk: it shares that send's outcome.
+                original = attempted.get(duplicates[recipient.id])
+                if original is not None:
+                    recipient.status = original.status
+                    recipient.sent_at = original.sent_at
+                    recipient.error_message = original.error_message
+                    done.append(recipient)
+                continue
+            if recipient.id not in to_send:
+                continue  # another worker is sending this number
+            key = to_send[recipient.id]
+            result = _deliver(campaign, recipient.phone_number, key)
+            if result is None:
+                session_lost = True
+                break
+            ok, error = result
+            recipient.status = CampaignRecipient.Status.SENT if ok else CampaignRecipient.Status.FAILED
+            recipient.sent_at = timezone.now() if ok else None
+            recipient.error_message = error
+            done.append(recipient)
+            outcomes[key] = SendLedgerEntry.State.SENT if ok else SendLedgerEntry.State.FAILED
+            attempted[key] = recipient
+            if ok:
+                delivered.append(recipient.phone_number)
+            sent += 1
+
+        frequency.add(user_id, counters, delivered)
+        with transaction.atomic():
+            ledger.record(outcomes)
+            # Claims left unsent by a lost session go back for the resumed run.
+            ledger.release(set(to_send.values()) - set(outcomes))
+            CampaignRecipient.objects.bulk_update(done, ['status', 'sent_at', 'error_message'])
+        last_id = chunk[-1].id
+        _touch(turn, slot_lease)
+
+        if session_lost or gateway.session_health(user_id) is False:
+            return sent, SLICE_SESSION_LOST
+    return sent, SLICE_MORE
+
+
+def _send_packed(campaign, turn, slot_lease):
+    """
+    Slice over RecipientChunk blobs (messaging/packed.py): bitmaps are saved
+    after every DISPATCH_CHUNK_SIZE sends. Returns ``(sent, outcome)``.
+    """
+    user_id = campaign.created_by_id
+    sent = 0
+    while sent < turn.budget:
+        chunk = packed.next_chunk(campaign.id)
+        if chunk is None:
+            return sent, SLICE_DRAINED
+        phones = packed.unpack_phones(chunk.phones)
+        done_bits, sent_bits = bytearray(chunk.done_bits), bytearray(chunk.sent_bits)
+        todo = [i for i in range(chunk.size) if not packed.has_bit(done_bits, i)]
+
+        position = 0
+        while position < len(todo):
+            step = todo[position:position + min(DISPATCH_CHUNK_SIZE, turn.budget - sent)]
+            position += len(step)
+            failures = []
+            session_lost = False
+            blocked = suppression.suppressed_numbers(user_id, [phones[i] for i in step])
+            counters = frequency.load(user_id, [phones[i] for i in step if phones[i] not in blocked])
+            over_cap = frequency.capped(counters)
+            delivered = []
+            for i in step:
+                phone = phones[i]
+                if phone in blocked:
+                    failures.append(RecipientFailure(chunk=chunk, position=i, status=CampaignRecipient.Status.SUPPRESSED))
+                elif phone in over_cap:
+                    failures.append(RecipientFailure(chunk=chunk, position=i, status=CampaignRecipient.Status.CAPPED))
+                else:
+                    result = _deliver(campaign, phone, ledger.send_key(campaign.id, phone))
+                    if result is None:
+                        session_lost = True
+                        break
+                    ok, error = result
+                    if ok:
+                        packed.set_bit(sent_bits, i)
+                        chunk.sent_count += 1
+                        delivered.append(phone)
+                    else:
+                        failures.append(RecipientFailure(
+                            chunk=chunk, position=i, status=CampaignRecipient.Status.FAILED, error_message=error or '',
+                        ))
+                        chunk.failed_count += 1
+                    sent += 1
+                packed.set_bit(done_bits, i)
+                chunk.done_count += 1
+
+            frequency.add(user_id, counters, delivered)
+            packed.record(chunk, done_bits, sent_bits, failures)
+            _touch(turn, slot_lease)
+            if session_lost or gateway.session_health(user_id) is False:
+                return sent, SLICE_SESSION_LOST
+            if sent >= turn.budget:
+                return sent, SLICE_MORE
+    return sent, SLICE_MORE
+
+
+def _complete(campaign):
+    # A send-window bucket may have been released since the slice looked.
+    unsent = CampaignRecipient.objects.filter(
+        campaign_id=OuterRef('pk'), status__in=(CampaignRecipient.Status.PENDING, CampaignRecipient.Status.WAITING)
+    )
+    unsent_chunks = packed.remaining(RecipientChunk.objects.filter(campaign_id=OuterRef('pk')))
+    if not Campaign.objects.filter(pk=campaign.pk, status=Campaign.Status.IN_PROGRESS).exclude(
+        Exists(unsent)
+    ).exclude(Exists(unsent_chunks)).update(status=Campaign.Status.COMPLETED, completed_at=timezone.now()):
+        return
+    if campaign.is_packed:
+        by_status = packed.counts([campaign.pk]).get(campaign.pk, {})
+        counts = {'sent': by_status.get(CampaignRecipient.Status.SENT, 0), 'failed': by_status.get(CampaignRecipient.Status.FAILED, 0)}
+    else:
+        counts = campaign.recipients.aggregate(
+            sent=Count('id', filter=Q(status__in=(
+                CampaignRecipient.Status.SENT, CampaignRecipient.Status.DELIVERED, CampaignRecipient.Status.READ
+            ))),
+            failed=Count('id', filter=Q(status=CampaignRecipient.Status.FAILED)),
+        )
+    print(f"✅ Campaign '{campaign.name}' completed — Sent: {counts['sent']}, Failed: {counts['failed']}")
+
+
+@shared_task(ignore_result=True)
+def release_send_window(campaign_id, tz_bucket):
+    """Timer: a timezone bucket's send window opened; release its recipients and arm the close."""
+    campaign = Campaign.objects.get(id=campaign_id)
+    if campaign.status not in LIVE_STATUSES:
+        return None
+    if not windows.is_open(campaign, tz_bucket):
+        # Fired early (clock skew); try again at the real opening.
+        release_send_window.apply_async(args=[campaign_id, tz_bucket], eta=windows.next_open(campaign, tz_bucket))
+        return None
+
+    released = windows.release(campaign, tz_bucket)
+    if released:
+        close_send_window.apply_async(args=[campaign_id, tz_bucket], eta=windows.next_close(campaign, tz_bucket))
+        send_campaign_messages(campaign_id)
+    print(f"🕙 Campaign '{campaign.name}': released {released} recipients in {tz_bucket}")
+    return {"released": released}
+
+
+@shared_task(ignore_result=True)
+def close_send_window(campaign_id, tz_bucket):
+    """Timer: a bucket's send window closed; hold back its unsent recipients until the next opening."""
+    campaign = Campaign.objects.get(id=campaign_id)
+    if campaign.status not in LIVE_STATUSES:
+        return None
+    held = windows.hold(campaign, tz_bucket)
+    if windows.has_waiting(campaign_id, tz_bucket):
+        release_send_window.apply_async(args=[campaign_id, tz_bucket], eta=windows.next_open(campaign, tz_bucket))
+    return {"held": held}
+
+
+@shared_task(ignore_result=True)
+def monitor_session_health():
+    """
+    Beat task: checks the WhatsApp session of every user with a pending,
+    running or paused campaign in one parallel batch, stores the results for
+    the dispatcher and resumes paused campaigns whose session is back.
+    """
+    user_ids = (
+        Campaign.objects.filter(status__in=LIVE_STATUSES)
+        .order_by().values_list('created_by_id', flat=True).distinct()
+    )
+    health = gateway.check_sessions(user_ids)
+    healthy = [user_id for user_id, ok in health.items() if ok]
+
+    resumed = 0
+    paused = Campaign.objects.filter(status=Campaign.Status.PAUSED, created_by_id__in=healthy)
+    for campaign_id in paused.values_list('id', flat=True):
+        # The conditional update makes sure only one monitor run resumes it.
+        if Campaign.objects.filter(pk=campaign_id, status=Campaign.Status.PAUSED).update(status=Campaign.Status.IN_PROGRESS):
+            send_campaign_messages.delay(campaign_id)
+            resumed += 1
+    return {"checked": len(health), "resumed": resumed}
+
+
+@shared_task(ignore_result=True)
+def wake_dispatch_slots():
+    """Beat task: backstop that restarts idle dispatch slots while campaigns are running."""
+    if Campaign.objects.filter(status=Campaign.Status.IN_PROGRESS).exists():
+        scheduler.wake()
+
+
+@shared_task(ignore_result=True)
+def flush_delivery_receipts():
+    """Beat task: applies buffered gateway receipts to campaign recipients."""
+    applied, updated = receipts.flush()
+    return {"receipts": applied, "recipients": updated}
+
+
+@shared_task(bind=True, max_retries=ai.MAX_RETRIES, ignore_result=True)
+def generate_ai_draft(self, key, prompt):
+    """Drafts ``prompt`` and stores it under ``key``; backs off by rescheduling, never sleeping."""
+    try:
+        draft = ai.request_drafts(prompt)[0]
+        ai.store_draft(key, draft)
+    except ai.DraftError as e:
+        if e.retryable and self.request.retries < self.max_retries:
+            raise self.retry(exc=e, countdown=ai.INITIAL_DELAY * 2 ** self.request.retries)
+        ai.fail_job(key, str(e), e.status)
+    except Exception:
+        # Don't leave pollers waiting on a job that will never finish.
+        ai.fail_job(key, 'Could not draft the message.', 500)
+        raise
+
+
+@shared_task(bind=True, max_retries=ai.MAX_RETRIES, ignore_result=True)
+def generate_ai_draft_batch(self, job_id, user_id, prompts, variants, title):
+    """Drafts every prompt/variant and saves them all as templates with one bulk_create."""
+    try:
+        results = ai.draft_batch(prompts, variants)
+
+        owner = get_user_model().objects.get(pk=user_id)
+        drafts = [draft for batch in results for draft in batch]
+        templates = MessageTemplate.objects.bulk_create([
+            # Variant labels A, B, C, ... across the whole batch.
+            MessageTemplate(title=f"{title} ({chr(ord('A') + i % 26)}{i // 26 or ''})", content=draft, created_by=owner)
+            for i, draft in enumerate(drafts)
+        ])
+        invalidate_for_owner(owner)  # bulk_create sends no post_save
+        ai.finish_batch(job_id, templates)
+    except ai.DraftError as e:
+        if e.retryable and self.request.retries < self.max_retries:
+            raise self.retry(exc=e, countdown=ai.INITIAL_DELAY * 2 ** self.request.retries)
+        ai.fail_job(job_id, str(e), e.status, timeout=ai.BATCH_JOB_TIMEOUT)
+    except Exception:
+        ai.fail_job(job_id, 'Could not draft the messages.', 500, timeout=ai.BATCH_JOB_TIMEOUT)
+        raise
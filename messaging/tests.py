@@ -1,3 +1,476 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import threading
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from . import ai, gateway, ledger, receipts, scheduler, tasks
+from .catalog import get_template_catalog
+from .models import Campaign, CampaignRecipient, DeliveryReceipt, MessageTemplate, SendLedgerEntry
+from .tasks import generate_ai_draft
+
+
+class StubServer:
+    """
+    A local HTTP stand-in for an upstream service. ``respond(path, body)``
+    returns ``(status, json_payload)``; every request is kept in ``calls``.
+    """
+
+    def __init__(self, respond):
+        self.respond = respond
+        self.calls = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+                stub.calls.append((self.path, dict(self.headers), body))
+                status, payload = stub.respond(self.path, body)
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self._server.server_port}'
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def gemini_reply(path, body):
+    """Gemini's generateContent shape; prompts containing "reject" get a 400, "garble" a non-object body."""
+    prompt = body['contents'][0]['parts'][0]['text']
+    if 'reject' in prompt:
+        return 400, {'error': {'message': 'Invalid prompt'}}
+    if 'garble' in prompt:
+        return 200, ['not', 'an', 'object']
+    count = body.get('generationConfig', {}).get('candidateCount', 1)
+    return 200, {'candidates': [{'content': {'parts': [{'text': f'Draft {i}: {prompt}'}]}} for i in range(count)]}
+
+
+class DraftCacheTests(SimpleTestCase):
+    def test_evicts_least_recently_used(self):
+        drafts = ai.DraftCache(max_entries=2, ttl=60)
+        drafts.set('a', 'A')
+        drafts.set('b', 'B')
+        drafts.get('a')  # 'b' is now the oldest
+        drafts.set('c', 'C')
+        self.assertEqual((drafts.get('a'), drafts.get('b'), drafts.get('c')), ('A', None, 'C'))
+        self.assertEqual(drafts.evictions, 1)
+
+    def test_expires_after_ttl(self):
+        drafts = ai.DraftCache(max_entries=2, ttl=60)
+        with mock.patch.object(ai.time, 'monotonic', return_value=1000.0):
+            drafts.set('a', 'A')
+        with mock.patch.object(ai.time, 'monotonic', return_value=1059.0):
+            self.assertEqual(drafts.get('a'), 'A')
+        with mock.patch.object(ai.time, 'monotonic', return_value=1061.0):
+            self.assertIsNone(drafts.get('a'))
+        self.assertEqual(len(drafts), 0)
+
+
+class AIDraftTests(SimpleTestCase):
+    """Drafting against a local stand-in for the Gemini endpoint."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.gemini = StubServer(gemini_reply)
+        cls.settings_override = override_settings(GEMINI_API_URL=cls.gemini.url, GEMINI_API_KEY='test')
+        cls.settings_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        cls.gemini.close()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.gemini.calls.clear()
+        patcher = mock.patch.object(ai, 'DRAFT_CACHE', ai.DraftCache(max_entries=8, ttl=60))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Jobs are run by hand below instead of through the broker.
+        delay = mock.patch.object(generate_ai_draft, 'delay')
+        self.enqueued = delay.start()
+        self.addCleanup(delay.stop)
+
+    def run_job(self, key, prompt):
+        generate_ai_draft.apply(args=[key, prompt])
+
+    def test_request_drafts_asks_for_every_variant(self):
+        self.assertEqual(
+            ai.request_drafts('Eid sale', candidates=3),
+            ['Draft 0: Eid sale', 'Draft 1: Eid sale', 'Draft 2: Eid sale'],
+        )
+        path, headers, body = self.gemini.calls[0]
+        self.assertIn(':generateContent?key=test', path)
+        self.assertEqual(body['generationConfig'], {'candidateCount': 3})
+
+    def test_identical_prompts_share_one_upstream_call(self):
+        key, draft = async_to_sync(ai.start_draft)('Summer  SALE')
+        same_key, same_draft = async_to_sync(ai.start_draft)('summer sale')
+        self.assertEqual(key, same_key)
+        self.assertIsNone(draft)
+        self.assertIsNone(same_draft)
+        self.assertEqual(self.enqueued.call_count, 1)
+
+        self.run_job(*self.enqueued.call_args.args)
+        self.assertEqual(async_to_sync(ai.job_state)(key), {'status': 'SUCCESS', 'draft': 'Draft 0: Summer  SALE'})
+        self.assertEqual(async_to_sync(ai.start_draft)('Summer sale'), (key, 'Draft 0: Summer  SALE'))
+        self.assertEqual(len(self.gemini.calls), 1)
+
+    def test_failures_are_not_cached(self):
+        key, _ = async_to_sync(ai.start_draft)('please reject this')
+        self.run_job(*self.enqueued.call_args.args)
+        state = async_to_sync(ai.job_state)(key)
+        self.assertEqual((state['status'], state['code']), (ai.JOB_FAILED, 400))
+        self.assertIsNone(async_to_sync(ai.cached_draft)(key))
+
+        # Asking again starts a fresh job instead of replaying the failure.
+        async_to_sync(ai.start_draft)('please reject this')
+        self.assertEqual(self.enqueued.call_count, 2)
+        self.assertEqual(async_to_sync(ai.job_state)(key), {'status': ai.JOB_PENDING})
+
+    def test_malformed_response_fails_the_job(self):
+        key, _ = async_to_sync(ai.start_draft)('garble this')
+        self.run_job(*self.enqueued.call_args.args)
+        state = async_to_sync(ai.job_state)(key)
+        self.assertEqual((state['status'], state['code']), (ai.JOB_FAILED, 500))
+        self.assertEqual(len(self.gemini.calls), 1)
+
+    def test_unexpected_error_fails_the_job(self):
+        key, _ = async_to_sync(ai.start_draft)('Flash sale')
+        with mock.patch.object(ai, 'store_draft', side_effect=RuntimeError('cache down')):
+            self.run_job(*self.enqueued.call_args.args)
+        state = async_to_sync(ai.job_state)(key)
+        self.assertEqual((state['status'], state['code']), (ai.JOB_FAILED, 500))
+
+    def test_stats_count_hits_misses_and_coalesced(self):
+        key, _ = async_to_sync(ai.start_draft)('New arrivals')
+        async_to_sync(ai.start_draft)('new arrivals')
+        self.run_job(*self.enqueued.call_args.args)
+        async_to_sync(ai.start_draft)('New arrivals')
+
+        stats = ai.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['coalesced']), (1, 1, 1))
+        self.assertEqual(stats['hit_ratio'], round(2 / 3, 4))
+        self.assertEqual(stats['local_entries'], 1)
+
+
+WEBHOOK_SECRET = 'test-secret'
+
+
+@override_settings(WHATSAPP_WEBHOOK_SECRET=WEBHOOK_SECRET)
+class DeliveryReceiptTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user('sender', password='x')
+        self.campaign = Campaign.objects.create(
+            name='Receipts', message_content='Hi', created_by=self.user, status=Campaign.Status.IN_PROGRESS
+        )
+
+    def sent_recipient(self, phone, status=CampaignRecipient.Status.SENT):
+        recipient = CampaignRecipient.objects.create(campaign=self.campaign, phone_number=phone, status=status)
+        key = ledger.send_key(self.campaign.id, phone)
+        SendLedgerEntry.objects.create(key=key, recipient=recipient, state=SendLedgerEntry.State.SENT)
+        return recipient, key
+
+    def post_receipts(self, items, secret=WEBHOOK_SECRET):
+        return self.client.post(
+            '/app/api/whatsapp/receipts/', data=json.dumps({'receipts': items}),
+            content_type='application/json', headers={'X-Webhook-Secret': secret},
+        )
+
+    def test_webhook_only_buffers(self):
+        recipient, key = self.sent_recipient('+923001110001')
+        forbidden = self.post_receipts([{'idempotencyKey': key, 'status': 'delivered'}], secret='wrong')
+        self.assertEqual(forbidden.status_code, 403)
+
+        response = self.post_receipts([
+            {'idempotencyKey': key, 'status': 'delivered'},
+            {'idempotencyKey': key, 'status': 'typing'},
+        ])
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['accepted'], 1)
+        self.assertEqual(DeliveryReceipt.objects.count(), 1)
+        recipient.refresh_from_db()
+        self.assertEqual(recipient.status, CampaignRecipient.Status.SENT)
+
+    def test_out_of_range_timestamps_fall_back_to_now(self):
+        _, key = self.sent_recipient('+923001110001')
+        before = timezone.now()
+        response = self.post_receipts([
+            {'idempotencyKey': key, 'status': 'delivered', 'timestamp': 10 ** 20},
+            {'idempotencyKey': key, 'status': 'read', 'timestamp': '2026-13-45T00:00:00'},
+        ])
+        self.assertEqual(response.status_code, 202)
+        times = DeliveryReceipt.objects.values_list('occurred_at', flat=True)
+        self.assertEqual(len(times), 2)
+        self.assertTrue(all(t >= before for t in times))
+
+    def test_flush_keeps_newest_state_and_earliest_times_across_batches(self):
+        recipient, key = self.sent_recipient('+923001110001')
+        read_at = timezone.now() - timedelta(minutes=5)
+        delivered_at = read_at - timedelta(minutes=1)
+        # The "read" arrives first; the later-buffered "delivered" must not downgrade it.
+        self.post_receipts([
+            {'idempotencyKey': key, 'status': 'read', 'timestamp': read_at.isoformat()},
+            {'idempotencyKey': key, 'status': 'delivered', 'timestamp': delivered_at.isoformat()},
+        ])
+        with mock.patch.object(receipts, 'FLUSH_BATCH_SIZE', 1):
+            self.assertEqual(receipts.flush(), (2, 2))
+
+        recipient.refresh_from_db()
+        self.assertEqual(recipient.status, CampaignRecipient.Status.READ)
+        self.assertEqual((recipient.delivered_at, recipient.read_at), (read_at, read_at))
+        self.assertFalse(DeliveryReceipt.objects.exists())
+
+    def test_status_never_moves_backwards(self):
+        recipient, key = self.sent_recipient('+923001110001', status=CampaignRecipient.Status.READ)
+        failed, failed_key = self.sent_recipient('+923001110002', status=CampaignRecipient.Status.FAILED)
+        self.post_receipts([
+            {'idempotencyKey': key, 'status': 'delivered'},
+            {'idempotencyKey': failed_key, 'status': 'read'},
+        ])
+        receipts.flush()
+
+        recipient.refresh_from_db()
+        failed.refresh_from_db()
+        self.assertEqual(recipient.status, CampaignRecipient.Status.READ)
+        self.assertEqual(failed.status, CampaignRecipient.Status.FAILED)
+        self.assertIsNone(failed.read_at)
+
+    def test_early_receipts_wait_for_the_sent_write(self):
+        recipient, key = self.sent_recipient('+923001110001', status=CampaignRecipient.Status.PENDING)
+        stale, stale_key = self.sent_recipient('+923001110002', status=CampaignRecipient.Status.PENDING)
+        self.post_receipts([
+            {'idempotencyKey': key, 'status': 'delivered'},
+            {'idempotencyKey': stale_key, 'status': 'delivered'},
+        ])
+        DeliveryReceipt.objects.filter(key=stale_key).update(
+            received_at=timezone.now() - receipts.EARLY_RECEIPT_WINDOW - timedelta(minutes=1)
+        )
+
+        receipts.flush()
+        self.assertEqual(list(DeliveryReceipt.objects.values_list('key', flat=True)), [key])
+
+        CampaignRecipient.objects.filter(pk=recipient.pk).update(status=CampaignRecipient.Status.SENT)
+        receipts.flush()
+        recipient.refresh_from_db()
+        self.assertEqual(recipient.status, CampaignRecipient.Status.DELIVERED)
+        self.assertFalse(DeliveryReceipt.objects.exists())
+
+    def test_round_trip_through_a_stand_in_gateway(self):
+        gateway_stub = StubServer(lambda path, body: (200, {'status': 'SUCCESS'}))
+        self.addCleanup(gateway_stub.close)
+        phones = ['+923001110001', '+923001110002', '+923001110003']
+        CampaignRecipient.objects.bulk_create([
+            CampaignRecipient(campaign=self.campaign, phone_number=p, status=CampaignRecipient.Status.PENDING)
+            for p in phones
+        ])
+
+        with override_settings(WHATSAPP_GATEWAY_URL=f'{gateway_stub.url}/send-message'), \
+                mock.patch.object(gateway, 'is_session_healthy', return_value=True), \
+                mock.patch.object(gateway, 'session_health', return_value=True), \
+                mock.patch.object(tasks.dispatch_slot, 'delay'):
+            self.assertTrue(scheduler.acquire_slot(0))
+            tasks.dispatch_slot(0)
+
+        keys = {body['phone']: headers['Idempotency-Key'] for _, headers, body in gateway_stub.calls}
+        self.assertEqual(sorted(keys), phones)
+        self.post_receipts([
+            {'idempotencyKey': keys[phones[0]], 'status': 'delivered'},
+            {'idempotencyKey': keys[phones[1]], 'status': 'read'},
+        ])
+        receipts.flush()
+
+        statuses = dict(CampaignRecipient.objects.filter(campaign=self.campaign).values_list('phone_number', 'status'))
+        self.assertEqual(statuses, {
+            phones[0]: CampaignRecipient.Status.DELIVERED,
+            phones[1]: CampaignRecipient.Status.READ,
+            phones[2]: CampaignRecipient.Status.SENT,
+        })
+
+
+class SendLedgerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user('ledger', password='x')
+        self.campaign = Campaign.objects.create(
+            name='Ledger', message_content='Hi', created_by=self.user, status=Campaign.Status.IN_PROGRESS
+        )
+
+    def recipients(self, *phones):
+        return CampaignRecipient.objects.bulk_create([
+            CampaignRecipient(campaign=self.campaign, phone_number=p, status=CampaignRecipient.Status.PENDING)
+            for p in phones
+        ])
+
+    def test_a_key_is_claimed_once(self):
+        first, second = self.recipients('+923001110001', '+923001110002')
+        to_send, already_sent, duplicates = ledger.claim(self.campaign.id, [first, second])
+        self.assertEqual(set(to_send), {first.id, second.id})
+        # A concurrent or redelivered dispatch gets nothing to send.
+        self.assertEqual(ledger.claim(self.campaign.id, [first, second]), ({}, set(), {}))
+
+        ledger.record({to_send[first.id]: SendLedgerEntry.State.SENT, to_send[second.id]: SendLedgerEntry.State.FAILED})
+        to_send, already_sent, _ = ledger.claim(self.campaign.id, [first, second])
+        self.assertEqual((list(to_send), already_sent), ([second.id], {first.id}))
+        self.assertEqual(SendLedgerEntry.objects.get(key=to_send[second.id]).attempts, 2)
+
+    def test_released_and_abandoned_claims_are_taken_over(self):
+        first, second = self.recipients('+923001110001', '+923001110002')
+        to_send, _, _ = ledger.claim(self.campaign.id, [first, second])
+        ledger.release([to_send[first.id]])
+        SendLedgerEntry.objects.filter(key=to_send[second.id]).update(
+            updated_at=timezone.now() - timedelta(seconds=ledger.CLAIM_TIMEOUT + 1)
+        )
+        retaken, _, _ = ledger.claim(self.campaign.id, [first, second])
+        self.assertEqual(retaken, to_send)
+
+    def test_duplicate_numbers_follow_the_first_send(self):
+        gateway_stub = StubServer(lambda path, body: (400, {}) if body['phone'].endswith('2') else (200, {}))
+        self.addCleanup(gateway_stub.close)
+        self.recipients('+923001110001', '+923001110001', '+923001110002', '+923001110002')
+
+        with override_settings(WHATSAPP_GATEWAY_URL=f'{gateway_stub.url}/send-message'), \
+                mock.patch.object(gateway, 'is_session_healthy', return_value=True), \
+                mock.patch.object(gateway, 'session_health', return_value=True), \
+                mock.patch.object(tasks.dispatch_slot, 'delay'):
+            self.assertTrue(scheduler.acquire_slot(0))
+            tasks.dispatch_slot(0)
+
+        self.assertEqual(sorted(body['phone'] for _, _, body in gateway_stub.calls), ['+923001110001', '+923001110002'])
+        statuses = list(CampaignRecipient.objects.order_by('id').values_list('status', flat=True))
+        self.assertEqual(statuses, [CampaignRecipient.Status.SENT] * 2 + [CampaignRecipient.Status.FAILED] * 2)
+
+
+class DispatchFailureTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user('dispatcher', password='x')
+        self.campaign = Campaign.objects.create(
+            name='Broken', message_content='Hi', created_by=self.user, status=Campaign.Status.IN_PROGRESS
+        )
+        CampaignRecipient.objects.create(
+            campaign=self.campaign, phone_number='+923001110001', status=CampaignRecipient.Status.PENDING
+        )
+
+    def test_failed_slice_stops_the_campaign_until_retried(self):
+        with mock.patch.object(tasks, '_send_slice', side_effect=RuntimeError('boom')), \
+                mock.patch.object(tasks.dispatch_slot, 'delay'):
+            self.assertTrue(scheduler.acquire_slot(0))
+            tasks.dispatch_slot(0)
+        self.campaign.refresh_from_db()
+        self.assertEqual(self.campaign.status, Campaign.Status.FAILED)
+        self.assertTrue(self.campaign.dispatch_error)
+
+        # The session monitor only resumes campaigns paused for a lost session.
+        with mock.patch.object(gateway, 'check_sessions', return_value={self.user.pk: True}), \
+                mock.patch.object(tasks.send_campaign_messages, 'delay') as resume:
+            tasks.monitor_session_health()
+            self.assertFalse(resume.called)
+            self.campaign.refresh_from_db()
+            self.assertEqual(self.campaign.status, Campaign.Status.FAILED)
+
+            self.client.force_login(self.user)
+            self.client.post(f'/app/campaigns/{self.campaign.pk}/retry/')
+            resume.assert_called_once_with(self.campaign.pk)
+        self.campaign.refresh_from_db()
+        self.assertEqual((self.campaign.status, self.campaign.dispatch_error), (Campaign.Status.IN_PROGRESS, ''))
+
+    def test_state_lock_is_not_stolen_after_the_deadline(self):
+        cache.add(scheduler.STATE_LOCK_KEY, 'other', 60)
+        with mock.patch.object(scheduler, 'STATE_LOCK_TIMEOUT', 0.05):
+            with scheduler._state() as state:
+                state['order'] = [1]
+        self.assertEqual(cache.get(scheduler.STATE_LOCK_KEY), 'other')
+        self.assertEqual(cache.get(scheduler.STATE_KEY)['order'], [1])
+
+    @override_settings(CELERY_TASK_ALWAYS_EAGER=False)
+    def test_process_local_cache_is_flagged(self):
+        self.assertEqual([w.id for w in scheduler.check_shared_cache(None)], ['messaging.W002'])
+
+
+class CampaignListTests(TestCase):
+    def test_malformed_recurrence_filter_is_not_found(self):
+        self.client.force_login(get_user_model().objects.create_user('lister', password='x'))
+        self.assertEqual(self.client.get('/app/campaigns/').status_code, 200)
+        for value in ('abc', '1.5', '²', '999'):
+            self.assertEqual(self.client.get('/app/campaigns/', {'recurrence': value}).status_code, 404)
+
+
+class TemplateCatalogTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = get_user_model().objects.create_user('author', password='x')
+        self.reader = get_user_model().objects.create_user('reader', password='x')
+        MessageTemplate.objects.create(title='Welcome', content='Hi', created_by=self.author)
+
+    def test_promoting_or_demoting_the_author_refreshes_the_shared_catalog(self):
+        self.assertEqual(get_template_catalog(self.reader), [])
+        self.author.is_superuser = True
+        self.author.save()
+        self.assertEqual([t['title'] for t in get_template_catalog(self.reader)], ['Welcome'])
+        self.author.is_superuser = False
+        self.author.save(update_fields=['is_superuser'])
+        self.assertEqual(get_template_catalog(self.reader), [])
+
+
+class RecipientUploadTests(TestCase):
+    """The raw CSV is removed once ingestion is over, whatever the outcome."""
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_override = override_settings(MEDIA_ROOT=media.name)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+        dispatch = mock.patch.object(tasks, 'queue_dispatch')
+        dispatch.start()
+        self.addCleanup(dispatch.stop)
+        self.user = get_user_model().objects.create_user('uploader', password='x')
+
+    def upload_campaign(self, content):
+        campaign = Campaign(
+            name='Upload', message_content='Hi', created_by=self.user,
+            status=Campaign.Status.DRAFT, recipient_source='csv',
+        )
+        campaign.recipient_upload.save('list.csv', ContentFile(content), save=False)
+        campaign.save()
+        return campaign, campaign.recipient_upload.path
+
+    def test_upload_is_deleted_after_ingestion(self):
+        campaign, path = self.upload_campaign(b'name,phone\nA,923001110001\nB,923001110002\n')
+        tasks.ingest_campaign_recipients(campaign.id)
+        campaign.refresh_from_db()
+        self.assertEqual(campaign.recipients.count(), 2)
+        self.assertFalse(campaign.recipient_upload)
+        self.assertFalse(os.path.exists(path))
+
+    def test_upload_is_deleted_when_ingestion_fails(self):
+        campaign, path = self.upload_campaign(b'name,number\nA,923001110001\n')
+        tasks.ingest_campaign_recipients(campaign.id)
+        campaign.refresh_from_db()
+        self.assertEqual(campaign.status, Campaign.Status.FAILED)
+        self.assertFalse(campaign.recipient_upload)
+        self.assertFalse(os.path.exists(path))
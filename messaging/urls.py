@@ -11,7 +11,19 @@ urlpatterns = [
     path('campaigns/', views_ui.campaign_list_view, name='campaign_list'),
 
     path('campaigns/create/', views_ui.campaign_create_view, name='campaign_create'),
+    path('campaigns/<int:pk>/export/', views_ui.campaign_export_view, name='campaign_export'),
+    path('campaigns/<int:pk>/progress/', views_ui.campaign_progress_api, name='campaign_progress'),
+    path('campaigns/<int:pk>/retry/', views_ui.campaign_retry_view, name='campaign_retry'),
+    path('campaigns/recurring/', views_ui.recurrence_list_view, name='recurrence_list'),
+    path('campaigns/recurring/<int:pk>/toggle/', views_ui.recurrence_toggle_view, name='recurrence_toggle'),
+    path('campaigns/recurring/<int:pk>/delete/', views_ui.recurrence_delete_view, name='recurrence_delete'),
     path('api/whatsapp/start/', views_ui.start_session_api, name='whatsapp_start_api'),
     path('api/whatsapp/status/', views_ui.status_api, name='whatsapp_status_api'),
     path('api/whatsapp/disconnect/', views_ui.disconnect_api, name='whatsapp_disconnect_api'),
-    path('api/ai-draft/', views_ui.ai_draft_message, name='ai_draft_message'),]
+    path('api/whatsapp/receipts/', views_ui.receipts_webhook, name='whatsapp_receipts_webhook'),
+    path('api/contacts/', views_ui.contact_search_api, name='contact_search_api'),
+    path('api/phone-history/', views_ui.phone_history_api, name='phone_history_api'),
+    path('api/ai-draft/', views_ui.ai_draft_message, name='ai_draft_message'),
+    path('api/ai-draft/batch/', views_ui.ai_draft_batch, name='ai_draft_batch'),
+    path('api/ai-draft/stats/', views_ui.ai_draft_stats, name='ai_draft_stats'),
+    path('api/ai-draft/<slug:job_id>/', views_ui.ai_draft_status, name='ai_draft_status'),]
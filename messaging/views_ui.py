@@ -1,20 +1,27 @@
-import csv, io, re, json, requests, time, os
-from django.shortcuts import render, redirect
+import json
+import hmac
+from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.utils import timezone
 from django.db import transaction, models
-from django.http import JsonResponse, HttpResponseServerError
-from .models import Campaign, CampaignRecipient, MessageTemplate, Attachment
-from core.settings import WHATSAPP_NODE_URL
-
-from accounts.models import Contact 
+from django.http import Http404, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.conf import settings
+from .models import Campaign, CampaignRecipient, CampaignRecurrence, Attachment, DeliveryReceipt
+from core.pagination import keyset_paginate, approximate_count
+from . import ai, gateway, history, packed, receipts, recurrence
+from .catalog import get_template_catalog, get_templates_json
+from .ingest import get_progress as get_ingest_progress
+from core.streaming import stream_csv_response, EXPORT_CHUNK_SIZE
+
+from accounts.models import Contact, ContactSegment
 
 # ========== CONFIG ==========
-GEMINI_MODEL = "gemini-2.5-flash-preview-09-2025"
-API_KEY = os.environ.get("API_KEY")
-MAX_RETRIES = 5
-INITIAL_DELAY = 1  # seconds
+CAMPAIGNS_PER_PAGE = 20
+CONTACT_PICKER_PAGE_SIZE = 50
+RECENT_CAMPAIGN_CHOICES = 50
 
 
 # ===============================================================
@@ -27,46 +34,53 @@ def whatsapp_connect_view(request):
     return render(request, 'messaging/whatsapp_connect.html')
 
 
-def make_node_request(method, endpoint, user_id, data=None):
-    """Helper to communicate with Node.js service."""
-    node_url = f"{WHATSAPP_NODE_URL}/{endpoint}"
-    headers = {'Content-Type': 'application/json'}
-    payload = data or {}
-
-    try:
-        if method.lower() == 'post':
-            payload['userId'] = user_id
-            response = requests.post(node_url, json=payload, headers=headers, timeout=30)
-        else:
-            node_url_with_id = f"{node_url}?userId={user_id}"
-            response = requests.get(node_url_with_id, timeout=10)
-
-        response.raise_for_status()
-        return JsonResponse(response.json())
-
-    except requests.exceptions.RequestException as e:
-        return JsonResponse(
-            {'status': 'ERROR', 'message': f'WhatsApp service failed or timed out: {e}'}, 
-            status=503
-        )
+def gateway_response(result):
+    """JsonResponse for a ``(http_status, payload)`` pair from messaging.gateway."""
+    http_status, payload = result
+    return JsonResponse(payload, status=http_status)
 
 
 @login_required
-def start_session_api(request):
+async def start_session_api(request):
     """Start WhatsApp session."""
-    return make_node_request('post', 'start', request.user.id)
+    user = await request.auser()
+    return gateway_response(await gateway.astart_session(user.id))
 
 
 @login_required
-def status_api(request):
-    """Check WhatsApp session status."""
-    return make_node_request('get', 'status', request.user.id)
+async def status_api(request):
+    """Check WhatsApp session status (cached briefly per user)."""
+    user = await request.auser()
+    return gateway_response(await gateway.aget_session_status(user.id))
 
 
 @login_required
-def disconnect_api(request):
+async def disconnect_api(request):
     """Disconnect WhatsApp session."""
-    return make_node_request('post', 'disconnect', request.user.id)
+    user = await request.auser()
+    return gateway_response(await gateway.adisconnect_session(user.id))
+
+
+@csrf_exempt
+def receipts_webhook(request):
+    """
+    Delivery/read receipts posted by the gateway, one or many per request.
+    Authenticated with the shared WHATSAPP_WEBHOOK_SECRET; receipts are only
+    buffered here and applied by the flush_delivery_receipts task.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'status': 'ERROR', 'message': 'Invalid request method.'}, status=405)
+    secret = settings.WHATSAPP_WEBHOOK_SECRET
+    if not secret or not hmac.compare_digest(request.headers.get('X-Webhook-Secret', ''), secret):
+        return JsonResponse({'status': 'ERROR', 'message': 'Forbidden.'}, status=403)
+
+    try:
+        batch = receipts.parse_receipts(json.loads(request.body))
+    except (json.JSONDecodeError, ValueError) as e:
+        return JsonResponse({'status': 'ERROR', 'message': str(e)}, status=400)
+
+    DeliveryReceipt.objects.bulk_create(batch)
+    return JsonResponse({'status': 'SUCCESS', 'accepted': len(batch)}, status=202)
 
 
 # ===============================================================
@@ -76,23 +90,79 @@ def disconnect_api(request):
 @login_required
 def template_list_view(request):
     """List templates (user + superuser)."""
-    templates = MessageTemplate.objects.filter(
-        models.Q(created_by=request.user) | models.Q(created_by__is_superuser=True)
-    ).distinct().order_by('title')
+    templates = get_template_catalog(request.user)
     return render(request, 'messaging/template_list.html', {'templates': templates})
 
 
 @login_required
 def campaign_list_view(request):
-    """List all campaigns by the user."""
-    campaigns = Campaign.objects.filter(created_by=request.user).order_by('-created_at')
-    return render(request, 'messaging/campaign_list.html', {'campaigns': campaigns})
+    """
+    List the user's campaigns, newest first, one keyset page at a time;
+    ``?recurrence=<id>`` narrows it to the runs of one recurring campaign.
+    """
+    queryset = Campaign.objects.filter(created_by=request.user)
+    recurring = None
+    if request.GET.get('recurrence'):
+        if not request.GET['recurrence'].isdecimal():
+            raise Http404("No such recurring campaign.")
+        recurring = get_object_or_404(CampaignRecurrence, pk=request.GET['recurrence'], created_by=request.user)
+        queryset = queryset.filter(recurrence=recurring)
+    campaigns = keyset_paginate(
+        queryset,
+        ordering=('-created_at', '-id'),
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+        per_page=CAMPAIGNS_PER_PAGE,
+    )
+    _attach_recipient_stats(campaigns)
+    return render(request, 'messaging/campaign_list.html', {'campaigns': campaigns, 'recurrence': recurring})
+
+
+@login_required
+def campaign_retry_view(request, pk):
+    """Put a campaign whose sending stopped on an error back in the dispatch rotation."""
+    campaign = get_object_or_404(Campaign, pk=pk, created_by=request.user)
+    if request.method == 'POST':
+        from .tasks import send_campaign_messages
+
+        retried = Campaign.objects.filter(
+            pk=pk, status=Campaign.Status.FAILED, dispatch_error__gt=''
+        ).update(status=Campaign.Status.IN_PROGRESS, dispatch_error='')
+        if retried:
+            send_campaign_messages.delay(pk)
+            messages.success(request, f"Campaign '{campaign.name}' is sending again.")
+    return redirect('messaging:campaign_list')
+
+
+@login_required
+def campaign_export_view(request, pk):
+    """Stream per-recipient delivery results for one campaign as CSV."""
+    campaign = get_object_or_404(Campaign, pk=pk, created_by=request.user)
+    if campaign.is_packed:
+        rows = packed.iter_export_rows(campaign)
+    else:
+        rows = (
+            CampaignRecipient.objects.filter(campaign=campaign)
+            .order_by('id')
+            .values_list('phone_number', 'status', 'sent_at', 'delivered_at', 'read_at', 'error_message')
+            .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        )
+    return stream_csv_response(
+        request,
+        f'campaign_{campaign.pk}_results.csv',
+        ['Phone', 'Status', 'Sent At', 'Delivered At', 'Read At', 'Error'],
+        rows,
+    )
 
 
 @login_required
-@transaction.atomic
 def campaign_create_view(request):
-    """Create + schedule campaigns."""
+    """
+    Create + schedule campaigns. The request only stores the campaign as a
+    DRAFT with its recipient selection (and raw upload); recipients are
+    ingested and the send is queued in the background.
+    """
+    wants_json = 'application/json' in request.headers.get('Accept', '')
     if request.method == 'POST':
         try:
             name = request.POST.get('campaign_name')
@@ -102,33 +172,9 @@ def campaign_create_view(request):
             if not (name and (msg or attachments)):
                 raise ValueError("Campaign Name and Message or Attachment required.")
 
-            recipients = _process_recipients(request)
-            if not recipients:
-                raise ValueError("No valid recipients found. Format must be 92XXXXXXXXXX.")
-
-            # create campaign
-            campaign = Campaign.objects.create(
-                name=name,
-                message_content=msg,
-                created_by=request.user
-            )
-
-            # add attachments
-            for file in attachments:
-                Attachment.objects.create(campaign=campaign, file=file)
-
-            # add recipients
-            CampaignRecipient.objects.bulk_create([
-                CampaignRecipient(campaign=campaign, phone_number=p)
-                for p in recipients
-            ])
-
-            # load celery task dynamically
-            try:
-                from .tasks import send_campaign_messages
-            except ImportError:
-                raise Exception("Celery task import failed. Check messaging.tasks.")
+            source, params = _recipient_params(request)
 
+            scheduled_at = None
             scheduled_at_str = request.POST.get('scheduled_at')
             if scheduled_at_str:
                 scheduled_at = timezone.make_aware(
@@ -137,35 +183,180 @@ def campaign_create_view(request):
                 if scheduled_at <= timezone.now():
                     raise ValueError("Scheduled time must be in the future.")
 
-                campaign.scheduled_at = scheduled_at
-                campaign.status = Campaign.Status.PENDING
-                send_campaign_messages.apply_async(args=[campaign.id], eta=scheduled_at)
-                messages.success(request, f"Campaign '{campaign.name}' scheduled for {scheduled_at.strftime('%Y-%m-%d %H:%M')}.")
+            window_start, window_end = _send_window(request)
+
+            from .tasks import ingest_campaign_recipients
+
+            with transaction.atomic():
+                campaign = Campaign.objects.create(
+                    name=name,
+                    message_content=msg,
+                    created_by=request.user,
+                    status=Campaign.Status.DRAFT,
+                    scheduled_at=scheduled_at,
+                    window_start=window_start,
+                    window_end=window_end,
+                    storage_mode=Campaign.StorageMode.PACKED if request.POST.get('compact_storage') else Campaign.StorageMode.ROWS,
+                    recipient_source=source,
+                    recipient_params=params,
+                    recipient_upload=request.FILES.get('csv_file') if source == 'csv' else '',
+                )
+                for file in attachments:
+                    Attachment.objects.create(campaign=campaign, file=file)
+                transaction.on_commit(lambda: ingest_campaign_recipients.delay(campaign.id))
+
+            if wants_json:
+                return JsonResponse({
+                    'status': 'ACCEPTED',
+                    'campaign_id': campaign.id,
+                    'progress_url': reverse('messaging:campaign_progress', args=[campaign.id]),
+                }, status=202)
+            if scheduled_at:
+                messages.success(request, f"Campaign '{campaign.name}' is being prepared and will be sent at {scheduled_at.strftime('%Y-%m-%d %H:%M')}.")
             else:
-                campaign.status = Campaign.Status.IN_PROGRESS
-                campaign.started_at = timezone.now()
-                send_campaign_messages.delay(campaign.id)
-                messages.success(request, f"Campaign '{campaign.name}' launched.")
-
-            campaign.save()
+                messages.success(request, f"Campaign '{campaign.name}' is being prepared and will launch as soon as its recipients are loaded.")
             return redirect('messaging:campaign_list')
 
         except ValueError as e:
+            if wants_json:
+                return JsonResponse({'status': 'ERROR', 'message': str(e)}, status=400)
             messages.error(request, str(e))
         except Exception as e:
+            if wants_json:
+                return JsonResponse({'status': 'ERROR', 'message': f'Error creating campaign: {e}'}, status=500)
             messages.error(request, f"Error creating campaign: {e}")
 
-    # GET render form
-    templates = MessageTemplate.objects.filter(
-        models.Q(created_by=request.user) | models.Q(created_by__is_superuser=True)
-    ).distinct()
-    contacts = Contact.objects.filter(user=request.user)
-    templates_json = json.dumps({t.id: t.content for t in templates})
+    # GET render form (templates come from the cached catalog, contacts are
+    # loaded on demand by the picker through contact_search_api)
+    templates = get_template_catalog(request.user)
+    templates_json = get_templates_json(request.user)
 
     return render(request, 'messaging/campaign_form.html', {
         'templates': templates,
-        'contacts': contacts,
         'templates_json': templates_json,
+        'has_contacts': Contact.objects.filter(user=request.user).exists(),
+        'segments': ContactSegment.objects.filter(user=request.user),
+        'previous_campaigns': Campaign.objects.filter(created_by=request.user).order_by('-created_at', '-id')[:RECENT_CAMPAIGN_CHOICES],
+    })
+
+
+@login_required
+def recurrence_list_view(request):
+    """List recurring campaigns and create new ones on a campaign's audience or a segment."""
+    if request.method == 'POST':
+        try:
+            name = request.POST.get('name')
+            msg = request.POST.get('message_content')
+            if not (name and msg):
+                raise ValueError("Name and message are required.")
+            if request.POST.get('recipient_source') not in CampaignRecurrence.Source.values:
+                raise ValueError("Recurring campaigns reuse an earlier campaign's audience or a segment.")
+            source, params = _recipient_params(request)
+            cron = ' '.join(request.POST.get('cron', '').split())
+            recurrence.parse_cron(cron)
+            window_start, window_end = _send_window(request)
+
+            with transaction.atomic():
+                recurring = CampaignRecurrence.objects.create(
+                    name=name,
+                    message_content=msg,
+                    created_by=request.user,
+                    recipient_source=source,
+                    recipient_params=params,
+                    cron=cron,
+                    window_start=window_start,
+                    window_end=window_end,
+                )
+                recurrence.schedule(recurring)
+            messages.success(request, f"Recurring campaign '{recurring.name}' scheduled ({recurring.cron}).")
+            return redirect('messaging:recurrence_list')
+        except ValueError as e:
+            messages.error(request, str(e))
+
+    recurrences = (
+        CampaignRecurrence.objects.filter(created_by=request.user)
+        .annotate(run_count=models.Count('runs'), last_run_at=models.Max('runs__created_at'))
+        .order_by('-created_at')
+    )
+    return render(request, 'messaging/recurrence_list.html', {
+        'recurrences': recurrences,
+        'segments': ContactSegment.objects.filter(user=request.user),
+        'previous_campaigns': (
+            Campaign.objects.filter(created_by=request.user, recurrence__isnull=True)
+            .order_by('-created_at', '-id')[:RECENT_CAMPAIGN_CHOICES]
+        ),
+    })
+
+
+@login_required
+def recurrence_toggle_view(request, pk):
+    recurring = get_object_or_404(CampaignRecurrence, pk=pk, created_by=request.user)
+    if request.method == 'POST':
+        recurring.is_active = not recurring.is_active
+        recurring.save(update_fields=['is_active'])
+        recurrence.schedule(recurring)
+        messages.success(request, f"Recurring campaign '{recurring.name}' {'resumed' if recurring.is_active else 'paused'}.")
+    return redirect('messaging:recurrence_list')
+
+
+@login_required
+def recurrence_delete_view(request, pk):
+    """Stop a recurrence; its past runs stay in the campaign history."""
+    recurring = get_object_or_404(CampaignRecurrence, pk=pk, created_by=request.user)
+    if request.method == 'POST':
+        with transaction.atomic():
+            recurrence.unschedule(recurring)
+            recurring.delete()
+        messages.success(request, f"Recurring campaign '{recurring.name}' deleted.")
+    return redirect('messaging:recurrence_list')
+
+
+@login_required
+def campaign_progress_api(request, pk):
+    """Recipient ingestion progress for one campaign, polled while it is DRAFT."""
+    campaign = get_object_or_404(Campaign, pk=pk, created_by=request.user)
+    return JsonResponse({
+        'status': 'SUCCESS',
+        'campaign_status': campaign.status,
+        'progress': get_ingest_progress(campaign.id),
+        'error': campaign.ingest_error,
+    })
+
+
+@login_required
+def contact_search_api(request):
+    """Typeahead for the campaign contact picker: prefix search, keyset paged."""
+    contacts = Contact.objects.filter(user=request.user).matching(request.GET.get('q'))
+    page = keyset_paginate(
+        contacts,
+        ordering=('name', 'id'),
+        after=request.GET.get('after'),
+        per_page=CONTACT_PICKER_PAGE_SIZE,
+    )
+    response = {
+        'status': 'SUCCESS',
+        'results': [{'id': c.id, 'name': c.name, 'phone': c.phone} for c in page],
+        'next_cursor': page.next_cursor,
+    }
+    if not request.GET.get('after'):
+        # Only the first page reports a total, for the "select all matching" label.
+        response['total'], response['total_is_exact'] = approximate_count(contacts)
+    return JsonResponse(response)
+
+
+@login_required
+def phone_history_api(request):
+    """Every campaign that messaged ``?phone=``, newest first, keyset paged (staff only)."""
+    if not request.user.is_staff:
+        return JsonResponse({'status': 'ERROR', 'message': 'Forbidden.'}, status=403)
+    try:
+        page = history.history_page(request.GET.get('phone'), after=request.GET.get('after'))
+    except ValueError as e:
+        return JsonResponse({'status': 'ERROR', 'message': str(e)}, status=400)
+    return JsonResponse({
+        'status': 'SUCCESS',
+        'results': [history.as_dict(r) for r in page],
+        'next_cursor': page.next_cursor,
     })
 
 
@@ -173,56 +364,90 @@ def campaign_create_view(request):
 # SECTION 3: HELPERS
 # ===============================================================
 
-def _process_recipients(request):
-    """Get recipients from manual, csv or contacts."""
+def _attach_recipient_stats(campaigns):
+    """Set total/sent/delivered/read/failed/pending counts on each campaign with one grouped query."""
+    counts = {}
+    rows = (
+        CampaignRecipient.objects.filter(campaign_id__in=[c.id for c in campaigns])
+        .values('campaign_id', 'status')
+        .annotate(n=models.Count('id'))
+        .order_by()
+    )
+    for row in rows:
+        counts.setdefault(row['campaign_id'], {})[row['status']] = row['n']
+    # Packed campaigns count from their chunk counters.
+    counts.update(packed.counts([c.id for c in campaigns if c.is_packed]))
+
+    for campaign in campaigns:
+        by_status = counts.get(campaign.id, {})
+        campaign.total_recipients = sum(by_status.values())
+        # Delivered and read messages were sent too.
+        campaign.read_count = by_status.get(CampaignRecipient.Status.READ, 0)
+        campaign.delivered_count = by_status.get(CampaignRecipient.Status.DELIVERED, 0) + campaign.read_count
+        campaign.sent_count = by_status.get(CampaignRecipient.Status.SENT, 0) + campaign.delivered_count
+        campaign.failed_count = by_status.get(CampaignRecipient.Status.FAILED, 0)
+        # Recipients outside their send window are still to be sent.
+        campaign.pending_count = by_status.get(CampaignRecipient.Status.PENDING, 0) + by_status.get(CampaignRecipient.Status.WAITING, 0)
+
+
+def _send_window(request):
+    """``(window_start, window_end)`` from the form, or ``(None, None)`` for no window."""
+    start = request.POST.get('window_start')
+    end = request.POST.get('window_end')
+    if not (start or end):
+        return None, None
+    try:
+        start = timezone.datetime.strptime(start or '', '%H:%M').time()
+        end = timezone.datetime.strptime(end or '', '%H:%M').time()
+    except ValueError:
+        raise ValueError("A send window needs both a start and an end time (HH:MM).")
+    if start == end:
+        raise ValueError("The send window must not start and end at the same time.")
+    return start, end
+
+
+def _recipient_params(request):
+    """
+    Validate the recipient choice and return ``(source, params)`` to store on
+    the campaign. Only cheap checks happen here; numbers are parsed later by
+    messaging.ingest.
+    """
     source = request.POST.get('recipient_source')
-    recipients = set()
 
     if source == 'manual':
         numbers = request.POST.get('manual_numbers', '').strip()
         if not numbers:
             raise ValueError("No numbers provided in manual entry.")
-        for n in numbers.splitlines():
-            if p := _normalize_phone(n.strip()):
-                recipients.add(p)
+        return source, {'manual_numbers': numbers}
 
     elif source == 'csv':
-        csv_file = request.FILES.get('csv_file')
-        if not csv_file:
+        if not request.FILES.get('csv_file'):
             raise ValueError("CSV file missing.")
-        file_content = csv_file.read().decode('utf-8')
-        reader = csv.DictReader(io.StringIO(file_content))
-        phone_col = next((c for c in reader.fieldnames if 'phone' in c.lower()), None)
-        if not phone_col:
-            raise ValueError("CSV must contain a 'phone' column.")
-        for row in reader:
-            phone_data = row.get(phone_col)
-            if phone_data and (p := _normalize_phone(phone_data)):
-                recipients.add(p)
+        return source, {}
 
     elif source == 'contacts':
-        ids = request.POST.getlist('contacts')
+        if request.POST.get('contacts_select_all'):
+            # "Select all matching" is resolved from the search term at ingest
+            # time, so the browser never has to post back every matching ID.
+            return source, {'select_all': True, 'query': request.POST.get('contacts_query', '')}
+        ids = [int(i) for i in request.POST.getlist('contacts') if i.isdigit()]
         if not ids:
             raise ValueError("No contacts selected.")
-        for c in Contact.objects.filter(id__in=ids, user=request.user):
-            if p := _normalize_phone(c.phone):
-                recipients.add(p)
+        return source, {'contact_ids': ids}
 
-    else:
-        raise ValueError("Invalid recipient source.")
-    return recipients
+    elif source == 'segment':
+        segment = ContactSegment.objects.filter(id=request.POST.get('segment') or None, user=request.user).first()
+        if not segment:
+            raise ValueError("No segment selected.")
+        return source, {'segment_id': segment.id}
 
+    elif source == 'campaign':
+        previous = Campaign.objects.filter(id=request.POST.get('previous_campaign') or None, created_by=request.user).first()
+        if not previous:
+            raise ValueError("No previous campaign selected.")
+        return source, {'campaign_id': previous.id, 'failed_only': bool(request.POST.get('previous_failed_only'))}
 
-def _normalize_phone(number):
-    """Normalize Pakistani numbers to +92XXXXXXXXXX."""
-    number = re.sub(r'\D', '', str(number))
-    if len(number) == 10 and number.startswith('3'):
-        number = '92' + number
-    elif len(number) == 11 and number.startswith('03'):
-        number = '92' + number[1:]
-    if len(number) == 12 and number.startswith('92'):
-        return f"+{number}"
-    return None
+    raise ValueError("Invalid recipient source.")
 
 
 # ===============================================================
@@ -230,9 +455,12 @@ def _normalize_phone(number):
 # ===============================================================
 
 @login_required
-def ai_draft_message(request):
-    """Generate message draft using Gemini API."""
-    if not API_KEY:
+async def ai_draft_message(request):
+    """
+    Start a Gemini draft. Cached prompts answer at once; otherwise the draft is
+    generated by a worker and the client polls ``poll_url`` (202 response).
+    """
+    if not settings.GEMINI_API_KEY:
         return JsonResponse(
             {'status': 'ERROR', 'message': 'AI API key missing on server.'},
             status=503
@@ -247,47 +475,85 @@ def ai_draft_message(request):
         if not prompt:
             return JsonResponse({'status': 'ERROR', 'message': 'Prompt is required.'}, status=400)
 
-        api_url = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL}:generateContent?key={API_KEY}"
-        payload = {
-            "contents": [{"parts": [{"text": prompt}]}],
-            "systemInstruction": {
-                "parts": [{"text": "You are a marketing assistant. Draft short, catchy WhatsApp/SMS messages using emojis."}]
-            },
-        }
-
-        delay = INITIAL_DELAY
-        last_error = None
-
-        for attempt in range(MAX_RETRIES):
-            try:
-                resp = requests.post(api_url, json=payload, headers={'Content-Type': 'application/json'}, timeout=30)
-                resp.raise_for_status()
-                result = resp.json()
-                generated = result.get('candidates', [{}])[0].get('content', {}).get('parts', [{}])[0].get('text')
-                if not generated:
-                    return JsonResponse({'status': 'ERROR', 'message': 'Empty AI response.'}, status=500)
-                return JsonResponse({'status': 'SUCCESS', 'draft': generated})
-
-            except requests.exceptions.HTTPError as err:
-                if 500 <= err.response.status_code < 600:
-                    last_error = f"HTTP {err.response.status_code}, retrying..."
-                    time.sleep(delay)
-                    delay *= 2
-                    continue
-                return JsonResponse({'status': 'ERROR', 'message': str(err)}, status=err.response.status_code)
-
-            except requests.exceptions.RequestException as req_err:
-                last_error = str(req_err)
-                time.sleep(delay)
-                delay *= 2
-                continue
+        job_id, draft = await ai.start_draft(prompt)
+        if draft is not None:
+            return JsonResponse({'status': 'SUCCESS', 'draft': draft})
+        return JsonResponse({
+            'status': ai.JOB_PENDING,
+            'job_id': job_id,
+            'poll_url': reverse('messaging:ai_draft_status', args=[job_id]),
+        }, status=202)
+
+    except json.JSONDecodeError:
+        return JsonResponse({'status': 'ERROR', 'message': 'Invalid JSON.'}, status=400)
+    except Exception as e:
+        return JsonResponse({'status': 'ERROR', 'message': f'Internal Error: {e}'}, status=500)
+
 
+@login_required
+async def ai_draft_batch(request):
+    """
+    Start a batch of drafts saved as templates: ``{"prompt": ..., "variants": K}``
+    or ``{"prompts": [...], "variants": K}``, with an optional ``title``.
+    Answers 202 with a ``poll_url`` like ``ai_draft_message``.
+    """
+    if not settings.GEMINI_API_KEY:
         return JsonResponse(
-            {'status': 'ERROR', 'message': f'AI failed after {MAX_RETRIES} retries. Last error: {last_error}'},
+            {'status': 'ERROR', 'message': 'AI API key missing on server.'},
             status=503
         )
 
-    except json.JSONDecodeError:
+    if request.method != 'POST':
+        return JsonResponse({'status': 'ERROR', 'message': 'Invalid request method.'}, status=405)
+
+    try:
+        data = json.loads(request.body)
+        prompts = data.get('prompts') or ([data['prompt']] if data.get('prompt') else [])
+        prompts = [p.strip() for p in prompts if isinstance(p, str) and p.strip()]
+        if not prompts:
+            return JsonResponse({'status': 'ERROR', 'message': 'At least one prompt is required.'}, status=400)
+        if len(prompts) > ai.MAX_BATCH_PROMPTS:
+            return JsonResponse(
+                {'status': 'ERROR', 'message': f'At most {ai.MAX_BATCH_PROMPTS} prompts per batch.'},
+                status=400
+            )
+        variants = int(data.get('variants') or 1)
+        if not 1 <= variants <= ai.MAX_VARIANTS:
+            return JsonResponse(
+                {'status': 'ERROR', 'message': f'Variants must be between 1 and {ai.MAX_VARIANTS}.'},
+                status=400
+            )
+        title = (data.get('title') or '').strip()[:150] or prompts[0][:50]
+
+        job_id = await ai.start_batch(await request.auser(), prompts, variants, title)
+        return JsonResponse({
+            'status': ai.JOB_PENDING,
+            'job_id': job_id,
+            'poll_url': reverse('messaging:ai_draft_status', args=[job_id]),
+        }, status=202)
+
+    except (json.JSONDecodeError, TypeError, ValueError):
         return JsonResponse({'status': 'ERROR', 'message': 'Invalid JSON.'}, status=400)
     except Exception as e:
         return JsonResponse({'status': 'ERROR', 'message': f'Internal Error: {e}'}, status=500)
+
+
+@login_required
+async def ai_draft_status(request, job_id):
+    """Poll a draft job: 200 with the draft, 202 while pending, or the job's error."""
+    state = await ai.job_state(job_id)
+    if state is None:
+        return JsonResponse({'status': 'ERROR', 'message': 'Unknown or expired draft job.'}, status=404)
+    if state['status'] == ai.JOB_FAILED:
+        return JsonResponse({'status': 'ERROR', 'message': state['message']}, status=state['code'])
+    if state['status'] == ai.JOB_PENDING:
+        return JsonResponse({'status': ai.JOB_PENDING, 'job_id': job_id}, status=202)
+    return JsonResponse(state)
+
+
+@login_required
+def ai_draft_stats(request):
+    """Draft cache hit/miss counters (staff only)."""
+    if not request.user.is_staff:
+        return JsonResponse({'status': 'ERROR', 'message': 'Forbidden.'}, status=403)
+    return JsonResponse({'status': 'SUCCESS', 'cache': ai.stats()})
@@ -0,0 +1,124 @@
+# messaging/windows.py
+"""
+Send windows in the recipient's local time.
+
+A campaign with a window (say 10:00-18:00) ingests its recipients as WAITING,
+each tagged with a timezone bucket derived from the number's calling code.
+Nothing is scheduled per recipient: every bucket has a single timer at a
+time. When a bucket's window opens, one UPDATE flips its recipients to
+PENDING and the dispatcher sends them; when it closes, whatever is still
+pending goes back to WAITING and the next day's opening is armed. A campaign
+whose released buckets are all sent waits (status WAITING) for the next
+opening instead of completing. Packed campaigns do the same with the
+``held`` flag of their chunks, which are bucketed the same way.
+"""
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.db.models import Exists, F, OuterRef, Sum
+from django.utils import timezone
+
+from .models import Campaign, CampaignRecipient, RecipientChunk
+from .packed import remaining
+
+
+def _zone(tz_bucket):
+    return ZoneInfo(tz_bucket or settings.TIME_ZONE)
+
+
+def is_open(campaign, tz_bucket, at=None):
+    local = timezone.localtime(at or timezone.now(), _zone(tz_bucket)).time()
+    start, end = campaign.window_start, campaign.window_end
+    if start < end:
+        return start <= local < end
+    return local >= start or local < end  # window crosses midnight
+
+
+def _next_local(tz_bucket, at, wall_time):
+    """The first instant after ``at`` when the bucket's clock shows ``wall_time``."""
+    zone = _zone(tz_bucket)
+    local = timezone.localtime(at, zone)
+    candidate = datetime.combine(local.date(), wall_time, tzinfo=zone)
+    if candidate <= local:
+        candidate = datetime.combine(local.date() + timedelta(days=1), wall_time, tzinfo=zone)
+    return candidate
+
+
+def next_open(campaign, tz_bucket, after=None):
+    """When the bucket's window next opens; ``after`` itself if it is open then."""
+    after = after or timezone.now()
+    if is_open(campaign, tz_bucket, after):
+        return after
+    return _next_local(tz_bucket, after, campaign.window_start)
+
+
+def next_close(campaign, tz_bucket, after=None):
+    return _next_local(tz_bucket, after or timezone.now(), campaign.window_end)
+
+
+def buckets(campaign_id):
+    rows = CampaignRecipient.objects.filter(campaign_id=campaign_id).order_by().values_list('tz_bucket', flat=True)
+    chunks = RecipientChunk.objects.filter(campaign_id=campaign_id).order_by().values_list('tz_bucket', flat=True)
+    return set(rows.distinct()) | set(chunks.distinct())
+
+
+def arm(campaign, start_at=None):
+    """Queue the first opening of every bucket, no earlier than ``start_at``."""
+    from .tasks import release_send_window
+
+    start_at = max(start_at or timezone.now(), timezone.now())
+    for tz_bucket in buckets(campaign.id):
+        release_send_window.apply_async(args=[campaign.id, tz_bucket], eta=next_open(campaign, tz_bucket, start_at))
+
+
+def release(campaign, tz_bucket):
+    """Open the bucket: its waiting recipients become sendable. Returns how many."""
+    if campaign.is_packed:
+        chunks = remaining(RecipientChunk.objects.filter(campaign_id=campaign.id, tz_bucket=tz_bucket, held=True))
+        released = chunks.aggregate(n=Sum(F('size') - F('done_count')))['n'] or 0
+        chunks.update(held=False)
+    else:
+        released = CampaignRecipient.objects.filter(
+            campaign_id=campaign.id, tz_bucket=tz_bucket, status=CampaignRecipient.Status.WAITING
+        ).update(status=CampaignRecipient.Status.PENDING)
+    if released:
+        Campaign.objects.filter(pk=campaign.id, status=Campaign.Status.WAITING).update(status=Campaign.Status.PENDING)
+    return released
+
+
+def hold(campaign, tz_bucket):
+    """Close the bucket: recipients not reached yet wait for the next opening."""
+    if campaign.is_packed:
+        return remaining(RecipientChunk.objects.filter(
+            campaign_id=campaign.id, tz_bucket=tz_bucket, held=False
+        )).update(held=True)
+    return CampaignRecipient.objects.filter(
+        campaign_id=campaign.id, tz_bucket=tz_bucket, status=CampaignRecipient.Status.PENDING
+    ).update(status=CampaignRecipient.Status.WAITING)
+
+
+def has_waiting(campaign_id, tz_bucket=None):
+    waiting = CampaignRecipient.objects.filter(campaign_id=campaign_id, status=CampaignRecipient.Status.WAITING)
+    held = remaining(RecipientChunk.objects.filter(campaign_id=campaign_id, held=True))
+    if tz_bucket is not None:
+        waiting = waiting.filter(tz_bucket=tz_bucket)
+        held = held.filter(tz_bucket=tz_bucket)
+    return waiting.exists() or held.exists()
+
+
+def park_if_waiting(campaign_id):
+    """
+    Move an IN_PROGRESS campaign with nothing sendable but recipients still
+    outside their window to WAITING. One conditional UPDATE, so a bucket
+    released meanwhile is never parked by mistake.
+    """
+    recipients = CampaignRecipient.objects.filter(campaign_id=OuterRef('pk'))
+    chunks = remaining(RecipientChunk.objects.filter(campaign_id=OuterRef('pk')))
+    return Campaign.objects.filter(pk=campaign_id, status=Campaign.Status.IN_PROGRESS).filter(
+        Exists(recipients.filter(status=CampaignRecipient.Status.WAITING)) | Exists(chunks.filter(held=True))
+    ).exclude(
+        Exists(recipients.filter(status=CampaignRecipient.Status.PENDING))
+    ).exclude(
+        Exists(chunks.filter(held=False))
+    ).update(status=Campaign.Status.WAITING)